@@ -0,0 +1,87 @@
+"""LLM 调用尾延迟基准：对比开启/关闭对冲请求时的延迟分布
+
+使用模拟模型（对数正态延迟，少量请求慢一个数量级），不调用真实 API：
+
+    python -m benchmarks.llm_tail_latency --calls 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from src.core.llm_client import LLMClient
+
+
+class SimulatedModel:
+    """延迟服从对数正态分布，slow_ratio 比例的请求额外慢 slow_factor 倍"""
+
+    def __init__(self, median: float, sigma: float, slow_ratio: float, slow_factor: float, seed: int):
+        self.median = median
+        self.sigma = sigma
+        self.slow_ratio = slow_ratio
+        self.slow_factor = slow_factor
+        self.rng = random.Random(seed)
+        self.requests = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.requests += 1
+        latency = self.median * self.rng.lognormvariate(0, self.sigma)
+        if self.rng.random() < self.slow_ratio:
+            latency *= self.slow_factor
+        await asyncio.sleep(latency)
+        return prompt
+
+
+async def run(client: LLMClient, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await client.generate_content_async(f"prompt {i}")
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return np.array(latencies)
+
+
+def report(name: str, latencies: np.ndarray, model: SimulatedModel, client: LLMClient, calls: int):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    print(
+        f"{name:<10} p50={p50:7.1f}ms  p95={p95:7.1f}ms  p99={p99:7.1f}ms  "
+        f"max={latencies.max() * 1000:7.1f}ms  requests/call={model.requests / calls:.3f}  "
+        f"hedged={client.stats['hedged']} hedge_wins={client.stats['hedge_wins']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--median-ms", type=float, default=20)
+    parser.add_argument("--sigma", type=float, default=0.3)
+    parser.add_argument("--slow-ratio", type=float, default=0.05)
+    parser.add_argument("--slow-factor", type=float, default=10)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    for name, hedging in (("baseline", False), ("hedged", True)):
+        model = SimulatedModel(args.median_ms / 1000, args.sigma, args.slow_ratio, args.slow_factor, args.seed)
+        client = LLMClient(
+            model,
+            timeout=60,
+            hedging=hedging,
+            hedge_percentile=args.percentile,
+            hedge_min_delay=0,
+            min_samples=20
+        )
+        latencies = asyncio.run(run(client, args.calls, args.concurrency))
+        report(name, latencies, model, client, args.calls)
+
+
+if __name__ == "__main__":
+    main()
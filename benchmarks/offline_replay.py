@@ -0,0 +1,111 @@
+"""离线回放基准：用录制的真实 LLM 流量测量 process_answer、analyze_code 和 explain_concept 的延迟
+
+先在能访问 Gemini 的环境中录制一次固定工作负载，之后在 CI 中离线回放（不需要网络和 API key）：
+
+    python -m benchmarks.offline_replay --record --cassette benchmarks/llm_cassette.jsonl
+    python -m benchmarks.offline_replay --cassette benchmarks/llm_cassette.jsonl --sessions 20 --latency-scale 1.0
+
+回放时多个会话并发执行同一工作负载，完全相同的提示依次取用录制的响应；
+--latency-scale 0 时不模拟模型耗时，只测量服务本身的开销。
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+ANSWERS = [
+    "A list is mutable and a tuple is immutable, so tuples can be used as dictionary keys because they are hashable.",
+    "Decorators wrap a function with another callable; functools.wraps keeps the original name and docstring.",
+    "The GIL lets only one thread execute Python bytecode at a time, so CPU-bound work should use processes.",
+]
+
+SNIPPETS = [
+    ("python", "def find_duplicates(items):\n    seen = []\n    dups = []\n    for x in items:\n"
+               "        if x in seen:\n            dups.append(x)\n        seen.append(x)\n    return dups\n"),
+    ("javascript", "function sum(arr) {\n  let total = 0;\n  for (var i = 0; i <= arr.length; i++) {\n"
+                   "    total += arr[i];\n  }\n  return total;\n}\n"),
+]
+
+CONCEPTS = [("database indexing", "intermediate"), ("python generators", "beginner")]
+
+
+def _configure(args):
+    # settings 在导入时读取环境变量，必须先于导入 src 设置
+    os.environ["LLM_CASSETTE_MODE"] = "record" if args.record else "replay"
+    os.environ["LLM_CASSETTE_PATH"] = args.cassette
+    os.environ["LLM_CASSETTE_LATENCY_SCALE"] = str(args.latency_scale)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    os.environ["RESET_DB_ON_STARTUP"] = "True"
+    if not args.record:
+        if not os.path.exists(args.cassette):
+            raise SystemExit(f"Cassette not found: {args.cassette}; record one with --record first")
+        os.environ.setdefault("GEMINI_API_KEY", "offline")
+
+
+async def run_session(services, session_scope, timings):
+    with session_scope() as db:
+        candidate_id = services.create_candidate({
+            "name": "Benchmark Candidate",
+            "years_of_experience": 3,
+            "skills": {"python": "advanced", "sql": "intermediate"},
+            "education": "BSc Computer Science",
+            "current_level": "junior"
+        }, db)["candidate_id"]
+        session_id = (await services.start_interview({"candidate_id": candidate_id}, db))["session_id"]
+
+        for answer in ANSWERS:
+            started = time.perf_counter()
+            await services.process_answer(session_id, answer, db)
+            timings["process_answer"].append(time.perf_counter() - started)
+        await services.interview_engine.wait_for_evaluations(session_id, timeout=60)
+
+        for language, code in SNIPPETS:
+            started = time.perf_counter()
+            await services.code_analyzer.analyze_code(code, language)
+            timings["analyze_code"].append(time.perf_counter() - started)
+
+        for concept, level in CONCEPTS:
+            started = time.perf_counter()
+            await services.tech_explainer.explain_concept(concept, level, db_session=db)
+            timings["explain_concept"].append(time.perf_counter() - started)
+
+
+async def run(args):
+    import numpy as np
+
+    from src.core import services
+    from src.core.cassette import open_cassette
+    from src.database.models import init_db
+    from src.database.session import session_scope
+
+    init_db()
+    timings = {"process_answer": [], "analyze_code": [], "explain_concept": []}
+    sessions = 1 if args.record else args.sessions
+    started = time.perf_counter()
+    await asyncio.gather(*(run_session(services, session_scope, timings) for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    for name, values in timings.items():
+        latencies = np.array(values) * 1000
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"{name:<16} n={len(values):<4} p50={p50:8.1f}ms  p95={p95:8.1f}ms  p99={p99:8.1f}ms  "
+              f"max={latencies.max():8.1f}ms")
+    cassette = open_cassette(args.cassette, "record" if args.record else "replay")
+    print(f"sessions={sessions} elapsed={elapsed:.2f}s cassette={cassette.stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cassette", default="benchmarks/llm_cassette.jsonl")
+    parser.add_argument("--record", action="store_true", help="call the real model and append to the cassette")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions when replaying")
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    _configure(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""语义缓存命中检查：缩写与全称的查询应在默认阈值下互相命中，不同概念不应命中
+
+不调用模型，使用临时 SQLite 数据库，每组用例从空缓存开始、双向各检查一次；
+同时检查降级路径使用的 same_concept 判定：
+
+    python -m benchmarks.semantic_cache_check
+"""
+import argparse
+import os
+import tempfile
+
+# 缓存中的查询与新查询应当命中同一条解释
+SHOULD_HIT = [
+    ("GIL", "global interpreter lock"),
+    ("GIL", "Global Interpreter Lock (GIL)"),
+    ("Python GIL", "Global Interpreter Lock (GIL)"),
+]
+
+# 共享修饰词的不同概念不应命中
+SHOULD_MISS = [
+    ("Python decorators", "Python generators"),
+    ("React", "React hooks"),
+]
+
+# same_concept：实义词集合相同或互为首字母缩写才算同一概念，包含关系不算
+SAME_CONCEPT = [
+    ("GIL", "global interpreter lock", True),
+    ("GIL", "Global Interpreter Lock (GIL)", True),
+    ("the GIL in python", "Python GIL", True),
+    ("Python decorators", "python decorator", True),
+    ("binary search", "binary search tree", False),
+    ("React", "React hooks", False),
+    ("linked list", "doubly linked list", False),
+    ("Python decorators", "Python generators", False),
+]
+
+
+def _configure():
+    # settings 在导入时读取环境变量，必须先于导入 src 设置
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'semantic_cache.db')}"
+    os.environ["RESET_DB_ON_STARTUP"] = "True"
+    os.environ.setdefault("GEMINI_API_KEY", "offline")
+
+
+def check(threshold: float = None) -> int:
+    from src.core.semantic_cache import SemanticCache, same_concept
+    from src.database.models import ConceptExplanation, init_db
+    from src.database.session import session_scope
+
+    init_db()
+    failures = 0
+    cases = [(pair, True) for pair in SHOULD_HIT] + [(pair, False) for pair in SHOULD_MISS]
+    for (first, second), expected in cases:
+        for cached, query in ((first, second), (second, first)):
+            with session_scope() as db:
+                db.query(ConceptExplanation).delete()
+                db.commit()
+                cache = SemanticCache() if threshold is None else SemanticCache(threshold=threshold)
+                cache.add(db, cached, "intermediate", {"explanation": f"about {cached}"})
+                hit = cache.lookup(db, query, "intermediate")
+            ok = (hit is not None) == expected
+            failures += not ok
+            similarity = f"{hit[1]:.3f}" if hit is not None else "-"
+            print(f"{'ok  ' if ok else 'FAIL'} cached={cached!r:<34} query={query!r:<34} "
+                  f"expected={'hit' if expected else 'miss':<4} similarity={similarity}")
+
+    for first, second, expected in SAME_CONCEPT:
+        for a, b in ((first, second), (second, first)):
+            ok = same_concept(a, b) == expected
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} same_concept({a!r}, {b!r}) expected={expected}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=None, help="defaults to SemanticCache's threshold")
+    args = parser.parse_args()
+
+    _configure()
+    failures = check(args.threshold)
+    if failures:
+        raise SystemExit(f"{failures} semantic cache check(s) failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+import os
 import sys
 from pathlib import Path
-from src.api.middleware import error_handler
+from src.api.middleware import (
+    BodySizeLimitMiddleware,
+    CancelOnDisconnectMiddleware,
+    LLMUsageMiddleware,
+    RateLimitMiddleware,
+    error_handler
+)
 
 # 添加项目根目录到 Python 路径
 project_root = str(Path(__file__).parent)
@@ -9,7 +16,10 @@ if project_root not in sys.path:
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from src.api.routes import router as api_router
+from src.api.websocket import router as ws_router
+from src.core.services import job_queue
 from src.database.models import init_db
 from src.config import settings
 
@@ -39,8 +49,10 @@ async def lifespan(app: FastAPI):
         # Startup
         init_db()
         print("Database initialized successfully!")
+        await job_queue.start()
         yield
         # Shutdown
+        await job_queue.stop()
     except Exception as e:
         logging.error(f"Failed to initialize application: {e}")
         sys.exit(1)
@@ -53,22 +65,13 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # Basic root endpoint
 @app.get("/")
 async def root():
     return {
         "message": "Welcome to IT Interview Assistant API",
         "docs": "/docs",
-        "gradio_ui": "http://localhost:7860"
+        "gradio_ui": settings.GRADIO_PATH if settings.GRADIO_MOUNT else "http://localhost:7860"
     }
 
 # Hello endpoint (for testing)
@@ -78,6 +81,9 @@ async def say_hello(name: str):
 
 # Register API routes
 app.include_router(api_router, prefix="/api")
+# 面试 WebSocket 通道（/ws/interview/{session_id}）及其浏览器端客户端脚本
+app.include_router(ws_router)
+app.mount("/static", StaticFiles(directory=str(Path(__file__).parent / "src" / "ui" / "static")), name="static")
 
 # Startup event to initialize database
 @app.on_event("startup")
@@ -91,16 +97,50 @@ async def startup_event():
 
 # 在 main.py 中添加中间件
 app.middleware("http")(error_handler)
+# 按请求统计 LLM 调用次数、token 数和耗时，写入响应头
+app.add_middleware(LLMUsageMiddleware)
+# 客户端断开时取消请求处理及其中的 LLM 调用
+app.add_middleware(CancelOnDisconnectMiddleware)
+# 请求体超过上限时在解析之前返回 413；上传源文件的路由使用单独的上限
+app.add_middleware(BodySizeLimitMiddleware, path_limits={"/api/code/upload": settings.MAX_UPLOAD_BYTES})
+# 按客户端限流，LLM 容量饱和时直接返回 429，被拒绝的请求不进入后续处理
+app.add_middleware(RateLimitMiddleware)
+# Configure CORS：最外层，限流和请求体大小检查的拒绝响应也带有 CORS 头，浏览器端才能读到状态码和 Retry-After
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Retry-After"],
+)
+
+# 挂载模式：Gradio 与 API 运行在同一进程，界面直接调用服务层
+if settings.GRADIO_MOUNT:
+    import gradio as gr
+    from src.ui.gradio_app import create_gradio_app
+
+    app = gr.mount_gradio_app(app, create_gradio_app(in_process=True), path=settings.GRADIO_PATH)
 
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting IT Interview Assistant API...")
     logger.info("API docs will be available at: http://localhost:8000/docs")
-    logger.info("Gradio UI will be available at: http://localhost:7860")
+    if settings.GRADIO_MOUNT:
+        logger.info(f"Gradio UI will be available at: http://localhost:8000{settings.GRADIO_PATH}")
+    else:
+        logger.info("Gradio UI will be available at: http://localhost:7860")
+    if settings.API_WORKERS > 1:
+        # 多 worker：由父进程初始化一次数据库，worker 启动时不再清库
+        init_db()
+        os.environ["RESET_DB_ON_STARTUP"] = "false"
+        if settings.SESSION_STORE_BACKEND == "memory":
+            logger.warning("SESSION_STORE_BACKEND=memory with multiple workers: interview state is not shared")
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=settings.DEBUG_MODE
+        reload=settings.DEBUG_MODE and settings.API_WORKERS == 1,
+        workers=settings.API_WORKERS
     )
 
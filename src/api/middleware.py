@@ -1,7 +1,14 @@
+import asyncio
+import hashlib
+
 from fastapi import Request
 from fastapi.responses import JSONResponse
 import logging
 
+from src.config import settings
+from src.core.rate_limiter import retry_after_header
+from src.core.usage import UsageMeter, track_usage
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -20,3 +27,245 @@ async def error_handler(request: Request, call_next):
             }
         )
 
+
+
+class CancelOnDisconnectMiddleware:
+    """客户端断开连接时取消仍在处理中的 HTTP 请求
+
+    请求处理协程被取消后，其中等待的 LLM 调用也随之取消，不再为无人接收的结果付费。
+    流式响应本身会在断开时停止，这里主要针对普通请求。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # 由单独的协程读取 ASGI 消息并转交给应用，读到 http.disconnect 时取消请求处理
+        messages = asyncio.Queue()
+        response_complete = False
+
+        async def tracked_send(message):
+            nonlocal response_complete
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+
+        handler = asyncio.ensure_future(self.app(scope, messages.get, tracked_send))
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    # 响应发送完毕后服务器同样会报告断开，此时不能打断后台任务
+                    if not response_complete:
+                        handler.cancel()
+                    return
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await handler
+        except asyncio.CancelledError:
+            if not handler.cancelled():
+                handler.cancel()
+                raise
+            logger.info(f"Client disconnected, cancelled {scope['method']} {scope['path']}")
+        finally:
+            watcher.cancel()
+
+
+class LLMUsageMiddleware:
+    """按请求统计 LLM 用量，并通过响应头返回给客户端
+
+    请求处理期间（包括面试回合内的会话计量）发生的模型调用都会记到本请求的计量器上，
+    响应头 X-LLM-Calls / X-LLM-Tokens 给出调用次数和 token 数，Server-Timing 给出模型耗时。
+    流式响应的响应头在首块数据前发出，只包含此前的用量。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        usage = UsageMeter()
+
+        async def send_with_usage(message):
+            if message["type"] == "http.response.start" and usage.totals["calls"]:
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", [])) + [
+                        (b"x-llm-calls", str(int(usage.totals["calls"])).encode()),
+                        (b"x-llm-tokens", str(usage.total_tokens).encode()),
+                        (b"server-timing", f"llm;dur={usage.totals['wall_time'] * 1000:.1f}".encode())
+                    ]
+                }
+            await send(message)
+
+        with track_usage(usage):
+            await self.app(scope, receive, send_with_usage)
+
+
+# 会调用 LLM 的 POST 路由前缀（入队的后台任务同样会调用 LLM）
+LLM_ROUTE_PREFIXES = (
+    "/api/interview/start",
+    "/api/interview/answer/",
+    "/api/interview/end/",
+    "/api/code/",
+    "/api/explain/",
+    "/api/jobs/code-analysis",
+    "/api/jobs/learning-path",
+)
+# 不限流的路径：健康检查需要在过载时仍然可用
+RATE_LIMIT_EXEMPT = ("/api/health",)
+
+
+class RateLimitMiddleware:
+    """按客户端限流，并对调用 LLM 的请求做全局准入控制
+
+    只作用于 /api 下的 HTTP 请求；WebSocket 面试通道在每个回合前用同一个限流器和准入控制自行检查
+    （见 src.api.websocket），挂载的 Gradio 界面不经过这里。
+    客户端以 API key 请求头区分，没有时按 IP；key 只用于区分配额而不做认证，
+    伪造不同的 key 可以绕过单客户端配额，但绕不过全局准入上限。
+    调用 LLM 的请求先经过准入控制，再按 RATE_LIMIT_LLM_COST 扣减配额，其余请求每次计 1；
+    超限时直接返回 429 和 Retry-After，不排队。限流状态保存在进程内，多 worker 时各自计数。
+    """
+
+    def __init__(self, app, limiter=None, admission=None):
+        self.app = app
+        if limiter is None or admission is None:
+            from src.core import services
+            limiter = limiter or services.client_limiter
+            admission = admission or services.admission
+        self.limiter = limiter
+        self.admission = admission
+
+    @staticmethod
+    def client_key(scope) -> str:
+        headers = dict(scope.get("headers") or [])
+        api_key = headers.get(settings.RATE_LIMIT_KEY_HEADER.lower().encode())
+        if api_key:
+            # 不在内存中保留 key 明文
+            return "key:" + hashlib.sha256(api_key).hexdigest()[:32]
+        if settings.RATE_LIMIT_TRUST_FORWARDED and b"x-forwarded-for" in headers:
+            return "ip:" + headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def _reject(self, scope, receive, send, detail: str, retry_after: float):
+        response = JSONResponse(
+            status_code=429,
+            content={"detail": detail, "retry_after": float(retry_after_header(retry_after))},
+            headers={"Retry-After": retry_after_header(retry_after)}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (scope["type"] != "http" or not settings.RATE_LIMIT_ENABLED
+                or not path.startswith("/api/") or path in RATE_LIMIT_EXEMPT):
+            await self.app(scope, receive, send)
+            return
+
+        uses_llm = scope["method"] == "POST" and path.startswith(LLM_ROUTE_PREFIXES)
+        if uses_llm:
+            retry_after = self.admission.try_admit()
+            if retry_after is not None:
+                logger.warning(f"LLM capacity saturated, rejected {scope['method']} {path}")
+                await self._reject(scope, receive, send, "Server is at LLM capacity, retry later", retry_after)
+                return
+
+        try:
+            cost = settings.RATE_LIMIT_LLM_COST if uses_llm else 1
+            retry_after = self.limiter.acquire(self.client_key(scope), cost)
+            if retry_after:
+                await self._reject(scope, receive, send, "Rate limit exceeded", retry_after)
+                return
+            await self.app(scope, receive, send)
+        finally:
+            if uses_llm:
+                self.admission.release()
+
+
+class BodySizeLimitMiddleware:
+    """在读取和解析之前拒绝过大的请求体（413）
+
+    声明了 Content-Length 的请求直接按长度判断，不读取请求体；分块传输的请求在读取过程中计数，
+    超出上限时对应用报告连接断开，丢弃应用的响应改为返回 413，已读取的部分不超过上限。
+    path_limits 为路径前缀到上限的映射（如上传路由），其余路径使用 max_bytes。
+    """
+
+    def __init__(self, app, max_bytes: int = None, path_limits: dict = None):
+        self.app = app
+        self.max_bytes = settings.MAX_REQUEST_BYTES if max_bytes is None else max_bytes
+        self.path_limits = path_limits or {}
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.path_limits.items():
+            if path.startswith(prefix):
+                return limit
+        return self.max_bytes
+
+    @staticmethod
+    async def _reject(scope, receive, send, limit: int):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body exceeds the limit of {limit} bytes"},
+            headers={"Connection": "close"}
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope.get("path", ""))
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                declared = limit + 1
+            if declared > limit:
+                await self._reject(scope, receive, send, limit)
+                return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            if too_large:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    too_large = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if too_large:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not response_started:
+            await self._reject(scope, receive, send, limit)
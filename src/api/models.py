@@ -0,0 +1,52 @@
+from pydantic import AfterValidator, BaseModel, Field, HttpUrl
+from typing import Annotated, List, Optional
+
+from src.config import settings
+from src.core.job_queue import check_callback_url
+
+# 任务完成回调地址：合法的 http(s) URL，且不指向内网、回环或链路本地地址
+CallbackUrl = Annotated[HttpUrl, AfterValidator(lambda url: check_callback_url(str(url)))]
+
+
+class CodeItem(BaseModel):
+    code: str = Field(..., min_length=1, max_length=settings.CODE_MAX_CHARS)
+    language: str = Field(..., min_length=1, max_length=32)
+
+
+class AnalyzeCodeRequest(CodeItem):
+    measure: bool = False
+    function: Optional[str] = Field(None, max_length=200)
+    input_kind: Optional[str] = None
+
+
+class StartInterviewRequest(BaseModel):
+    candidate_id: str = Field(..., min_length=1, max_length=64)
+    position_level: str = Field("junior", max_length=32)
+    # 至少一项：面试从第一个技术开始，并按技术列表轮换主题
+    technologies: List[Annotated[str, Field(min_length=1, max_length=64)]] = Field(
+        default_factory=lambda: ["Python"], min_length=1, max_length=20
+    )
+
+
+class AnswerRequest(BaseModel):
+    answer: str = Field(..., min_length=1, max_length=settings.ANSWER_MAX_CHARS)
+
+
+class BatchAnalyzeRequest(BaseModel):
+    items: List[CodeItem] = Field(..., min_length=1)
+    max_concurrency: Optional[int] = Field(None, ge=1)
+
+
+class BatchAnalyzeJobRequest(BatchAnalyzeRequest):
+    callback_url: Optional[CallbackUrl] = None
+
+
+class LearningPathJobRequest(BaseModel):
+    topic: str
+    current_level: str
+    target_level: str
+    callback_url: Optional[CallbackUrl] = None
+
+
+class JobCallbackRequest(BaseModel):
+    callback_url: CallbackUrl
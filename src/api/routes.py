@@ -1,53 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Dict
-import uuid
+import json
 from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
 
+from src.database.export import ExportError, stream_export
+from src.database.search import SearchError, SearchUnavailableError, search
 from src.database.session import get_db
-from src.database.models import Session as DBSession, InterviewRecord
-from src.core.interview_engine import InterviewEngine
-from src.core.code_analyzer import CodeAnalyzer
-from src.core.tech_explainer import TechExplainer
-from src.database.models import Candidate
+from src.api.models import (
+    AnalyzeCodeRequest,
+    AnswerRequest,
+    BatchAnalyzeJobRequest,
+    BatchAnalyzeRequest,
+    CodeItem,
+    JobCallbackRequest,
+    LearningPathJobRequest,
+    StartInterviewRequest
+)
+from src.config import settings
+from src.core import services
+from src.core.code_units import language_for_filename
+from src.core.services import ServiceError, analytics, code_analyzer, job_queue, tech_explainer
 
 router = APIRouter()
-interview_engine = InterviewEngine()
-code_analyzer = CodeAnalyzer()
-tech_explainer = TechExplainer()
 
 
+@router.get("/health")
+async def health(db: Session = Depends(get_db)):
+    """健康检查：熔断打开或数据库不可用时 status 为 degraded，此时请求由降级数据源响应"""
+    return services.health(db)
+
 @router.post("/interview/start")
 async def start_interview(
-        request: dict,
+        request: StartInterviewRequest,
         db: Session = Depends(get_db)
 ):
-    """开始新的面试会话"""
+    """开始新的面试会话，包含候选人信息"""
     try:
-        if not request.get("candidate_id"):
-            raise HTTPException(status_code=400, detail="candidate_id is required")
-
-        result = await interview_engine.start_interview(
-            candidate_id=request["candidate_id"],
-            position_level=request.get("position_level", "junior"),
-            technologies=request.get("technologies", ["Python"]),
-            db_session=db
-        )
-
-        # 验证返回结果包含所有必需字段
-        required_fields = ["session_id", "question", "difficulty_level", "session_context"]
-        missing_fields = [field for field in required_fields if field not in result]
-
-        if missing_fields:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Missing required fields in response: {', '.join(missing_fields)}"
-            )
-
-        return result
-
-    except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        return await services.start_interview(request.model_dump(), db)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         print(f"Error in start_interview route: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -55,86 +49,153 @@ async def start_interview(
 @router.post("/interview/answer/{session_id}")
 async def process_answer(
     session_id: str,
-    answer: str,
+    request: AnswerRequest,
     db: Session = Depends(get_db)
 ):
-    # 处理答案并获取下一个问题
-    result = await interview_engine.process_answer(answer)
-    
-    # 记录答案和新问题
-    record = InterviewRecord(
-        id=str(uuid.uuid4()),
-        session_id=session_id,
-        question=result["next_question"],
-        answer=answer,
-        feedback=result["evaluation"]
-    )
-    db.add(record)
-    db.commit()
-    
-    return result
+    """处理答案并返回下一个问题，包含难度调整"""
+    try:
+        return await services.process_answer(session_id, request.answer, db)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/interview/evaluations/{session_id}")
+async def stream_refined_evaluations(session_id: str, since_turn: int = 0):
+    """以 Server-Sent Events 推送后台完成的 LLM 评估，全部完成后关闭连接"""
+    async def event_stream():
+        async for refined in services.interview_engine.refined_evaluations(session_id, since_turn):
+            yield f"event: evaluation\ndata: {json.dumps(refined, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 @router.post("/interview/end/{session_id}")
 async def end_interview(
     session_id: str,
     db: Session = Depends(get_db)
 ):
-    # 获取总结报告
-    result = await interview_engine.end_interview()
-    
-    # 更新会话状态
-    session = db.query(DBSession).filter(DBSession.id == session_id).first()
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    session.end_time = datetime.utcnow()
-    session.performance_score = float(result["overall_score"])
-    db.commit()
-    
-    return result
+    """结束面试并生成总结报告"""
+    try:
+        return await services.end_interview(session_id, db)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @router.post("/code/analyze")
-async def analyze_code(code: str, language: str):
-    return await code_analyzer.analyze_code(code, language)
+async def analyze_code(request: AnalyzeCodeRequest):
+    """分析代码；measure=true 时在沙箱中实测 Python 函数的时间/空间复杂度"""
+    try:
+        return await code_analyzer.analyze_code(
+            request.code,
+            request.language,
+            measure=request.measure,
+            function=request.function,
+            input_kind=request.input_kind
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _stream_analysis(code: str, language: str) -> StreamingResponse:
+    async def stream_events():
+        async for event in code_analyzer.analyze_code_stream(code, language):
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream_events(), media_type="application/x-ndjson")
+
+@router.post("/code/analyze/stream")
+async def analyze_code_stream(request: CodeItem):
+    """分块分析大文件，以 NDJSON 流依次返回分块计划、每个完成的分块和合并后的完整结果"""
+    return _stream_analysis(request.code, request.language)
+
+@router.post("/code/upload")
+async def upload_code(request: Request, language: Optional[str] = None, filename: Optional[str] = None):
+    """上传源文件并分块分析，返回与 /code/analyze/stream 相同的 NDJSON 流
+
+    文件可以放在 multipart 表单的 file 字段中（language 也可作为表单字段），也可以直接作为请求体发送；
+    请求体大小由中间件按 MAX_UPLOAD_BYTES 在读取时限制，未指定语言时按文件扩展名推断。
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        async with request.form(max_files=1, max_fields=4) as form:
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="multipart upload requires a 'file' field")
+            data = await upload.read()
+            filename = upload.filename or filename
+            language = form.get("language") or language
+    else:
+        data = b"".join([chunk async for chunk in request.stream()])
+
+    language = language or language_for_filename(filename)
+    if not language:
+        raise HTTPException(status_code=400, detail="language is required when it cannot be inferred from the filename")
+    try:
+        code = data.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Uploaded file must be UTF-8 text")
+    if not code.strip():
+        raise HTTPException(status_code=400, detail="Uploaded file is empty")
+    return _stream_analysis(code, language)
+
+@router.post("/code/analyze/batch")
+async def analyze_code_batch(request: BatchAnalyzeRequest):
+    """批量分析代码，以 NDJSON 流逐条返回已完成的结果"""
+    if len(request.items) > settings.CODE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many items: at most {settings.CODE_BATCH_MAX_ITEMS} per batch"
+        )
+
+    items = [item.model_dump() for item in request.items]
+
+    async def stream_results():
+        async for result in code_analyzer.analyze_batch(items, request.max_concurrency):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
 
 @router.post("/code/optimize")
-async def optimize_code(code: str, language: str):
-    return await code_analyzer.optimize_code(code, language)
+async def optimize_code(request: CodeItem):
+    """代码的复杂度和优化建议"""
+    return await code_analyzer.optimize_code(request.code, request.language)
 
 @router.post("/code/explain")
-async def explain_code(code: str, language: str):
-    return await code_analyzer.explain_code(code, language)
+async def explain_code(request: CodeItem):
+    """逐段解释代码"""
+    return await code_analyzer.explain_code(request.code, request.language)
 
 @router.post("/code/security")
-async def check_code_security(code: str, language: str):
-    return await code_analyzer.check_security(code, language)
+async def check_code_security(request: CodeItem):
+    """代码的潜在问题和安全隐患"""
+    return await code_analyzer.check_security(request.code, request.language)
 
 
 @router.post("/explain/concept")
 async def explain_technical_concept(
     concept: str,
-    level: str = "intermediate"
+    level: str = "intermediate",
+    db: Session = Depends(get_db)
 ):
     """获取技术概念解释"""
-    return await tech_explainer.explain_concept(concept, level)
+    return await tech_explainer.explain_concept(concept, level, db_session=db)
 
 @router.post("/explain/learning-path")
 async def get_learning_path(
     topic: str,
     current_level: str,
-    target_level: str
+    target_level: str,
+    db: Session = Depends(get_db)
 ):
     """获取学习路径建议"""
     return await tech_explainer.create_learning_path(
         topic,
         current_level,
-        target_level
+        target_level,
+        db_session=db
     )
 
 @router.post("/explain/concept-relations")
-async def get_concept_relations(concept: str):
+async def get_concept_relations(concept: str, db: Session = Depends(get_db)):
     """获取知识点关系图"""
-    return await tech_explainer.get_concept_relations(concept)
+    return await tech_explainer.get_concept_relations(concept, db_session=db)
 
 
 @router.post("/candidates/create")
@@ -144,50 +205,130 @@ async def create_candidate(
 ):
     """创建新的候选人档案"""
     try:
-        new_candidate = Candidate(
-            id=str(uuid.uuid4()),
-            name=candidate["name"],
-            years_of_experience=candidate["years_of_experience"],
-            skills=candidate["skills"],
-            education=candidate["education"],
-            current_level=candidate["current_level"]
-        )
-        db.add(new_candidate)
-        db.commit()
-        return {"candidate_id": new_candidate.id}
+        return services.create_candidate(candidate, db)
+    except ServiceError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
-        db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/interview/start")
-async def start_interview(
-    request: dict,
-    db: Session = Depends(get_db)
+
+@router.post("/jobs/code-analysis")
+async def enqueue_code_analysis(request: BatchAnalyzeJobRequest, db: Session = Depends(get_db)):
+    """以后台任务方式批量分析代码"""
+    if len(request.items) > settings.CODE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many items: at most {settings.CODE_BATCH_MAX_ITEMS} per batch"
+        )
+    payload = {
+        "items": [item.model_dump() for item in request.items],
+        "max_concurrency": request.max_concurrency
+    }
+    return {"job_id": job_queue.enqueue("code_batch", payload, db, request.callback_url)}
+
+@router.post("/jobs/learning-path")
+async def enqueue_learning_path(request: LearningPathJobRequest, db: Session = Depends(get_db)):
+    """以后台任务方式生成学习路径"""
+    payload = request.model_dump(exclude={"callback_url"})
+    return {"job_id": job_queue.enqueue("learning_path", payload, db, request.callback_url)}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, db: Session = Depends(get_db)):
+    """查询后台任务状态和结果"""
+    job = job_queue.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/{job_id}/callback")
+async def register_job_callback(job_id: str, request: JobCallbackRequest, db: Session = Depends(get_db)):
+    """登记任务完成回调地址"""
+    job = job_queue.set_callback(db, job_id, request.callback_url)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/export/{table}")
+async def export_table(
+    table: str,
+    format: str = "csv",
+    since: Optional[datetime] = None,
+    chunk_size: int = Query(1000, ge=1, le=50000)
 ):
-    """开始新的面试会话，包含候选人信息"""
+    """流式导出 sessions / interview_records / candidates，format 为 csv 或 parquet，
+    since 只导出该时间之后新增或更新的行"""
     try:
-        result = await interview_engine.start_interview(
-            candidate_id=request["candidate_id"],
-            position_level=request.get("position_level", "junior"),
-            technologies=request.get("technologies", ["Python"]),
-            db_session=db
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        chunks = stream_export(table, format, since, chunk_size)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/interview/answer/{session_id}")
-async def process_answer(
-    session_id: str,
-    request: dict,
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/vnd.apache.parquet"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    )
+
+@router.get("/search")
+async def search_records(
+    q: str,
+    scope: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
     db: Session = Depends(get_db)
 ):
-    """处理答案并返回下一个问题，包含难度调整"""
+    """全文检索候选人（姓名、技能等）和面试问答，按相关度排序分页；scope 为 candidates 或 answers 时只检索一类"""
     try:
-        result = await interview_engine.process_answer(
-            answer=request["answer"],
-            db_session=db
-        )
-        return result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        return search(db, q, scope, limit, offset)
+    except SearchUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except SearchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/analytics/cohorts")
+async def analytics_cohorts(
+    position_level: Optional[str] = None,
+    technology: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """各岗位级别 × 技术分群的会话数、及格率和平均分"""
+    return analytics.cohorts(db, position_level, technology)
+
+@router.get("/analytics/score-distribution")
+async def analytics_score_distribution(
+    position_level: Optional[str] = None,
+    technology: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """分数分布直方图，不指定条件时统计全部已完成面试"""
+    distribution = analytics.score_distribution(db, position_level, technology)
+    if distribution is None:
+        raise HTTPException(status_code=404, detail="No completed interviews for this cohort")
+    return distribution
+
+@router.get("/analytics/difficulty-progression")
+async def analytics_difficulty_progression(
+    position_level: Optional[str] = None,
+    technology: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """按题目序号统计平均难度和平均得分"""
+    return analytics.difficulty_progression(db, position_level, technology)
+
+@router.post("/analytics/refresh")
+async def analytics_refresh(full: bool = False, db: Session = Depends(get_db)):
+    """立即刷新汇总表；full=true 时全量重建"""
+    return analytics.refresh(db, full=full)
+
+@router.post("/calibration/run")
+async def run_calibration(db: Session = Depends(get_db)):
+    """以后台任务方式根据全部历史得分重新标定问题难度和候选人能力"""
+    return {"job_id": job_queue.enqueue("irt_calibration", {}, db)}
+
+@router.get("/calibration")
+async def get_calibration(db: Session = Depends(get_db)):
+    """最近一次难度标定的概要"""
+    summary = services.interview_engine.irt.summary(db)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No calibration has been run yet")
+    return summary
@@ -0,0 +1,246 @@
+"""面试 WebSocket 通道
+
+一场面试的所有回合共用一个连接：客户端发送回答，服务端依次推送初步评估、下一个问题、
+后台完成的 LLM 评估和最终报告。每条消息只包含本回合的增量，不再重复返回完整上下文。
+
+客户端消息：
+    {"type": "answer", "answer": "..."}   提交本回合回答（同一时间只能有一个回合在处理）
+    {"type": "end"}                       结束面试，收到 report 后服务端关闭连接
+    {"type": "ping"} / {"type": "pong"}   心跳
+服务端消息：
+    ready       连接建立时的当前问题
+    evaluation  评估结果，status 为 provisional（本地初步评分）、final 或 failed
+    question    下一个问题及难度、能力估计和 LLM 用量
+    report      面试报告
+    error       错误，status 与对应 HTTP 接口的状态码一致（422 时 detail 为校验错误列表）
+    ping / pong 心跳
+ready / question 中的 turn 是对该问题的回答将得到的回合号，与之后 evaluation 的 turn 对应。
+
+每个 answer / end 回合与对应的 HTTP 接口一样经过全局准入控制，并按 RATE_LIMIT_LLM_COST 扣减该客户端
+（API key 请求头或 IP，与 HTTP 接口共用配额）的限流配额；超限时回复 status 为 429、带 retry_after 的 error，
+连接保持打开。
+
+服务端每隔 WS_HEARTBEAT_INTERVAL 秒发送 ping，超过 WS_HEARTBEAT_TIMEOUT 秒未收到客户端任何消息即断开。
+发送经过长度为 WS_SEND_QUEUE_SIZE 的队列：客户端读取过慢时产生消息的一方会等待，
+接收循环随之暂停读取，压力最终传导回客户端，而不是在服务端无限堆积消息。
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from src.api.middleware import RateLimitMiddleware
+from src.api.models import AnswerRequest
+from src.config import settings
+from src.core import services
+from src.core.rate_limiter import retry_after_header
+from src.core.services import ServiceError
+from src.database.session import session_scope
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 关闭码：4000 + 对应的 HTTP 状态码
+CLOSE_NOT_FOUND = 4404
+CLOSE_HEARTBEAT_TIMEOUT = 4408
+
+
+class _InterviewConnection:
+    def __init__(self, websocket: WebSocket, session_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.client_key = RateLimitMiddleware.client_key(websocket.scope)
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=max(settings.WS_SEND_QUEUE_SIZE, 1))
+        self.loop = asyncio.get_running_loop()
+        self.last_received = self.loop.time()
+        self.turn_task: Optional[asyncio.Task] = None
+        self.tasks = set()
+
+    def spawn(self, coroutine) -> asyncio.Task:
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def push(self, message: Dict):
+        await self.outbox.put(message)
+
+    async def error(self, detail, status: int = 400, **extra):
+        await self.push({"type": "error", "status": status, "detail": detail, **extra})
+
+    async def admit(self) -> bool:
+        """回合开始前的准入控制和限流；通过时返回 True，之后必须调用 release"""
+        if not settings.RATE_LIMIT_ENABLED:
+            return True
+        retry_after = services.admission.try_admit()
+        if retry_after is not None:
+            await self.error("Server is at LLM capacity, retry later", 429,
+                             retry_after=float(retry_after_header(retry_after)))
+            return False
+        retry_after = services.client_limiter.acquire(self.client_key, settings.RATE_LIMIT_LLM_COST)
+        if retry_after:
+            services.admission.release()
+            await self.error("Rate limit exceeded", 429, retry_after=float(retry_after_header(retry_after)))
+            return False
+        return True
+
+    def release(self):
+        if settings.RATE_LIMIT_ENABLED:
+            services.admission.release()
+
+    async def sender(self):
+        while True:
+            message = await self.outbox.get()
+            await self.websocket.send_text(json.dumps(message, ensure_ascii=False, default=str))
+            self.outbox.task_done()
+
+    async def heartbeat(self):
+        while True:
+            await asyncio.sleep(settings.WS_HEARTBEAT_INTERVAL)
+            if self.loop.time() - self.last_received > settings.WS_HEARTBEAT_TIMEOUT:
+                logger.info(f"Interview channel {self.session_id} heartbeat timed out")
+                await self.websocket.close(code=CLOSE_HEARTBEAT_TIMEOUT)
+                return
+            await self.push({"type": "ping"})
+
+    async def push_evaluation(self, turn: int, evaluation: Dict, status: str):
+        await self.push({
+            "type": "evaluation",
+            "turn": turn,
+            "status": "provisional" if status == "pending" else status,
+            "evaluation": evaluation
+        })
+
+    async def push_refinement(self, turn: int):
+        """后台 LLM 评估完成后推送该回合的最终评估"""
+        async for refined in services.interview_engine.refined_evaluations(self.session_id, since_turn=turn):
+            if refined["turn"] == turn:
+                await self.push({"type": "evaluation", **refined})
+                return
+
+    async def run_turn(self, answer: str):
+        """处理一个回合；调用前已通过 admit()，任务结束（包括尚未开始就被取消）时释放准入名额"""
+        try:
+            with session_scope() as db:
+                result = await services.process_answer(
+                    self.session_id, answer, db, on_evaluation=self.push_evaluation
+                )
+        except ServiceError as e:
+            await self.error(e.detail, e.status_code)
+            return
+        except Exception as e:
+            logger.error(f"Error in interview channel {self.session_id}: {e}", exc_info=True)
+            await self.error(str(e), 500)
+            return
+
+        turn = result["evaluation_turn"]
+        await self.push({
+            "type": "question",
+            "turn": len(result["session_context"]),
+            "question": result["next_question"],
+            "difficulty": result["current_difficulty"],
+            "ability": result.get("ability"),
+            "usage": result.get("usage"),
+            "budget_exceeded": result.get("budget_exceeded")
+        })
+        if result["session_context"][turn]["metadata"].get("evaluation_status") == "pending":
+            self.spawn(self.push_refinement(turn))
+
+    async def end(self) -> bool:
+        """结束面试并推送报告，成功时返回 True"""
+        if not await self.admit():
+            return False
+        try:
+            with session_scope() as db:
+                report = await services.end_interview(self.session_id, db)
+        except ServiceError as e:
+            await self.error(e.detail, e.status_code)
+            return False
+        finally:
+            self.release()
+        await self.push({"type": "report", "report": report})
+        return True
+
+    async def drain(self, timeout: float = 5.0):
+        """关闭前把队列中剩余的消息发完"""
+        try:
+            await asyncio.wait_for(self.outbox.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def receive_loop(self):
+        while True:
+            raw = await self.websocket.receive_text()
+            self.last_received = self.loop.time()
+            try:
+                message = json.loads(raw)
+                kind = message.get("type")
+            except (json.JSONDecodeError, AttributeError):
+                await self.error("Messages must be JSON objects with a type field")
+                continue
+
+            if kind == "ping":
+                await self.push({"type": "pong"})
+            elif kind == "pong":
+                continue
+            elif kind == "answer":
+                if self.turn_task is not None and not self.turn_task.done():
+                    await self.error("The previous answer is still being processed", 409)
+                    continue
+                # 与 HTTP 接口相同的校验（类型、长度）；错误详情不回显输入内容
+                try:
+                    request = AnswerRequest.model_validate({"answer": message.get("answer")})
+                except ValidationError as e:
+                    await self.error(e.errors(include_url=False, include_input=False), 422)
+                    continue
+                if await self.admit():
+                    self.turn_task = self.spawn(self.run_turn(request.answer))
+                    self.turn_task.add_done_callback(lambda _: self.release())
+            elif kind == "end":
+                if self.turn_task is not None and not self.turn_task.done():
+                    await self.error("The previous answer is still being processed", 409)
+                elif await self.end():
+                    await self.drain()
+                    await self.websocket.close()
+                    return
+            else:
+                await self.error(f"Unknown message type: {kind}")
+
+
+@router.websocket("/ws/interview/{session_id}")
+async def interview_channel(websocket: WebSocket, session_id: str):
+    """面试全双工通道，协议见模块说明"""
+    await websocket.accept()
+    loaded = services.interview_engine.sessions.load(session_id)
+    if loaded is None:
+        await websocket.send_json({"type": "error", "status": 404, "detail": "No active interview session"})
+        await websocket.close(code=CLOSE_NOT_FOUND)
+        return
+
+    connection = _InterviewConnection(websocket, session_id)
+    context = loaded[0]["context"]
+    await connection.push({
+        "type": "ready",
+        "turn": len(context),
+        "question": context[-1]["content"],
+        "difficulty": context[-1]["metadata"].get("difficulty")
+    })
+
+    # 接收结束、发送失败（连接已断开）或心跳超时，任一发生即关闭通道
+    receiver = connection.spawn(connection.receive_loop())
+    sender = connection.spawn(connection.sender())
+    heartbeat = connection.spawn(connection.heartbeat())
+    try:
+        await asyncio.wait({receiver, sender, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+        if receiver.done() and not receiver.cancelled() and receiver.exception() is not None:
+            raise receiver.exception()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # 客户端断开时与 HTTP 请求一致：取消进行中的回合及其 LLM 调用
+        for task in list(connection.tasks):
+            task.cancel()
@@ -9,6 +9,137 @@ class Settings(BaseSettings):
     HF_API_KEY: str = os.getenv("HF_API_KEY", "")
     DEBUG_MODE: bool = os.getenv("DEBUG_MODE", "True").lower() == "true"
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./interview_assistant.db")
+    # 启动时是否清空数据库；关闭后概念图等持久化数据可跨重启保留
+    RESET_DB_ON_STARTUP: bool = os.getenv("RESET_DB_ON_STARTUP", "True").lower() == "true"
+    # 是否将 Gradio 界面挂载到 FastAPI 应用中（进程内直接调用服务层）
+    GRADIO_MOUNT: bool = os.getenv("GRADIO_MOUNT", "False").lower() == "true"
+    GRADIO_PATH: str = os.getenv("GRADIO_PATH", "/ui")
+    # 批量代码分析：并发上限、单条最大条目数、小片段打包阈值
+    CODE_BATCH_CONCURRENCY: int = int(os.getenv("CODE_BATCH_CONCURRENCY", "4"))
+    CODE_BATCH_MAX_ITEMS: int = int(os.getenv("CODE_BATCH_MAX_ITEMS", "200"))
+    CODE_BATCH_PACK_SIZE: int = int(os.getenv("CODE_BATCH_PACK_SIZE", "5"))
+    CODE_BATCH_SMALL_SNIPPET_CHARS: int = int(os.getenv("CODE_BATCH_SMALL_SNIPPET_CHARS", "1500"))
+    # 增量代码分析：按顶层函数/类拆分，只重新分析有变化的单元；单元分析结果缓存条数
+    CODE_INCREMENTAL_ANALYSIS: bool = os.getenv("CODE_INCREMENTAL_ANALYSIS", "True").lower() == "true"
+    CODE_UNIT_CACHE_SIZE: int = int(os.getenv("CODE_UNIT_CACHE_SIZE", "2048"))
+    # 请求体大小上限（字节，读取和解析之前检查），上传源文件的路由单独设上限；代码和回答的最大字符数
+    MAX_REQUEST_BYTES: int = int(os.getenv("MAX_REQUEST_BYTES", str(2 * 1024 * 1024)))
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+    CODE_MAX_CHARS: int = int(os.getenv("CODE_MAX_CHARS", "200000"))
+    ANSWER_MAX_CHARS: int = int(os.getenv("ANSWER_MAX_CHARS", "20000"))
+    # 大文件分块分析：每块的 token 预算（按约 4 字符一个 token 估算），超出预算的单元继续按方法或行拆分
+    CODE_CHUNK_TOKEN_BUDGET: int = int(os.getenv("CODE_CHUNK_TOKEN_BUDGET", "2000"))
+    # 全文检索：命中数超过该值时只对最新的这么多条命中按相关度排序，保证常见词的查询延迟
+    SEARCH_RANK_WINDOW: int = int(os.getenv("SEARCH_RANK_WINDOW", "10000"))
+    # 实测代码复杂度：子进程的测量时间预算（秒）、CPU 秒数上限、内存上限（MB）、最大输入规模、同时运行的测量进程数
+    # 实测复杂度会在服务器上执行客户端提交的代码，默认关闭；沙箱中降权运行所用的 uid/gid（以 root 运行服务时生效）
+    COMPLEXITY_MEASURE_ENABLED: bool = os.getenv("COMPLEXITY_MEASURE_ENABLED", "False").lower() == "true"
+    COMPLEXITY_SANDBOX_UID: int = int(os.getenv("COMPLEXITY_SANDBOX_UID", "65534"))
+    COMPLEXITY_SANDBOX_GID: int = int(os.getenv("COMPLEXITY_SANDBOX_GID", "65534"))
+    COMPLEXITY_TIME_BUDGET: float = float(os.getenv("COMPLEXITY_TIME_BUDGET", "5"))
+    COMPLEXITY_CPU_SECONDS: int = int(os.getenv("COMPLEXITY_CPU_SECONDS", "15"))
+    COMPLEXITY_MEMORY_MB: int = int(os.getenv("COMPLEXITY_MEMORY_MB", "512"))
+    COMPLEXITY_MAX_INPUT_SIZE: int = int(os.getenv("COMPLEXITY_MAX_INPUT_SIZE", "100000"))
+    COMPLEXITY_MAX_CONCURRENCY: int = int(os.getenv("COMPLEXITY_MAX_CONCURRENCY", "2"))
+    # 小型LLM请求的时间窗口微批处理（默认关闭）
+    LLM_MICRO_BATCH: bool = os.getenv("LLM_MICRO_BATCH", "False").lower() == "true"
+    LLM_MICRO_BATCH_WINDOW_MS: float = float(os.getenv("LLM_MICRO_BATCH_WINDOW_MS", "10"))
+    LLM_MICRO_BATCH_MAX_SIZE: int = int(os.getenv("LLM_MICRO_BATCH_MAX_SIZE", "8"))
+    # 概念图：单次学习路径请求最多触发的LLM节点展开次数
+    CONCEPT_GRAPH_MAX_EXPANSIONS: int = int(os.getenv("CONCEPT_GRAPH_MAX_EXPANSIONS", "8"))
+    # 概念解释的语义近似缓存
+    SEMANTIC_CACHE_ENABLED: bool = os.getenv("SEMANTIC_CACHE_ENABLED", "True").lower() == "true"
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.8"))
+    # 重复问题检测：MinHash 估计相似度阈值（LSH 分段方式由阈值推导）、题库替换的难度容差、重新生成次数
+    QUESTION_DEDUP_THRESHOLD: float = float(os.getenv("QUESTION_DEDUP_THRESHOLD", "0.5"))
+    QUESTION_POOL_DIFFICULTY_TOLERANCE: float = float(os.getenv("QUESTION_POOL_DIFFICULTY_TOLERANCE", "0.25"))
+    QUESTION_DEDUP_MAX_RETRIES: int = int(os.getenv("QUESTION_DEDUP_MAX_RETRIES", "2"))
+    # 本地初步评分：LLM 评估在后台完善；结束面试时最多等待后台评估的秒数
+    PROVISIONAL_SCORING: bool = os.getenv("PROVISIONAL_SCORING", "True").lower() == "true"
+    EVALUATION_REFINE_TIMEOUT: float = float(os.getenv("EVALUATION_REFINE_TIMEOUT", "60"))
+    # LLM 调用截止时间（秒）；开启对冲时，耗时超过近期延迟分位数（不低于最小等待秒数）后再发出一个相同请求
+    LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", "60"))
+    LLM_HEDGING: bool = os.getenv("LLM_HEDGING", "True").lower() == "true"
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    # 模型路由：档位按从强到快排列（名称=模型，模型写成 fake[:秒] 时使用本地假模型）；各任务的首选档位和延迟 SLO（秒）；
+    # 任务近期延迟的分位数超出 SLO 时在冷却期内降到更快的档位
+    LLM_MODEL_TIERS: str = os.getenv("LLM_MODEL_TIERS", "pro=gemini-pro,flash=gemini-1.5-flash")
+    LLM_TASK_ROUTES: str = os.getenv(
+        "LLM_TASK_ROUTES",
+        "question_generation=pro:20;evaluation=flash:8;recommendations=pro:30;code_analysis=pro:30;explanation=flash:10"
+    )
+    LLM_ROUTER_WINDOW: int = int(os.getenv("LLM_ROUTER_WINDOW", "50"))
+    LLM_ROUTER_MIN_SAMPLES: int = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "10"))
+    LLM_ROUTER_PERCENTILE: float = float(os.getenv("LLM_ROUTER_PERCENTILE", "90"))
+    LLM_ROUTER_COOLDOWN: float = float(os.getenv("LLM_ROUTER_COOLDOWN", "60"))
+    # LLM 熔断：最近若干次调用中失败或慢调用比例超过阈值时打开，打开若干秒后放行一次探测调用
+    LLM_BREAKER_WINDOW: int = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+    LLM_BREAKER_MIN_CALLS: int = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+    LLM_BREAKER_ERROR_RATE: float = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+    LLM_BREAKER_SLOW_CALL_SECONDS: float = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "20"))
+    LLM_BREAKER_SLOW_CALL_RATE: float = float(os.getenv("LLM_BREAKER_SLOW_CALL_RATE", "0.5"))
+    LLM_BREAKER_OPEN_SECONDS: float = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+    # 入站限流：按 API key（RATE_LIMIT_KEY_HEADER 请求头）或客户端 IP 的滑动窗口配额，调用 LLM 的请求按 RATE_LIMIT_LLM_COST 计数；
+    # 只有部署在可信反向代理之后时才开启 RATE_LIMIT_TRUST_FORWARDED，按 X-Forwarded-For 识别客户端
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_REQUESTS: float = float(os.getenv("RATE_LIMIT_REQUESTS", "120"))
+    RATE_LIMIT_WINDOW: float = float(os.getenv("RATE_LIMIT_WINDOW", "60"))
+    RATE_LIMIT_LLM_COST: float = float(os.getenv("RATE_LIMIT_LLM_COST", "10"))
+    RATE_LIMIT_KEY_HEADER: str = os.getenv("RATE_LIMIT_KEY_HEADER", "x-api-key")
+    RATE_LIMIT_TRUST_FORWARDED: bool = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "False").lower() == "true"
+    # 准入控制：处理中的 LLM 请求数或进行中的 LLM 调用数（含后台任务）达到上限时直接返回 429
+    ADMISSION_MAX_LLM_REQUESTS: int = int(os.getenv("ADMISSION_MAX_LLM_REQUESTS", "64"))
+    ADMISSION_MAX_LLM_CALLS: int = int(os.getenv("ADMISSION_MAX_LLM_CALLS", "128"))
+    # 熔断降级时复用已缓存概念解释的相似度下限（低于正常缓存命中阈值）
+    DEGRADED_EXPLANATION_THRESHOLD: float = float(os.getenv("DEGRADED_EXPLANATION_THRESHOLD", "0.5"))
+    # 分群统计：及格分数线（修改后需全量刷新）、汇总表自动刷新间隔（秒）、分块读取行数
+    ANALYTICS_PASS_SCORE: float = float(os.getenv("ANALYTICS_PASS_SCORE", "60"))
+    ANALYTICS_REFRESH_INTERVAL: float = float(os.getenv("ANALYTICS_REFRESH_INTERVAL", "60"))
+    ANALYTICS_CHUNK_SIZE: int = int(os.getenv("ANALYTICS_CHUNK_SIZE", "50000"))
+    # IRT 难度标定：出题目标得分率、能力/难度先验标准差、问题参与标定的最少回答数、能力估计收敛的标准误
+    IRT_TARGET_SCORE: float = float(os.getenv("IRT_TARGET_SCORE", "0.5"))
+    IRT_PRIOR_SD: float = float(os.getenv("IRT_PRIOR_SD", "1.0"))
+    IRT_MIN_ITEM_RESPONSES: int = int(os.getenv("IRT_MIN_ITEM_RESPONSES", "2"))
+    IRT_STOP_STANDARD_ERROR: float = float(os.getenv("IRT_STOP_STANDARD_ERROR", "0.4"))
+    # 提示模板：额外版本的 JSON 文件、各版本流量权重（如 "interview_question=v1:90,v2:10"）
+    PROMPT_TEMPLATE_FILE: str = os.getenv("PROMPT_TEMPLATE_FILE", "")
+    PROMPT_TEMPLATE_WEIGHTS: str = os.getenv("PROMPT_TEMPLATE_WEIGHTS", "")
+    # 模型端上下文缓存：复用提示模板的静态前缀；前缀短于最小字符数时（后端有最小缓存长度要求）直接发送全文
+    LLM_CONTEXT_CACHE: bool = os.getenv("LLM_CONTEXT_CACHE", "False").lower() == "true"
+    LLM_CONTEXT_CACHE_TTL: float = float(os.getenv("LLM_CONTEXT_CACHE_TTL", "3600"))
+    LLM_CONTEXT_CACHE_MIN_CHARS: int = int(os.getenv("LLM_CONTEXT_CACHE_MIN_CHARS", "0"))
+    # 每场面试的 LLM 预算（token 数、累计调用秒数、调用次数，0 表示不限）；超出后改用本地评分和题库问题
+    SESSION_TOKEN_BUDGET: int = int(os.getenv("SESSION_TOKEN_BUDGET", "0"))
+    SESSION_LLM_SECONDS_BUDGET: float = float(os.getenv("SESSION_LLM_SECONDS_BUDGET", "0"))
+    SESSION_LLM_CALL_BUDGET: int = int(os.getenv("SESSION_LLM_CALL_BUDGET", "0"))
+    # LLM 流量 cassette：record 把调用录制到 JSONL 文件，replay 按提示回放录制的响应（耗时乘以缩放系数，0 表示不等待）
+    LLM_CASSETTE_MODE: str = os.getenv("LLM_CASSETTE_MODE", "")
+    LLM_CASSETTE_PATH: str = os.getenv("LLM_CASSETTE_PATH", "./llm_cassette.jsonl")
+    LLM_CASSETTE_LATENCY_SCALE: float = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", "1.0"))
+    # 面试 WebSocket 通道：心跳间隔、超过该秒数未收到客户端任何消息即断开、待发送消息队列上限
+    WS_HEARTBEAT_INTERVAL: float = float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+    WS_HEARTBEAT_TIMEOUT: float = float(os.getenv("WS_HEARTBEAT_TIMEOUT", "60"))
+    WS_SEND_QUEUE_SIZE: int = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))
+    # 后台任务队列：工作协程数、失败重试次数、重试间隔（秒，按尝试次数递增）
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_MAX_RETRIES: int = int(os.getenv("JOB_MAX_RETRIES", "2"))
+    JOB_RETRY_BACKOFF: float = float(os.getenv("JOB_RETRY_BACKOFF", "2"))
+    # 任务租约：运行中的任务每隔租约的三分之一刷新心跳，超过该秒数未刷新即视为所在进程已中断，由巡检重新入队
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    # 任务完成回调：失败时的重试次数；允许回调的内网主机名或地址（逗号分隔，默认只允许公网地址）
+    JOB_CALLBACK_RETRIES: int = int(os.getenv("JOB_CALLBACK_RETRIES", "3"))
+    JOB_CALLBACK_ALLOWED_HOSTS: str = os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "")
+    # uvicorn worker 进程数；大于 1 时应使用 sqlite 会话存储，让各 worker 共享面试状态
+    API_WORKERS: int = int(os.getenv("API_WORKERS", "1"))
+    # 面试会话状态存储：memory（单进程）或 sqlite（WAL 模式，多进程共享）
+    SESSION_STORE_BACKEND: str = os.getenv("SESSION_STORE_BACKEND", "memory")
+    SESSION_STORE_PATH: str = os.getenv("SESSION_STORE_PATH", "./session_state.db")
+    # 超过该秒数没有新回合的面试会话（未调用结束接口）被清理，0 表示不清理
+    SESSION_IDLE_TTL: float = float(os.getenv("SESSION_IDLE_TTL", "14400"))
+    # 等待其他 worker 上的后台评估时轮询会话存储的间隔（秒）
+    SESSION_POLL_INTERVAL: float = float(os.getenv("SESSION_POLL_INTERVAL", "0.5"))
     
     class Config:
         env_file = ".env"
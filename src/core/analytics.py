@@ -0,0 +1,280 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from src.database.models import (
+    AnalyticsCohort,
+    AnalyticsDifficultyProgression,
+    AnalyticsState,
+    InterviewRecord,
+    Session
+)
+
+ALL = "*"  # 汇总行：不区分岗位级别或技术
+HISTOGRAM_BINS = 10
+COHORT_KEYS = ["position_level", "technology"]
+PROGRESSION_KEYS = COHORT_KEYS + ["turn_index"]
+# 刚结束的会话留到下一次刷新，避免水位线越过尚未提交的会话
+_SETTLE = timedelta(seconds=5)
+_STATE_KEY = "completed_sessions"
+
+
+def _with_rollups(frame: pd.DataFrame) -> pd.DataFrame:
+    """把逗号分隔的技术栈展开成每项一行，并补充按岗位、按技术和全体的汇总行"""
+    frame = frame.assign(position_level=frame["position_level"].fillna("unknown"))
+    by_technology = frame.assign(technology=frame["technologies"].fillna("").str.split(",")).explode("technology")
+    by_technology["technology"] = by_technology["technology"].str.strip()
+    by_technology = by_technology[by_technology["technology"] != ""]
+
+    return pd.concat([
+        by_technology,
+        by_technology.assign(position_level=ALL),
+        frame.assign(technology=ALL),
+        frame.assign(position_level=ALL, technology=ALL)
+    ], ignore_index=True)
+
+
+class CohortAnalytics:
+    """已完成面试的分群统计
+
+    sessions / interview_records 按列分块读入 pandas，分组聚合全部向量化计算，
+    结果累加进 analytics_* 汇总表。聚合量都是可相加的计数和求和，因此每次刷新
+    只需处理水位线之后结束的会话；查询接口直接读汇总表。
+    """
+
+    def __init__(self, pass_score: float = 60.0, chunk_size: int = 50000, refresh_interval: float = 60.0):
+        self.pass_score = pass_score
+        self.chunk_size = chunk_size
+        self.refresh_interval = refresh_interval
+
+    def _cohort_aggregates(self, sessions: pd.DataFrame) -> pd.DataFrame:
+        sessions = _with_rollups(sessions)
+        scores = sessions["performance_score"].astype(float)
+        buckets = np.clip(scores // (100 / HISTOGRAM_BINS), 0, HISTOGRAM_BINS - 1).astype(int)
+        frame = sessions[COHORT_KEYS].assign(
+            score=scores,
+            score_sq=scores ** 2,
+            passed=(scores >= self.pass_score).astype(int),
+            bucket=buckets
+        )
+
+        grouped = frame.groupby(COHORT_KEYS)
+        totals = grouped.agg(
+            session_count=("score", "size"),
+            pass_count=("passed", "sum"),
+            score_sum=("score", "sum"),
+            score_sq_sum=("score_sq", "sum")
+        )
+        histogram = (
+            frame.groupby(COHORT_KEYS + ["bucket"]).size()
+            .unstack("bucket", fill_value=0)
+            .reindex(columns=range(HISTOGRAM_BINS), fill_value=0)
+        )
+        return totals.join(histogram)
+
+    def _progression_aggregates(self, records: pd.DataFrame) -> pd.DataFrame:
+        records = _with_rollups(records)
+        return records.groupby(PROGRESSION_KEYS).agg(
+            answer_count=("turn_index", "size"),
+            # 难度为空的回答（旧记录）不计入平均难度的分母
+            difficulty_count=("difficulty", "count"),
+            difficulty_sum=("difficulty", "sum"),
+            scored_count=("score", "count"),
+            score_sum=("score", "sum")
+        )
+
+    def _aggregate(self, db_session, statement, aggregate) -> Optional[pd.DataFrame]:
+        """分块读取并聚合，各块的部分结果相加"""
+        total = None
+        for chunk in pd.read_sql(statement, db_session.connection(), chunksize=self.chunk_size):
+            if chunk.empty:
+                continue
+            partial = aggregate(chunk)
+            total = partial if total is None else total.add(partial, fill_value=0)
+        return total
+
+    def refresh(self, db_session, full: bool = False) -> Dict:
+        """增量刷新汇总表；full 为 True 时清空后重建（例如修改了及格线之后）"""
+        now = datetime.utcnow()
+        cutoff = now - _SETTLE
+
+        # 新增 difficulty_count 列之前累加的汇总行无法补算，全量重建一次
+        full = full or self._has_legacy_progression(db_session)
+        if full:
+            db_session.query(AnalyticsCohort).delete()
+            db_session.query(AnalyticsDifficultyProgression).delete()
+            db_session.query(AnalyticsState).filter(AnalyticsState.key == _STATE_KEY).delete()
+            state = None
+        else:
+            state = db_session.get(AnalyticsState, _STATE_KEY)
+        watermark = state.watermark if state is not None else None
+
+        completed = [Session.end_time.isnot(None), Session.performance_score.isnot(None), Session.end_time <= cutoff]
+        if watermark is not None:
+            completed.append(Session.end_time > watermark)
+
+        cohorts = self._aggregate(
+            db_session,
+            select(Session.position_level, Session.technologies, Session.performance_score).where(*completed),
+            self._cohort_aggregates
+        )
+        turn_index = func.row_number().over(
+            partition_by=InterviewRecord.session_id, order_by=InterviewRecord.timestamp
+        ).label("turn_index")
+        progression = self._aggregate(
+            db_session,
+            select(
+                Session.position_level, Session.technologies,
+                InterviewRecord.score, InterviewRecord.difficulty, turn_index
+            ).join(Session, InterviewRecord.session_id == Session.id).where(*completed),
+            self._progression_aggregates
+        )
+
+        # 按原水位线条件更新，并发刷新时只有一个能提交，其余回滚，避免重复累加
+        try:
+            if state is None:
+                db_session.add(AnalyticsState(key=_STATE_KEY, watermark=cutoff, refreshed_at=now))
+                db_session.flush()
+            else:
+                condition = (
+                    AnalyticsState.watermark.is_(None) if watermark is None
+                    else AnalyticsState.watermark == watermark
+                )
+                updated = db_session.query(AnalyticsState).filter(
+                    AnalyticsState.key == _STATE_KEY, condition
+                ).update({"watermark": cutoff, "refreshed_at": now}, synchronize_session=False)
+                if not updated:
+                    db_session.rollback()
+                    return {"refreshed": False, "reason": "concurrent refresh"}
+        except IntegrityError:
+            db_session.rollback()
+            return {"refreshed": False, "reason": "concurrent refresh"}
+
+        if cohorts is not None:
+            self._merge_cohorts(db_session, cohorts)
+        if progression is not None:
+            self._merge_progression(db_session, progression)
+        db_session.commit()
+
+        return {
+            "refreshed": True,
+            "full": full,
+            "watermark": cutoff.isoformat(),
+            "new_sessions": int(cohorts.loc[(ALL, ALL), "session_count"]) if cohorts is not None else 0
+        }
+
+    @staticmethod
+    def _has_legacy_progression(db_session) -> bool:
+        return db_session.query(AnalyticsDifficultyProgression.turn_index).filter(
+            AnalyticsDifficultyProgression.difficulty_count.is_(None)
+        ).first() is not None
+
+    def refresh_if_stale(self, db_session):
+        state = db_session.get(AnalyticsState, _STATE_KEY)
+        if state is None or state.refreshed_at is None or (
+                datetime.utcnow() - state.refreshed_at
+        ).total_seconds() >= self.refresh_interval or self._has_legacy_progression(db_session):
+            self.refresh(db_session)
+
+    def _merge_cohorts(self, db_session, cohorts: pd.DataFrame):
+        for (position_level, technology), row in cohorts.iterrows():
+            cohort = db_session.get(AnalyticsCohort, (position_level, technology))
+            if cohort is None:
+                cohort = AnalyticsCohort(
+                    position_level=position_level, technology=technology,
+                    session_count=0, pass_count=0, score_sum=0.0, score_sq_sum=0.0,
+                    score_histogram=[0] * HISTOGRAM_BINS
+                )
+                db_session.add(cohort)
+            cohort.session_count += int(row["session_count"])
+            cohort.pass_count += int(row["pass_count"])
+            cohort.score_sum += float(row["score_sum"])
+            cohort.score_sq_sum += float(row["score_sq_sum"])
+            cohort.score_histogram = [
+                int(count) + int(row[bucket])
+                for bucket, count in enumerate(cohort.score_histogram or [0] * HISTOGRAM_BINS)
+            ]
+
+    def _merge_progression(self, db_session, progression: pd.DataFrame):
+        for (position_level, technology, turn), row in progression.iterrows():
+            key = (position_level, technology, int(turn))
+            stage = db_session.get(AnalyticsDifficultyProgression, key)
+            if stage is None:
+                stage = AnalyticsDifficultyProgression(
+                    position_level=position_level, technology=technology, turn_index=int(turn),
+                    answer_count=0, difficulty_count=0, difficulty_sum=0.0, scored_count=0, score_sum=0.0
+                )
+                db_session.add(stage)
+            stage.answer_count += int(row["answer_count"])
+            stage.difficulty_count += int(row["difficulty_count"])
+            stage.difficulty_sum += float(row["difficulty_sum"])
+            stage.scored_count += int(row["scored_count"])
+            stage.score_sum += float(row["score_sum"])
+
+    def _cohort_summary(self, cohort: AnalyticsCohort) -> Dict:
+        count = cohort.session_count or 0
+        mean = cohort.score_sum / count if count else None
+        variance = max(cohort.score_sq_sum / count - mean ** 2, 0.0) if count else None
+        return {
+            "position_level": cohort.position_level,
+            "technology": cohort.technology,
+            "session_count": count,
+            "pass_rate": round(cohort.pass_count / count, 4) if count else None,
+            "mean_score": round(mean, 2) if mean is not None else None,
+            "score_stddev": round(variance ** 0.5, 2) if variance is not None else None
+        }
+
+    def cohorts(self, db_session, position_level: str = None, technology: str = None) -> Dict:
+        """各岗位级别 × 技术分群的会话数、及格率和平均分"""
+        self.refresh_if_stale(db_session)
+        query = db_session.query(AnalyticsCohort).filter(
+            AnalyticsCohort.position_level != ALL, AnalyticsCohort.technology != ALL
+        )
+        if position_level:
+            query = query.filter(AnalyticsCohort.position_level == position_level)
+        if technology:
+            query = query.filter(AnalyticsCohort.technology == technology)
+        rows = query.order_by(AnalyticsCohort.position_level, AnalyticsCohort.technology).all()
+        return {"pass_score": self.pass_score, "cohorts": [self._cohort_summary(row) for row in rows]}
+
+    def score_distribution(self, db_session, position_level: str = ALL, technology: str = ALL) -> Dict:
+        """分数分布直方图；不指定岗位级别或技术时使用对应的汇总行"""
+        self.refresh_if_stale(db_session)
+        cohort = db_session.get(AnalyticsCohort, (position_level or ALL, technology or ALL))
+        if cohort is None:
+            return None
+        width = 100 // HISTOGRAM_BINS
+        return {
+            **self._cohort_summary(cohort),
+            "pass_score": self.pass_score,
+            "histogram": [
+                {"range": [bucket * width, (bucket + 1) * width], "count": count}
+                for bucket, count in enumerate(cohort.score_histogram or [])
+            ]
+        }
+
+    def difficulty_progression(self, db_session, position_level: str = ALL, technology: str = ALL) -> Dict:
+        """按题目序号统计平均难度和平均得分"""
+        self.refresh_if_stale(db_session)
+        stages: List[AnalyticsDifficultyProgression] = db_session.query(AnalyticsDifficultyProgression).filter(
+            AnalyticsDifficultyProgression.position_level == (position_level or ALL),
+            AnalyticsDifficultyProgression.technology == (technology or ALL)
+        ).order_by(AnalyticsDifficultyProgression.turn_index).all()
+        return {
+            "position_level": position_level or ALL,
+            "technology": technology or ALL,
+            "turns": [
+                {
+                    "turn_index": stage.turn_index,
+                    "answer_count": stage.answer_count,
+                    "mean_difficulty": round(stage.difficulty_sum / stage.difficulty_count, 3)
+                    if stage.difficulty_count else None,
+                    "mean_score": round(stage.score_sum / stage.scored_count, 2) if stage.scored_count else None
+                }
+                for stage in stages
+            ]
+        }
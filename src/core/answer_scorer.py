@@ -0,0 +1,73 @@
+import re
+from typing import Dict, List, Set
+
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "with", "is", "are",
+    "be", "how", "what", "why", "when", "its", "it", "this", "that", "as", "by", "vs",
+    "using", "use", "their", "between", "understanding", "knowledge", "ability"
+}
+
+# 从长到短依次尝试的后缀（轻量词干提取）
+_SUFFIXES = (
+    "ational", "ization", "fulness", "ousness", "iveness", "ibility", "ability",
+    "ations", "ation", "ments", "ment", "ness", "ings", "ing", "able", "ible",
+    "ities", "ity", "ies", "ied", "edly", "ed", "ly", "es", "s"
+)
+
+
+def stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            base = word[:-len(suffix)]
+            return base + "y" if suffix in ("ies", "ied") else base
+    return word
+
+
+def _stems(text: str) -> List[str]:
+    return [stem(w) for w in re.findall(r"[a-z0-9+#]+", text.lower()) if w not in _STOPWORDS]
+
+
+class AnswerScorer:
+    """基于 expected_topics 关键词覆盖率的本地初步评分
+
+    在 LLM 评估返回之前给出毫秒级的初步分数和未覆盖主题，
+    供难度调整和即时反馈使用。
+    """
+
+    def __init__(self, topic_threshold: float = 0.5, min_words: int = 30):
+        self.topic_threshold = topic_threshold
+        self.min_words = min_words
+
+    def _coverage(self, phrase: str, answer_stems: Set[str]) -> float:
+        stems = set(_stems(phrase))
+        if not stems:
+            return 1.0
+        return len(stems & answer_stems) / len(stems)
+
+    def score(self, answer: str, expected_topics: List[str], evaluation_criteria: List[str]) -> Dict:
+        answer_terms = _stems(answer)
+        answer_stems = set(answer_terms)
+
+        topic_coverage = {topic: self._coverage(topic, answer_stems) for topic in expected_topics}
+        covered = [t for t, c in topic_coverage.items() if c >= self.topic_threshold]
+        missing = [t for t, c in topic_coverage.items() if c < self.topic_threshold]
+
+        topic_score = (
+            sum(topic_coverage.values()) / len(topic_coverage) if topic_coverage else 0.5
+        )
+        criteria_score = (
+            sum(self._coverage(c, answer_stems) for c in evaluation_criteria) / len(evaluation_criteria)
+            if evaluation_criteria else topic_score
+        )
+        # 过短的回答按长度打折
+        length_factor = min(1.0, len(answer_terms) / self.min_words) ** 0.5
+
+        score = round(100 * (0.8 * topic_score + 0.2 * criteria_score) * length_factor)
+        return {
+            "score": score,
+            "strength_points": [f"Covered: {topic}" for topic in covered],
+            "weakness_points": [f"Did not cover: {topic}" for topic in missing],
+            "missing_topics": missing,
+            "clarity_score": None,
+            "provisional": True
+        }
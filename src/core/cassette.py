@@ -0,0 +1,188 @@
+"""LLM 流量的录制与回放
+
+录制模式下包装真实模型，把每次调用的提示、响应文本、usage_metadata 和耗时追加到 JSONL 文件（cassette）；
+回放模式下用 cassette 代替模型，按提示的 SHA-256 摘要返回录制的响应，并按原耗时（可缩放）等待，
+使基准测试和 CI 可以离线使用真实形态的数据。
+
+同一提示录制了多次时按录制顺序依次返回，用完后重复最后一条；提示完全一致的记录不存在时，
+退回到同一提示模板（名称和版本）的录制记录，仍没有则抛出 CassetteMissError。
+cassette 位于 LLMClient 与模型之间，截止时间、对冲、熔断和用量记账在回放时照常生效。
+"""
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+RECORD = "record"
+REPLAY = "replay"
+
+_USAGE_FIELDS = ("prompt_token_count", "candidates_token_count", "cached_content_token_count")
+
+
+class CassetteMissError(LookupError):
+    """回放时 cassette 中没有匹配的录制记录"""
+
+
+def prompt_key(prompt) -> str:
+    return hashlib.sha256(str(prompt).encode("utf-8")).hexdigest()
+
+
+def _template_key(prompt) -> Optional[str]:
+    template = getattr(prompt, "template", None)
+    return f"{template}:{prompt.version}" if template else None
+
+
+class CassetteResponse:
+    """回放的响应，只提供业务代码和用量记账用到的 text 与 usage_metadata"""
+
+    def __init__(self, text: str, usage: Optional[Dict]):
+        self.text = text
+        self.usage_metadata = SimpleNamespace(**usage) if usage else None
+
+
+class Cassette:
+    """一个 JSONL cassette 文件，录制时追加写入，回放时整体载入内存建立索引"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._by_prompt: Dict[str, List[Dict]] = defaultdict(list)
+        self._by_template: Dict[str, List[Dict]] = defaultdict(list)
+        self._cursors: Dict[str, int] = defaultdict(int)
+        self.stats: Dict[str, int] = {"recorded": 0, "hits": 0, "template_hits": 0, "misses": 0}
+
+    def load(self) -> "Cassette":
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._by_prompt[entry["key"]].append(entry)
+                    if entry.get("template"):
+                        self._by_template[entry["template"]].append(entry)
+        return self
+
+    def append(self, component: str, prompt, response, seconds: float, error: Exception = None):
+        entry = {
+            "key": prompt_key(prompt),
+            "component": component,
+            "template": _template_key(prompt),
+            "prompt": str(prompt),
+            "latency": round(seconds, 6),
+            "recorded_at": time.time()
+        }
+        if error is not None:
+            entry["error"] = f"{type(error).__name__}: {error}"
+        else:
+            entry["text"] = response.text
+            metadata = getattr(response, "usage_metadata", None)
+            if metadata is not None:
+                entry["usage"] = {
+                    field: getattr(metadata, field)
+                    for field in _USAGE_FIELDS
+                    if isinstance(getattr(metadata, field, None), int)
+                }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self.stats["recorded"] += 1
+
+    def _next(self, index: Dict[str, List[Dict]], key: str) -> Dict:
+        entries = index[key]
+        cursor = self._cursors[key]
+        self._cursors[key] = cursor + 1
+        return entries[min(cursor, len(entries) - 1)]
+
+    def lookup(self, prompt) -> Dict:
+        key = prompt_key(prompt)
+        if self._by_prompt.get(key):
+            self.stats["hits"] += 1
+            return self._next(self._by_prompt, key)
+        template = _template_key(prompt)
+        if template and self._by_template.get(template):
+            self.stats["template_hits"] += 1
+            return self._next(self._by_template, template)
+        self.stats["misses"] += 1
+        raise CassetteMissError(f"No recorded response for prompt {key[:12]} ({template or 'untemplated'})")
+
+
+class RecordingModel:
+    """把调用透传给真实模型并录制结果，接口与 genai.GenerativeModel 一致"""
+
+    def __init__(self, model, cassette: Cassette, component: str, prefix: str = ""):
+        self.model = model
+        self.cassette = cassette
+        self.component = component
+        self.prefix = prefix
+
+    def with_cached_prefix(self, prefix: str, ttl: float):
+        # 使用模型端缓存时后端只收到后缀，录制时补回前缀，保证录制的是完整提示
+        from src.core.llm_client import _create_cached_model
+        cached = _create_cached_model(self.model, prefix, ttl)
+        return None if cached is None else RecordingModel(cached, self.cassette, self.component, prefix)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        full_prompt = _with_prefix(self.prefix, prompt)
+        started = time.perf_counter()
+        try:
+            response = await self.model.generate_content_async(prompt, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.cassette.append(self.component, full_prompt, None, time.perf_counter() - started, error=e)
+            raise
+        self.cassette.append(self.component, full_prompt, response, time.perf_counter() - started)
+        return response
+
+
+class ReplayModel:
+    """按录制内容返回响应的模型，latency_scale 为 0 时不等待"""
+
+    def __init__(self, cassette: Cassette, latency_scale: float = 1.0, prefix: str = ""):
+        self.cassette = cassette
+        self.latency_scale = latency_scale
+        self.prefix = prefix
+
+    def with_cached_prefix(self, prefix: str, ttl: float):
+        return ReplayModel(self.cassette, self.latency_scale, prefix)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        entry = self.cassette.lookup(_with_prefix(self.prefix, prompt))
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+        if "error" in entry:
+            raise RuntimeError(f"Recorded LLM error: {entry['error']}")
+        return CassetteResponse(entry["text"], entry.get("usage"))
+
+
+def _with_prefix(prefix: str, prompt):
+    """补回模型端缓存的前缀；补回后的提示与不使用缓存时一致，但不再带有模板信息，只能精确匹配"""
+    return prefix + str(prompt) if prefix else prompt
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def open_cassette(path: str, mode: str) -> Cassette:
+    """同一文件在进程内只打开一次，各组件共用同一个 cassette 和回放游标"""
+    with _cassettes_lock:
+        if path not in _cassettes:
+            cassette = Cassette(path)
+            _cassettes[path] = cassette.load() if mode == REPLAY else cassette
+        return _cassettes[path]
+
+
+def wrap_model(model, mode: str, path: str, component: str, latency_scale: float = 1.0):
+    """按模式包装模型；mode 为空时原样返回"""
+    if not mode:
+        return model
+    if mode == RECORD:
+        return RecordingModel(model, open_cassette(path, RECORD), component)
+    if mode == REPLAY:
+        return ReplayModel(open_cassette(path, REPLAY), latency_scale)
+    raise ValueError(f"Unknown LLM cassette mode: {mode}")
@@ -0,0 +1,112 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+class CircuitBreaker:
+    """按错误率和慢调用比例熔断的断路器
+
+    closed：正常放行，最近 window 次调用中失败或慢调用比例超过阈值时转为 open；
+    open：直接拒绝调用，open_seconds 之后转为 half_open；
+    half_open：只放行一个探测调用，成功（且不慢）则恢复 closed，否则重新 open。
+    """
+
+    def __init__(
+            self,
+            window: int = 20,
+            min_calls: int = 5,
+            error_rate: float = 0.5,
+            slow_call_seconds: float = 20.0,
+            slow_call_rate: float = 0.5,
+            open_seconds: float = 30.0,
+            clock=time.monotonic
+    ):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.clock = clock
+        self.state = "closed"
+        self.trips = 0
+        self.last_error: Optional[str] = None
+        self._calls = deque(maxlen=window)  # (是否失败, 是否慢调用)
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self):
+        """调用前检查，不允许调用时抛出 CircuitOpenError"""
+        if self.state == "open":
+            if self.clock() - self._opened_at < self.open_seconds:
+                raise CircuitOpenError("LLM circuit is open, serving degraded results")
+            self.state = "half_open"
+            self._probe_in_flight = False
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError("LLM circuit is half-open, waiting for the probe call")
+            self._probe_in_flight = True
+
+    def available(self) -> bool:
+        """当前是否会放行调用（不改变状态），供路由跳过已熔断的后端"""
+        if self.state == "open":
+            return self.clock() - self._opened_at >= self.open_seconds
+        return not (self.state == "half_open" and self._probe_in_flight)
+
+    def record_success(self, latency: float):
+        self._record(failed=False, slow=latency >= self.slow_call_seconds)
+
+    def record_failure(self, error: Exception):
+        self.last_error = f"{type(error).__name__}: {error}"
+        self._record(failed=True, slow=False)
+
+    def release(self):
+        """调用被取消、没有结果时释放探测名额"""
+        self._probe_in_flight = False
+
+    def _record(self, failed: bool, slow: bool):
+        if self.state == "half_open":
+            self._probe_in_flight = False
+            if failed or slow:
+                self._trip()
+            else:
+                self.state = "closed"
+                self._calls.clear()
+            return
+        if self.state == "open":
+            # 熔断前发出的调用，结果不再计入
+            return
+
+        self._calls.append((failed, slow))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(1 for f, _ in self._calls if f) / len(self._calls)
+        slow_calls = sum(1 for _, s in self._calls if s) / len(self._calls)
+        if failures >= self.error_rate or slow_calls >= self.slow_call_rate:
+            self._trip()
+
+    def _trip(self):
+        self.state = "open"
+        self.trips += 1
+        self._opened_at = self.clock()
+        self._calls.clear()
+
+    def snapshot(self) -> Dict:
+        calls = len(self._calls)
+        snapshot = {
+            "state": self.state,
+            "trips": self.trips,
+            "window_calls": calls,
+            "error_rate": round(sum(1 for f, _ in self._calls if f) / calls, 3) if calls else 0.0,
+            "slow_call_rate": round(sum(1 for _, s in self._calls if s) / calls, 3) if calls else 0.0,
+            "last_error": self.last_error
+        }
+        if self.state == "open":
+            snapshot["retry_in_seconds"] = round(
+                max(self.open_seconds - (self.clock() - self._opened_at), 0.0), 1
+            )
+        return snapshot
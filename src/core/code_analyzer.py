@@ -1,52 +1,323 @@
+import asyncio
+
 import google.generativeai as genai
-from typing import Dict
+from typing import AsyncIterator, Dict, List, Optional
 from src.config import settings
+from src.core.code_units import (
+    CodeUnit,
+    UnitAnalysisCache,
+    merge_analyses,
+    plan_chunks,
+    split_oversized,
+    split_units
+)
+from src.core.empirical_complexity import PYTHON_LANGUAGES, ComplexityProbe, compare_with_claim
+from src.core.llm_client import LLMClient
+from src.core.local_analysis import analyze_locally
+from src.core.prompts import RenderedPrompt, registry as prompt_registry
+from src.core.utils import parse_json_response
 
 
 class CodeAnalyzer:
     def __init__(self):
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
-
-    async def analyze_code(self, code: str, language: str) -> Dict:
-        """分析代码"""
-        prompt = f"""
-        Analyze this {language} code:
-
-        ```{language}
-        {code}
-        ```
-
-        Provide analysis in this format:
-        {{
-            "complexity": {{
-                "time_complexity": "Big O notation with explanation",
-                "space_complexity": "Big O notation with explanation"
-            }},
-            "best_practices": [
-                "List of followed best practices",
-                "List of violated best practices"
-            ],
-            "potential_issues": [
-                "List of potential problems or security concerns"
-            ],
-            "suggestions": [
-                "List of specific improvement suggestions"
-            ]
-        }}
+        self.model = LLMClient(component="code_analysis", task="code_analysis")
+        self.complexity_probe = ComplexityProbe()
+        self.unit_cache = UnitAnalysisCache(settings.CODE_UNIT_CACHE_SIZE)
+        # 所有请求的分块分析共用同一并发上限
+        self._chunk_slots = asyncio.Semaphore(max(settings.CODE_BATCH_CONCURRENCY, 1))
+
+    def _create_analysis_prompt(self, code: str, language: str) -> RenderedPrompt:
+        return prompt_registry.render("code_analysis", language=language, code=code)
+
+    def _create_batch_prompt(self, items: List[tuple]) -> RenderedPrompt:
+        """将多个小代码片段打包成一个多条目分析提示"""
+        snippets = "\n\n".join(
+            f"""
+        Item {index} ({item["language"]}):
+        ```{item["language"]}
+        {item["code"]}
+        ```"""
+            for index, item in items
+        )
+        return prompt_registry.render("code_analysis_batch", snippets=snippets)
+
+    def _fallback_analysis(self, code: str, language: str) -> Dict:
+        """模型不可用（熔断、超时或返回无法解析）时改用本地分析"""
+        return analyze_locally(code, language)
+
+    async def analyze_code(
+            self,
+            code: str,
+            language: str,
+            measure: bool = False,
+            function: Optional[str] = None,
+            input_kind: Optional[str] = None
+    ) -> Dict:
+        """分析代码；measure 为 True 时同时在沙箱子进程中实测 Python 函数的复杂度，与模型给出的复杂度对照"""
+        if not measure:
+            return await self._analyze(code, language)
+        if not settings.COMPLEXITY_MEASURE_ENABLED:
+            raise ValueError("Empirical complexity measurement is disabled on this server")
+
+        if language.lower() not in PYTHON_LANGUAGES:
+            result = await self._analyze(code, language)
+            result["measured_complexity"] = {"error": "Only Python code can be measured"}
+            return result
+
+        result, measured = await asyncio.gather(
+            self._analyze(code, language),
+            self.complexity_probe.measure(code, function=function, input_kind=input_kind)
+        )
+        measured["comparison"] = compare_with_claim(measured, result.get("complexity"))
+        result["measured_complexity"] = measured
+        return result
+
+    async def optimize_code(self, code: str, language: str) -> Dict:
+        """优化建议：完整分析中的复杂度和改进建议（与 analyze_code 共用单元缓存）"""
+        return self._subset(await self._analyze(code, language), ("complexity", "suggestions"))
+
+    async def explain_code(self, code: str, language: str) -> Dict:
+        """逐段解释代码；模型不可用时只列出代码的顶层结构"""
+        prompt = prompt_registry.render("code_explanation", language=language, code=code)
+        try:
+            response = await self.model.generate_content_async(prompt)
+            result = parse_json_response(response.text)
+            result["template_version"] = prompt.version
+            return result
+        except Exception as e:
+            print(f"Error in explain_code: {e}")
+            units = split_units(code, language)
+            return {
+                "summary": f"{len(code.splitlines())} lines of {language} code in {len(units)} top-level part(s)",
+                "walkthrough": [f"{unit.kind} {unit.name} (lines {unit.start_line}-{unit.end_line})" for unit in units],
+                "key_concepts": [],
+                "degraded": True
+            }
+
+    async def check_security(self, code: str, language: str) -> Dict:
+        """潜在问题和安全隐患：完整分析中的 potential_issues（与 analyze_code 共用单元缓存）"""
+        return self._subset(await self._analyze(code, language), ("potential_issues",))
+
+    @staticmethod
+    def _subset(result: Dict, keys) -> Dict:
+        subset = {key: result.get(key) for key in keys}
+        if result.get("degraded"):
+            subset["degraded"] = True
+        return subset
+
+    def _plan_units(self, code: str, language: str) -> List[CodeUnit]:
+        """拆分为顶层单元（关闭增量分析时为整个文件），超出分块预算的单元继续拆分"""
+        if settings.CODE_INCREMENTAL_ANALYSIS:
+            units = split_units(code, language)
+        else:
+            units = [CodeUnit("file", "file", code, 1, max(len(code.splitlines()), 1))]
+        max_chars = settings.CODE_CHUNK_TOKEN_BUDGET * 4
+        return [piece for unit in units for piece in split_oversized(unit, max_chars, language)]
+
+    async def _analyze(self, code: str, language: str) -> Dict:
+        result = None
+        async for event in self.analyze_code_stream(code, language):
+            result = event.get("result")
+        return result
+
+    async def analyze_code_stream(self, code: str, language: str) -> AsyncIterator[Dict]:
+        """分析代码并逐步产出结果：先是分块计划，每完成一块产出该块各单元的分析，最后是合并后的完整结果"""
+        units = self._plan_units(code, language)
+        if len(units) < 2:
+            # 不可拆分的输入整体作为一个单元，同样经过单元缓存
+            use_cache = settings.CODE_INCREMENTAL_ANALYSIS
+            whole = CodeUnit("file", "file", code, 1, max(len(code.splitlines()), 1))
+            cached = self.unit_cache.get(language, whole) if use_cache else None
+            yield {"type": "plan", "units": 1, "chunks": 0 if cached is not None else 1,
+                   "cached": 1 if cached is not None else 0}
+            result = cached
+            if result is None:
+                result = await self._analyze_whole(code, language)
+                # 降级的本地分析不缓存，模型恢复后重新分析
+                if use_cache and not result.get("degraded"):
+                    self.unit_cache.put(language, whole, result)
+            # 调用方会在结果上追加字段（如实测复杂度），返回副本以免改动缓存条目
+            yield {"type": "result", "result": {**result}}
+            return
+        async for event in self._analyze_units(units, language):
+            yield event
+
+    @staticmethod
+    def _unit_entry(unit: CodeUnit, analysis: Dict, cached: bool) -> Dict:
+        return {
+            "name": unit.name,
+            "kind": unit.kind,
+            "start_line": unit.start_line,
+            "end_line": unit.end_line,
+            "cached": cached,
+            "analysis": analysis
+        }
+
+    async def _analyze_units(self, units: List[CodeUnit], language: str) -> AsyncIterator[Dict]:
+        """增量分块分析
+
+        未变化的单元复用缓存的分析；有变化的单元按 token 预算装入分块，各分块在共用的并发上限下同时交给模型，
+        每完成一块产出一条 chunk 事件，最后把所有单元的分析合并为文件级结果。
         """
+        use_cache = settings.CODE_INCREMENTAL_ANALYSIS
+        results: Dict[int, Dict] = {}
+        changed = []
+        for index, unit in enumerate(units):
+            cached = self.unit_cache.get(language, unit) if use_cache else None
+            if cached is not None:
+                results[index] = cached
+            else:
+                changed.append(index)
+
+        chunks = [
+            [changed[position] for position in chunk]
+            for chunk in plan_chunks(
+                [len(units[index].source) for index in changed],
+                settings.CODE_CHUNK_TOKEN_BUDGET * 4,
+                max(settings.CODE_BATCH_PACK_SIZE, 1)
+            )
+        ]
+        yield {"type": "plan", "units": len(units), "chunks": len(chunks), "cached": len(units) - len(changed)}
+
+        async def run(chunk: List[int]) -> Dict[int, Dict]:
+            async with self._chunk_slots:
+                if len(chunk) == 1:
+                    return {chunk[0]: await self._analyze_whole(units[chunk[0]].source, language)}
+                return await self._analyze_pack([
+                    (index, {"code": units[index].source, "language": language}) for index in chunk
+                ])
+
+        tasks = [asyncio.create_task(run(chunk)) for chunk in chunks]
+        try:
+            for completed, finished in enumerate(asyncio.as_completed(tasks), 1):
+                chunk_results = await finished
+                for index, result in chunk_results.items():
+                    results[index] = result
+                    # 降级的本地分析不缓存，模型恢复后重新分析
+                    if use_cache and not result.get("degraded"):
+                        self.unit_cache.put(language, units[index], result)
+                yield {
+                    "type": "chunk",
+                    "completed": completed,
+                    "total": len(chunks),
+                    "units": [
+                        self._unit_entry(units[index], result, cached=False)
+                        for index, result in sorted(chunk_results.items())
+                    ]
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        merged = merge_analyses([(unit.name, results[index]) for index, unit in enumerate(units)])
+        versions = {result.get("template_version") for result in results.values()} - {None}
+        merged["template_version"] = versions.pop() if len(versions) == 1 else None
+        merged["units"] = [
+            self._unit_entry(unit, results[index], cached=index not in changed) for index, unit in enumerate(units)
+        ]
+        merged["incremental"] = {
+            "units": len(units),
+            "reanalyzed": len(changed),
+            "cached": len(units) - len(changed),
+            "chunks": len(chunks)
+        }
+        yield {"type": "result", "result": merged}
+
+    async def _analyze_whole(self, code: str, language: str) -> Dict:
+        prompt = self._create_analysis_prompt(code, language)
 
         try:
             response = await self.model.generate_content_async(prompt)
-            return json.loads(response.text)
+            result = parse_json_response(response.text)
+            result["template_version"] = prompt.version
+            return result
         except Exception as e:
             print(f"Error in analyze_code: {e}")
-            return {
-                "complexity": {
-                    "time_complexity": "Unable to determine",
-                    "space_complexity": "Unable to determine"
-                },
-                "best_practices": ["Code analysis unavailable"],
-                "potential_issues": ["Unable to analyze code"],
-                "suggestions": ["Please try again later"]
-            }
\ No newline at end of file
+            return self._fallback_analysis(code, language)
+
+    async def _analyze_pack(self, pack: List[tuple]) -> Dict[int, Dict]:
+        """一次模型调用分析一组小片段，并按条目拆分结果"""
+        prompt = self._create_batch_prompt(pack)
+        expected = {index for index, _ in pack}
+        results = {}
+        try:
+            response = await self.model.generate_content_async(prompt)
+            parsed = parse_json_response(response.text)
+            # 只接受本组内、恰好出现一次的序号；未知或重复的序号无法确定对应哪个片段，按缺失处理
+            entries = {}
+            for entry in parsed if isinstance(parsed, list) else []:
+                if not isinstance(entry, dict) or not isinstance(entry.get("analysis"), dict):
+                    continue
+                try:
+                    index = int(entry.get("index"))
+                except (TypeError, ValueError):
+                    continue
+                if index in expected:
+                    entries.setdefault(index, []).append(entry["analysis"])
+            results = {
+                index: {**analyses[0], "template_version": prompt.version}
+                for index, analyses in entries.items()
+                if len(analyses) == 1
+            }
+        except Exception as e:
+            print(f"Error in batch analyze_code: {e}")
+
+        # 未能从批量结果中拆分出的条目单独重新分析
+        missing = [(index, item) for index, item in pack if index not in results]
+        if missing:
+            retried = await asyncio.gather(*(
+                self._analyze_whole(item["code"], item["language"]) for _, item in missing
+            ))
+            results.update({index: result for (index, _), result in zip(missing, retried)})
+
+        return {index: results[index] for index in expected}
+
+    def _plan_batches(self, items: List[Dict]) -> List[List[tuple]]:
+        """小片段按条数打包，大片段单独成组"""
+        small_limit = settings.CODE_BATCH_SMALL_SNIPPET_CHARS
+        pack_size = max(settings.CODE_BATCH_PACK_SIZE, 1)
+
+        batches, pack = [], []
+        for index, item in enumerate(items):
+            if len(item["code"]) > small_limit:
+                batches.append([(index, item)])
+                continue
+            pack.append((index, item))
+            if len(pack) >= pack_size:
+                batches.append(pack)
+                pack = []
+        if pack:
+            batches.append(pack)
+        return batches
+
+    async def analyze_batch(
+            self,
+            items: List[Dict],
+            max_concurrency: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """批量分析代码，限制并发数，并按完成顺序逐条产出结果"""
+        limit = settings.CODE_BATCH_CONCURRENCY
+        if max_concurrency:
+            limit = min(max_concurrency, limit)
+        semaphore = asyncio.Semaphore(max(limit, 1))
+
+        async def run(batch: List[tuple]) -> Dict[int, Dict]:
+            async with semaphore:
+                if len(batch) == 1:
+                    index, item = batch[0]
+                    return {index: await self.analyze_code(item["code"], item["language"])}
+                return await self._analyze_pack(batch)
+
+        tasks = [asyncio.create_task(run(batch)) for batch in self._plan_batches(items)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                for index, result in sorted((await finished).items()):
+                    yield {
+                        "index": index,
+                        "language": items[index]["language"],
+                        "result": result
+                    }
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -0,0 +1,322 @@
+"""把源代码拆分为顶层单元（函数、类及其余模块级语句），并合并各单元的分析结果
+
+Python 按 ast 拆分，花括号语言（JavaScript、Java、C 系、Go、Rust 等）按顶层花括号块拆分，
+其他语言或无法解析的代码作为一个整体单元。单元摘要只取决于单元源码本身，
+编辑其他单元或插入空行导致的行号变化不影响摘要。
+"""
+import ast
+import hashlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.core.empirical_complexity import COMPLEXITY_CLASSES, EXPONENTIAL, PYTHON_LANGUAGES, normalize_big_o
+
+BRACE_LANGUAGES = (
+    "javascript", "js", "typescript", "ts", "java", "c", "cpp", "c++", "csharp", "c#",
+    "go", "rust", "kotlin", "swift", "php", "scala", "dart"
+)
+
+MODULE = "module"
+
+# 按文件扩展名推断语言，用于上传的源文件未指定语言时
+LANGUAGE_EXTENSIONS = {
+    ".py": "python", ".js": "javascript", ".mjs": "javascript", ".jsx": "javascript",
+    ".ts": "typescript", ".tsx": "typescript", ".java": "java", ".c": "c", ".h": "c",
+    ".cpp": "cpp", ".cc": "cpp", ".hpp": "cpp", ".cs": "csharp", ".go": "go", ".rs": "rust",
+    ".kt": "kotlin", ".swift": "swift", ".php": "php", ".scala": "scala", ".dart": "dart",
+    ".rb": "ruby", ".sql": "sql"
+}
+
+# 合并结果中每项最多列出的来源数，其余只给出数量
+_MAX_LABELS = 5
+
+_COMPLEXITY_RANK = {name: rank for rank, (name, _) in enumerate(COMPLEXITY_CLASSES)}
+_COMPLEXITY_RANK[EXPONENTIAL] = len(COMPLEXITY_CLASSES)
+
+# 依次匹配：Go 方法接收者、关键字声明（含 Go 的 type）、赋值的函数表达式或带括号参数的方法签名
+_BRACE_NAME = re.compile(
+    r"\bfunc\s*\([^)]*\)\s*([A-Za-z_]\w*)"
+    r"|\b(?:function|class|interface|struct|enum|trait|impl|func|fn|def|object|type)\s+([A-Za-z_$][\w$]*)"
+    r"|([A-Za-z_$][\w$]*)\s*(?:=\s*(?:async\s*)?(?:function\b|\([^)]*\)\s*=>)|\([^;{]*\)\s*(?:[:\w<>\[\], ]*)\{)"
+)
+
+
+@dataclass
+class CodeUnit:
+    name: str
+    kind: str  # function / class / module / file
+    source: str
+    start_line: int
+    end_line: int
+    digest: str = field(init=False)
+
+    def __post_init__(self):
+        normalized = "\n".join(line.rstrip() for line in self.source.strip("\n").splitlines())
+        self.digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _python_units(code: str) -> Optional[List[CodeUnit]]:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    lines = code.splitlines()
+    units, module_lines = [], []
+    for node in tree.body:
+        # 装饰器属于被装饰的函数或类
+        start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+        end = node.end_lineno or node.lineno
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            units.append(CodeUnit(node.name, kind, "\n".join(lines[start - 1:end]), start, end))
+        else:
+            module_lines.extend(range(start, end + 1))
+
+    if module_lines:
+        source = "\n".join(lines[i - 1] for i in module_lines)
+        units.append(CodeUnit(MODULE, MODULE, source, module_lines[0], module_lines[-1]))
+    return units
+
+
+def _strip_literals(line: str) -> str:
+    """去掉字符串和行注释，避免其中的花括号影响深度计算（不处理跨行的块注释和模板字符串）"""
+    line = re.sub(r"\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*'|`(?:\\.|[^`\\])*`", '""', line)
+    return re.split(r"//|#(?!include)", line, maxsplit=1)[0]
+
+
+def _continues(stripped: str, next_line: Optional[str]) -> bool:
+    """顶层语句未开启花括号块时，判断它是否延续到下一行（多行签名、左花括号另起一行、装饰器等）"""
+    text = stripped.strip()
+    if not text:
+        return False
+    if next_line is not None and next_line.strip().startswith("{"):
+        return True
+    return text.startswith("@") or text.endswith((",", "(", "=", "=>", "+", "-", "*", "/", "&&", "||", "?", ":", "<"))
+
+
+def _brace_units(code: str) -> Optional[List[CodeUnit]]:
+    lines = code.splitlines()
+    units, module_lines = [], []
+    depth, start, opened = 0, None, False
+
+    for number, line in enumerate(lines, 1):
+        stripped = _strip_literals(line)
+        if depth == 0 and start is None:
+            if not stripped.strip():
+                continue
+            start, opened = number, False
+        depth += stripped.count("{") - stripped.count("}")
+        opened = opened or "{" in stripped
+        if depth < 0:
+            return None
+        if depth > 0 or start is None:
+            continue
+
+        block = lines[start - 1:number]
+        if not opened:
+            following = next((l for l in lines[number:] if l.strip()), None)
+            if _continues(stripped, following):
+                continue
+            module_lines.extend(range(start, number + 1))
+        else:
+            header = " ".join(block[:3])
+            match = _BRACE_NAME.search(header)
+            name = next((g for g in match.groups() if g), None) if match else None
+            kind = "class" if re.search(r"\b(class|interface|struct|enum|trait|impl|object)\b", block[0]) \
+                else "function"
+            units.append(CodeUnit(name or f"block@{start}", kind, "\n".join(block), start, number))
+        start = None
+
+    if depth != 0:
+        return None
+    if start is not None:
+        module_lines.extend(range(start, len(lines) + 1))
+    if module_lines:
+        source = "\n".join(lines[i - 1] for i in module_lines)
+        units.append(CodeUnit(MODULE, MODULE, source, module_lines[0], module_lines[-1]))
+    return units
+
+
+def split_units(code: str, language: str) -> List[CodeUnit]:
+    """拆分为顶层单元；无法拆分时返回包含整个文件的单个单元"""
+    language = language.lower()
+    units = None
+    if language in PYTHON_LANGUAGES:
+        units = _python_units(code)
+    elif language in BRACE_LANGUAGES:
+        units = _brace_units(code)
+    if not units:
+        return [CodeUnit("file", "file", code, 1, max(len(code.splitlines()), 1))]
+    return sorted(units, key=lambda unit: unit.start_line)
+
+
+def language_for_filename(filename: Optional[str]) -> Optional[str]:
+    if not filename or "." not in filename:
+        return None
+    return LANGUAGE_EXTENSIONS.get(filename[filename.rfind("."):].lower())
+
+
+def _split_lines(unit: CodeUnit, max_chars: int) -> List[CodeUnit]:
+    """按行切成不超过 max_chars 的片段，尽量在空行处切开"""
+    lines = unit.source.splitlines()
+    pieces, current, size, last_blank = [], [], 0, None
+    offset = 0
+
+    def flush(count: int):
+        nonlocal current, size, last_blank, offset
+        taken = current[:count]
+        pieces.append(CodeUnit(
+            f"{unit.name}[{len(pieces) + 1}]", unit.kind, "\n".join(taken),
+            unit.start_line + offset, unit.start_line + offset + len(taken) - 1
+        ))
+        offset += len(taken)
+        current = current[count:]
+        size = sum(len(line) + 1 for line in current)
+        last_blank = None
+
+    for line in lines:
+        if current and size + len(line) + 1 > max_chars:
+            # 空行位于窗口后半段时在空行处切开，否则直接在当前行之前切开
+            flush(last_blank + 1 if last_blank is not None and last_blank >= len(current) // 2 else len(current))
+        current.append(line)
+        size += len(line) + 1
+        if not line.strip():
+            last_blank = len(current) - 1
+    if current:
+        flush(len(current))
+    return pieces
+
+
+def _split_python_class(unit: CodeUnit, max_chars: int) -> Optional[List[CodeUnit]]:
+    """把过大的 Python 类拆成类头（类属性等）和各个方法"""
+    try:
+        node = ast.parse(unit.source).body[0]
+    except (SyntaxError, IndexError):
+        return None
+    if not isinstance(node, ast.ClassDef):
+        return None
+
+    lines = unit.source.splitlines()
+    pieces, header = [], []
+    for child in node.body:
+        start = min([child.lineno] + [d.lineno for d in getattr(child, "decorator_list", [])])
+        end = child.end_lineno or child.lineno
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            method = CodeUnit(
+                f"{unit.name}.{child.name}", "function", "\n".join(lines[start - 1:end]),
+                unit.start_line + start - 1, unit.start_line + end - 1
+            )
+            pieces.extend(_split_lines(method, max_chars) if len(method.source) > max_chars else [method])
+        else:
+            header.extend(range(start, end + 1))
+    head_lines = list(range(1, node.body[0].lineno)) + header
+    head = CodeUnit(
+        unit.name, "class", "\n".join(lines[i - 1] for i in head_lines),
+        unit.start_line, unit.start_line + max(head_lines) - 1
+    )
+    return [head] + pieces
+
+
+def split_oversized(unit: CodeUnit, max_chars: int, language: str) -> List[CodeUnit]:
+    """超过 max_chars 的单元继续拆分：Python 类按方法拆，其余按行切片"""
+    if len(unit.source) <= max_chars:
+        return [unit]
+    if language.lower() in PYTHON_LANGUAGES and unit.kind == "class":
+        pieces = _split_python_class(unit, max_chars)
+        if pieces:
+            return pieces
+    return _split_lines(unit, max_chars)
+
+
+def plan_chunks(sizes: List[int], max_chars: int, max_items: int) -> List[List[int]]:
+    """按原有顺序把单元贪心地装入分块，每块的字符数不超过 max_chars、单元数不超过 max_items"""
+    chunks, current, size = [], [], 0
+    for index, unit_size in enumerate(sizes):
+        if current and (size + unit_size > max_chars or len(current) >= max_items):
+            chunks.append(current)
+            current, size = [], 0
+        current.append(index)
+        size += unit_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class UnitAnalysisCache:
+    """按 (语言, 单元摘要) 缓存单元分析结果的 LRU"""
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], Dict]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+    def get(self, language: str, unit: CodeUnit) -> Optional[Dict]:
+        entry = self._entries.get((language.lower(), unit.digest))
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end((language.lower(), unit.digest))
+        self.stats["hits"] += 1
+        return entry
+
+    def put(self, language: str, unit: CodeUnit, analysis: Dict):
+        if self.max_size <= 0:
+            return
+        self._entries[(language.lower(), unit.digest)] = analysis
+        self._entries.move_to_end((language.lower(), unit.digest))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+def _join_labels(labels: List[str]) -> str:
+    if len(labels) <= _MAX_LABELS:
+        return ", ".join(labels)
+    return f"{', '.join(labels[:_MAX_LABELS])} and {len(labels) - _MAX_LABELS} more"
+
+
+def _merge_complexity(labelled: List[Tuple[str, Dict]], key: str) -> str:
+    """取各部分中最高的复杂度；都无法识别时列出各部分的原始说法"""
+    ranked = []
+    for label, analysis in labelled:
+        normalized = normalize_big_o((analysis.get("complexity") or {}).get(key))
+        if normalized is not None:
+            ranked.append((_COMPLEXITY_RANK[normalized], normalized, label))
+    if not ranked:
+        described = [
+            f"{label}: {(analysis.get('complexity') or {}).get(key)}"
+            for label, analysis in labelled if (analysis.get("complexity") or {}).get(key)
+        ]
+        return "; ".join(described) or "Unknown"
+    worst_rank, worst, _ = max(ranked)
+    dominant = [label for rank, _, label in ranked if rank == worst_rank]
+    return f"{worst} (dominated by {_join_labels(dominant)})"
+
+
+def merge_analyses(labelled: List[Tuple[str, Dict]]) -> Dict:
+    """把多个部分（单元或分块）的分析合并为文件级结果
+
+    复杂度取最高者；列表项按内容去重，并标注出自哪些部分。
+    """
+    merged = {
+        "complexity": {
+            "time_complexity": _merge_complexity(labelled, "time_complexity"),
+            "space_complexity": _merge_complexity(labelled, "space_complexity")
+        }
+    }
+    for key in ("best_practices", "potential_issues", "suggestions"):
+        sources: "OrderedDict[str, List[str]]" = OrderedDict()
+        for label, analysis in labelled:
+            for item in analysis.get(key) or []:
+                labels = sources.setdefault(str(item), [])
+                if label not in labels:
+                    labels.append(label)
+        merged[key] = [
+            f"{_join_labels(labels)}: {item}" if len(labelled) > 1 else item
+            for item, labels in sources.items()
+        ]
+    if any(analysis.get("degraded") for _, analysis in labelled):
+        merged["degraded"] = True
+    return merged
@@ -0,0 +1,250 @@
+"""复杂度测量的子进程入口，由 empirical_complexity 以 `python -I -S` 启动，不要在应用中导入
+
+从 stdin 读取 {"code", "function", "input_kind", "max_size", "min_time", "time_budget", "seed", "uid", "gid"}，
+先进入沙箱（见 _enter_sandbox），再在全新的命名空间中执行代码，对目标函数按输入规模依次测量单次调用耗时和峰值内存，
+结果以 JSON 行写到原始 stdout（先是函数信息，然后每个规模一行样本，出错时最后一行为 error）；
+error 只是错误代码（及内置异常的类型名），不回传异常信息，被测代码自身的输出被丢弃。只依赖标准库。
+"""
+import ast
+import builtins
+import gc
+import inspect
+import json
+import os
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+# 沙箱内无法再从磁盘导入模块，被测代码可用的标准库模块须事先导入
+PRELOADED_MODULES = (
+    "array", "bisect", "collections", "copy", "dataclasses", "decimal", "enum", "fractions", "functools",
+    "heapq", "itertools", "math", "operator", "re", "statistics", "typing"
+)
+
+_CLONE_NEWNS = 0x00020000
+_CLONE_NEWUSER = 0x10000000
+_CLONE_NEWNET = 0x40000000
+
+# 审计钩子拒绝的事件：文件、进程、网络、原生调用，以及导入尚未加载的模块和遍历解释器中的对象
+_DENIED_EVENTS = {"open", "import", "gc.get_objects", "gc.get_referrers", "gc.get_referents", "sys.addaudithook"}
+_DENIED_PREFIXES = (
+    "os.", "subprocess.", "_posixsubprocess.", "socket.", "ctypes.", "shutil.", "glob.", "pty.", "fcntl.",
+    "mmap.", "resource.", "signal.", "urllib.", "http.", "ftplib.", "smtplib.", "webbrowser."
+)
+
+
+class SandboxViolation(PermissionError):
+    """被测代码尝试了沙箱不允许的操作"""
+
+
+class RunnerError(Exception):
+    """以错误代码报告给父进程的错误"""
+
+
+def _deny(event, args):
+    if event in _DENIED_EVENTS or event.startswith(_DENIED_PREFIXES):
+        raise SandboxViolation("operation not permitted in the measurement sandbox")
+
+
+def _unshare(flags):
+    import ctypes
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.unshare(flags) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def _enter_sandbox(uid, gid):
+    """把进程限制在当前（空的临时）目录中，没有网络，不以服务用户的身份运行
+
+    以 root 启动时：新的网络和挂载命名空间，chroot 到工作目录，再降到 uid/gid（默认 nobody）；
+    否则改用用户命名空间取得同样的隔离（命名空间内的 root 只能看到 chroot 后的空目录）。
+    两种方式都不可用时抛出异常，不运行被测代码。
+    """
+    workdir = os.getcwd()
+    if os.geteuid() == 0:
+        _unshare(_CLONE_NEWNET | _CLONE_NEWNS)
+        os.chroot(workdir)
+        os.chdir("/")
+        os.setgroups([])
+        os.setresgid(gid, gid, gid)
+        os.setresuid(uid, uid, uid)
+    else:
+        outer_uid, outer_gid = os.getuid(), os.getgid()
+        _unshare(_CLONE_NEWUSER | _CLONE_NEWNET | _CLONE_NEWNS)
+        for path, content in (("setgroups", "deny"), ("uid_map", f"0 {outer_uid} 1"), ("gid_map", f"0 {outer_gid} 1")):
+            with open(f"/proc/self/{path}", "w") as f:
+                f.write(content)
+        os.chroot(workdir)
+        os.chdir("/")
+    for name in ("ctypes", "_ctypes"):
+        sys.modules.pop(name, None)
+
+_INT_NAMES = {"n", "k", "m", "num", "number", "count", "size", "limit", "target", "x"}
+_STR_NAMES = {"s", "text", "string", "word", "pattern"}
+
+
+def _pick_function(namespace, code, name):
+    if name:
+        if not callable(namespace.get(name)):
+            raise RunnerError("function_not_found")
+        return name, namespace[name]
+    # 默认取代码中最后一个顶层函数，通常是入口函数，前面的是辅助函数
+    defined = [node.name for node in ast.parse(code).body if isinstance(node, ast.FunctionDef)]
+    if not defined:
+        raise RunnerError("no_function")
+    return defined[-1], namespace[defined[-1]]
+
+
+def _infer_kind(func):
+    parameters = [
+        p for p in inspect.signature(func).parameters.values()
+        if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) and p.default is p.empty
+    ]
+    if not parameters:
+        raise RunnerError("bad_signature")
+    first = parameters[0]
+    annotation = first.annotation if isinstance(first.annotation, str) else getattr(first.annotation, "__name__", "")
+    annotation = annotation.lower()
+    if annotation in ("int", "float") or first.name.lower() in _INT_NAMES:
+        kind = "int"
+    elif annotation == "str" or first.name.lower() in _STR_NAMES:
+        kind = "str"
+    elif annotation.startswith("dict") or first.name.lower() in ("d", "mapping", "table"):
+        kind = "dict"
+    else:
+        kind = "list"
+    return kind, len(parameters) - 1
+
+
+def _sizes(kind, max_size):
+    """输入规模按 2 倍递增；整数输入先从 2 开始逐步加 2，
+    指数级算法（如朴素递归）在 n 到几十时就会耗尽时间预算，需要足够密的小规模样本"""
+    sizes = list(range(2, 32, 2)) if kind == "int" else []
+    n = 32 if kind == "int" else 8
+    while n <= max_size:
+        sizes.append(n)
+        n *= 2
+    return sizes
+
+
+def _make_input(kind, n, rng):
+    if kind == "int":
+        return n
+    if kind == "str":
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(n))
+    if kind == "sorted_list":
+        return sorted(rng.randrange(n * 4 + 1) for _ in range(n))
+    if kind == "dict":
+        return {i: rng.randrange(n * 4 + 1) for i in range(n)}
+    return [rng.randrange(n * 4 + 1) for _ in range(n)]
+
+
+def _arguments(kind, extra, n, seed):
+    """生成一次调用的参数；其余必填参数取一个与规模相当的整数（如查找目标）"""
+    rng = random.Random(seed * 1000003 + n)
+    value = _make_input(kind, n, rng)
+    return (value,) + tuple(rng.randrange(n * 4 + 1) for _ in range(extra))
+
+
+def _measure(func, kind, extra, n, seed, min_time):
+    # 先调用一次校准重复次数，并检查函数是否原地修改输入（如原地排序）
+    args = _arguments(kind, extra, n, seed)
+    started = time.perf_counter()
+    func(*args)
+    first = time.perf_counter() - started
+    mutates = args != _arguments(kind, extra, n, seed)
+    repeats = max(1, min(100000, int(min_time / max(first, 1e-8))))
+    if mutates:
+        repeats = min(repeats, 20)
+
+    # 与 timeit 一样在计时期间关闭垃圾回收，取多批中最快的一批，减少噪声
+    best = first
+    gc.disable()
+    try:
+        for _ in range(5):
+            if mutates:
+                # 每次调用使用新生成的输入，生成时间不计入
+                total = 0.0
+                for _ in range(repeats):
+                    call_args = _arguments(kind, extra, n, seed)
+                    started = time.perf_counter()
+                    func(*call_args)
+                    total += time.perf_counter() - started
+                best = min(best, total / repeats)
+            else:
+                started = time.perf_counter()
+                for _ in range(repeats):
+                    func(*args)
+                best = min(best, (time.perf_counter() - started) / repeats)
+            if first > min_time:
+                break
+    finally:
+        gc.enable()
+
+    # 输入在开始跟踪之前生成，峰值只反映函数调用本身的分配
+    args = _arguments(kind, extra, n, seed)
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    request = json.loads(sys.stdin.read())
+    out = os.fdopen(os.dup(1), "w")
+    devnull = open(os.devnull, "w")
+    sys.stdout = sys.stderr = devnull
+
+    def emit(record):
+        # 每个样本单独输出一行，进程因超时或超限被终止时已测得的样本仍然可用
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    try:
+        for module in PRELOADED_MODULES:
+            __import__(module)
+        _enter_sandbox(request["uid"], request["gid"])
+    except Exception:
+        emit({"error": "sandbox_unavailable"})
+        return
+    # 审计钩子无法移除，此后本进程内的文件、进程和网络操作都会被拒绝
+    sys.addaudithook(_deny)
+
+    try:
+        namespace = {"__name__": "__candidate__"}
+        exec(compile(request["code"], "<candidate>", "exec"), namespace)
+        name, func = _pick_function(namespace, request["code"], request.get("function"))
+        kind, extra = _infer_kind(func)
+        kind = request.get("input_kind") or kind
+        emit({"function": name, "input_kind": kind})
+
+        deadline = time.perf_counter() + request["time_budget"]
+        last_elapsed = 0.0
+        for n in _sizes(kind, request["max_size"]):
+            # 规模按倍数增长，按上一规模的耗时估计下一规模会超出时间预算时停止
+            if time.perf_counter() + last_elapsed * 4 > deadline:
+                break
+            started = time.perf_counter()
+            seconds, peak = _measure(func, kind, extra, n, request["seed"], request["min_time"])
+            last_elapsed = time.perf_counter() - started
+            emit({"n": n, "seconds": seconds, "peak_bytes": peak})
+    except RunnerError as e:
+        emit({"error": e.args[0]})
+    except SandboxViolation:
+        emit({"error": "blocked"})
+    except RecursionError:
+        emit({"error": "recursion"})
+    except MemoryError:
+        emit({"error": "memory"})
+    except Exception as e:
+        # 异常信息和自定义异常的类名都由被测代码控制，只回传内置异常的类型名
+        name = type(e).__name__
+        emit({"error": "exception", "exception": name if getattr(builtins, name, None) is type(e) else None})
+
+
+if __name__ == "__main__":
+    main()
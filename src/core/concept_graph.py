@@ -0,0 +1,217 @@
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.database.models import ConceptEdge, ConceptNode
+
+# 学习水平对应的数值，用于决定路径覆盖的前置/进阶范围
+LEVELS = {"beginner": 0, "intermediate": 1, "advanced": 2, "expert": 3}
+
+PREREQUISITE = "prerequisite"
+RELATED = "related"
+
+
+def normalize_concept(name: str) -> str:
+    """规范化概念名，作为图节点的主键"""
+    return re.sub(r"\s+", " ", name.strip().strip(".,;:").lower())
+
+
+def _names(relations: Dict, key: str) -> List[str]:
+    """LLM 返回的列表中的有效字符串条目；非字符串（对象、数字、null）和空白条目跳过"""
+    values = relations.get(key)
+    if not isinstance(values, list):
+        return []
+    return [value for value in values if isinstance(value, str) and normalize_concept(value)]
+
+
+class ConceptGraph:
+    """持久化的知识点关系图
+
+    LLM 返回的前置知识、相关概念和进阶主题以节点和边的形式存储，
+    学习路径在本地通过图遍历和拓扑排序计算，只有图中缺失的节点才需要调用 LLM 展开。
+    """
+
+    def _get_or_create_node(self, db_session, name: str) -> ConceptNode:
+        key = normalize_concept(name)
+        node = db_session.get(ConceptNode, key)
+        if node is None:
+            node = ConceptNode(id=key, name=name.strip(), expanded=False, details={})
+            db_session.add(node)
+            db_session.flush()
+        return node
+
+    def _add_edge(self, db_session, source: str, target: str, relation: str):
+        if source == target:
+            return
+        if db_session.get(ConceptEdge, (source, target, relation)) is None:
+            db_session.add(ConceptEdge(source_id=source, target_id=target, relation=relation))
+            db_session.flush()
+
+    def store_relations(self, db_session, concept: str, relations: Dict):
+        """保存一次 get_concept_relations 的结果，并将该节点标记为已展开"""
+        node = self._get_or_create_node(db_session, concept)
+
+        for name in _names(relations, "prerequisites"):
+            prerequisite = self._get_or_create_node(db_session, name)
+            self._add_edge(db_session, prerequisite.id, node.id, PREREQUISITE)
+        for name in _names(relations, "advanced_topics"):
+            advanced = self._get_or_create_node(db_session, name)
+            self._add_edge(db_session, node.id, advanced.id, PREREQUISITE)
+        for name in _names(relations, "related_concepts"):
+            related = self._get_or_create_node(db_session, name)
+            self._add_edge(db_session, node.id, related.id, RELATED)
+
+        node.expanded = True
+        node.template_version = relations.get("template_version")
+        node.details = {
+            "common_misconceptions": _names(relations, "common_misconceptions"),
+            "practical_applications": _names(relations, "practical_applications")
+        }
+        db_session.commit()
+
+    def _neighbours(self, db_session, key: str, relation: str, incoming: bool) -> List[ConceptNode]:
+        if incoming:
+            edges = db_session.query(ConceptEdge).filter(
+                ConceptEdge.target_id == key, ConceptEdge.relation == relation
+            )
+            keys = [edge.source_id for edge in edges]
+        else:
+            edges = db_session.query(ConceptEdge).filter(
+                ConceptEdge.source_id == key, ConceptEdge.relation == relation
+            )
+            keys = [edge.target_id for edge in edges]
+        return [db_session.get(ConceptNode, k) for k in keys]
+
+    def get_relations(self, db_session, concept: str) -> Optional[Dict]:
+        """从图中还原概念关系，节点未展开时返回 None"""
+        node = db_session.get(ConceptNode, normalize_concept(concept))
+        if node is None or not node.expanded:
+            return None
+
+        details = node.details or {}
+        return {
+            "prerequisites": [n.name for n in self._neighbours(db_session, node.id, PREREQUISITE, True)],
+            "related_concepts": [n.name for n in self._neighbours(db_session, node.id, RELATED, False)],
+            "advanced_topics": [n.name for n in self._neighbours(db_session, node.id, PREREQUISITE, False)],
+            "common_misconceptions": details.get("common_misconceptions", []),
+            "practical_applications": details.get("practical_applications", [])
+        }
+
+    def _scope_depths(self, current_level: str, target_level: str) -> Tuple[int, int]:
+        """当前水平越低，回溯的前置层数越多；目标水平越高，延伸的进阶层数越多"""
+        current = LEVELS.get(current_level, 0)
+        target = max(LEVELS.get(target_level, 1), current)
+        return max(0, 2 - current), max(0, target - 1)
+
+    def collect_scope(
+            self,
+            db_session,
+            topic: str,
+            current_level: str,
+            target_level: str
+    ) -> Tuple[Dict[str, int], Set[str]]:
+        """收集学习路径涉及的节点及其相对层级，并返回还需展开的节点"""
+        prerequisite_depth, advanced_depth = self._scope_depths(current_level, target_level)
+        topic_key = normalize_concept(topic)
+
+        scope = {topic_key: 0}
+        missing = set()
+
+        for depth_limit, incoming, sign in ((prerequisite_depth, True, -1), (advanced_depth, False, 1)):
+            frontier = [topic_key]
+            for depth in range(1, depth_limit + 1):
+                next_frontier = []
+                for key in frontier:
+                    node = db_session.get(ConceptNode, key)
+                    if node is None or not node.expanded:
+                        missing.add(key)
+                        continue
+                    for neighbour in self._neighbours(db_session, key, PREREQUISITE, incoming):
+                        if neighbour.id not in scope:
+                            scope[neighbour.id] = sign * depth
+                            next_frontier.append(neighbour.id)
+                frontier = next_frontier
+
+        # 即使不需要展开层级，主题本身也要有关系数据才能给出预备知识和后续步骤
+        topic_node = db_session.get(ConceptNode, topic_key)
+        if topic_node is None or not topic_node.expanded:
+            missing.add(topic_key)
+
+        return scope, missing
+
+    def _topological_layers(self, db_session, scope: Dict[str, int]) -> List[List[str]]:
+        """对范围内的前置关系做分层拓扑排序（Kahn 算法），环路按层级顺序放到最后"""
+        indegree = {key: 0 for key in scope}
+        successors = defaultdict(list)
+        edges = db_session.query(ConceptEdge).filter(
+            ConceptEdge.relation == PREREQUISITE,
+            ConceptEdge.source_id.in_(list(scope)),
+            ConceptEdge.target_id.in_(list(scope))
+        )
+        for edge in edges:
+            successors[edge.source_id].append(edge.target_id)
+            indegree[edge.target_id] += 1
+
+        layers = []
+        layer = sorted((k for k, d in indegree.items() if d == 0), key=lambda k: (scope[k], k))
+        while layer:
+            layers.append(layer)
+            next_layer = []
+            for key in layer:
+                for successor in successors[key]:
+                    indegree[successor] -= 1
+                    if indegree[successor] == 0:
+                        next_layer.append(successor)
+            layer = sorted(next_layer, key=lambda k: (scope[k], k))
+
+        placed = {key for layer in layers for key in layer}
+        remaining = sorted((k for k in scope if k not in placed), key=lambda k: (scope[k], k))
+        if remaining:
+            layers.append(remaining)
+        return layers
+
+    def build_learning_path(
+            self,
+            db_session,
+            topic: str,
+            current_level: str,
+            target_level: str
+    ) -> Dict:
+        """基于图中已有数据在本地生成学习路径"""
+        scope, _ = self.collect_scope(db_session, topic, current_level, target_level)
+        topic_key = normalize_concept(topic)
+        nodes = {key: db_session.get(ConceptNode, key) for key in scope}
+
+        stages = []
+        for number, layer in enumerate(self._topological_layers(db_session, scope), start=1):
+            names = [nodes[key].name for key in layer]
+            projects = [
+                application
+                for key in layer
+                for application in (nodes[key].details or {}).get("practical_applications", [])[:1]
+            ]
+            stages.append({
+                "stage": f"Stage {number}: {', '.join(names[:3])}",
+                "topics": names,
+                "resources": [],
+                "projects": projects,
+                "estimated_duration": f"{len(names)}-{2 * len(names)} weeks"
+            })
+
+        # 后续步骤：范围边缘之外的进阶主题
+        frontier = [key for key, rank in scope.items() if rank == max(scope.values())]
+        next_steps = []
+        for key in frontier:
+            for neighbour in self._neighbours(db_session, key, PREREQUISITE, False):
+                if neighbour.id not in scope and neighbour.name not in next_steps:
+                    next_steps.append(neighbour.name)
+
+        return {
+            "prerequisites": [
+                n.name for n in self._neighbours(db_session, topic_key, PREREQUISITE, True)
+            ],
+            "learning_stages": stages,
+            "milestones": [f"Can explain and apply: {', '.join(stage['topics'])}" for stage in stages],
+            "next_steps": next_steps,
+            "source": "concept_graph"
+        }
@@ -0,0 +1,273 @@
+"""实测 Python 函数的时间与空间复杂度
+
+在隔离的子进程中（`python -I -S`，空环境变量，临时工作目录，独立进程组）运行候选人代码：
+rlimit 限制 CPU 时间、地址空间、可写文件大小、文件描述符和子进程数，墙钟超时后整组终止；
+子进程在执行代码前进入新的网络和挂载命名空间、chroot 到空的临时目录并降为非特权用户，
+再安装拒绝文件、进程、网络操作的审计钩子（见 complexity_runner._enter_sandbox），无法建立沙箱时不运行代码。
+子进程对逐步增大的输入测量单次调用耗时和峰值内存，这里把测量曲线拟合到常见复杂度类别，
+与 LLM 给出的复杂度对照。只支持 Linux，只使用标准库和 numpy。
+
+即便如此，被测代码仍与服务运行在同一内核上，因此只有设置 COMPLEXITY_MEASURE_ENABLED 后才开放测量。
+"""
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "complexity_runner.py")
+
+# 按从简单到复杂排列，残差相近时取靠前的类别
+COMPLEXITY_CLASSES: List[Tuple[str, Callable[[np.ndarray], np.ndarray]]] = [
+    ("O(1)", lambda n: np.ones_like(n)),
+    ("O(log n)", lambda n: np.log2(n)),
+    ("O(n)", lambda n: n),
+    ("O(n log n)", lambda n: n * np.log2(n)),
+    ("O(n^2)", lambda n: n ** 2),
+    ("O(n^3)", lambda n: n ** 3),
+]
+EXPONENTIAL = "O(2^n)"
+
+PYTHON_LANGUAGES = ("python", "py", "python3")
+INPUT_KINDS = ("list", "sorted_list", "int", "str", "dict")
+# 子进程回报的错误代码 -> 返回给客户端的说明；不回传被测代码产生的任何文本
+_RUNNER_ERRORS = {
+    "sandbox_unavailable": "The measurement sandbox could not be set up on this server",
+    "blocked": "The code attempted a disallowed operation (file, process or network access)",
+    "no_function": "No top-level function to measure",
+    "function_not_found": "The requested function is not defined",
+    "bad_signature": "The function must take the input as its first positional parameter",
+    "recursion": "RecursionError: maximum recursion depth exceeded",
+    "memory": "MemoryError: memory limit exceeded",
+}
+_MIN_SAMPLES = 4
+# 更简单的类别残差比最佳残差多出不超过 min(50%, 0.1) 再加 0.02 时取更简单的类别，避免把计时噪声拟合成增长；
+# 所有类别都拟合得不好时，容差不随之放大
+_SIMPLER_TOLERANCE = 0.5
+_SIMPLER_TOLERANCE_CAP = 0.1
+_SIMPLER_SLACK = 0.02
+# 计时和内存测量的噪声量级：100ns、1KB
+_TIME_FLOOR = 1e-7
+_SPACE_FLOOR = 1024
+# 小对象的分配可能来自解释器的空闲链表而不被 tracemalloc 记录，空间拟合只使用峰值不低于该字节数的样本
+_SPACE_FIT_MIN_BYTES = 16 * 1024
+# 峰值内存变化小于该字节数时视为常数空间
+_CONSTANT_SPACE_BYTES = 4096
+
+
+def _exponential_growth(n: np.ndarray, y: np.ndarray, floor: float) -> Optional[float]:
+    """log(y) 对 n 比对 log(n) 更接近直线时判定为指数增长，返回每增加 1 的增长倍数"""
+    mask = y > floor * 10
+    if mask.sum() < _MIN_SAMPLES:
+        return None
+    n, log_y = n[mask], np.log(y[mask])
+
+    def r_squared(x: np.ndarray) -> float:
+        slope, intercept = np.polyfit(x, log_y, 1)
+        total = np.sum((log_y - log_y.mean()) ** 2)
+        return 1 - np.sum((log_y - (slope * x + intercept)) ** 2) / total if total > 0 else 0.0
+
+    growth = float(np.exp(np.polyfit(n, log_y, 1)[0]))
+    if growth > 1.1 and r_squared(n) > r_squared(np.log(n)):
+        return growth
+    return None
+
+
+def fit_complexity(sizes: List[int], values: List[float], floor: float) -> Dict:
+    """把测量值拟合到复杂度类别
+
+    指数增长单独判别（见 _exponential_growth）；否则对每个多项式类别拟合 values ≈ a + b·f(n)（b ≥ 0），
+    按相对误差加权，使小规模样本同样参与判别，低于 floor（测量噪声量级）的值按 floor 计算权重。
+    """
+    n = np.asarray(sizes, dtype=float)
+    y = np.asarray(values, dtype=float)
+    growth = _exponential_growth(n, y, floor)
+    if growth is not None:
+        return {"complexity": EXPONENTIAL, "growth_per_step": round(growth, 3)}
+
+    weights = 1.0 / np.maximum(y, floor)
+    residuals = {}
+    for name, transform in COMPLEXITY_CLASSES:
+        feature = transform(n)
+        feature = feature / feature.max()
+        design = np.column_stack([np.ones_like(n), feature]) * weights[:, None]
+        coefficients, *_ = np.linalg.lstsq(design, y * weights, rcond=None)
+        if coefficients[1] < 0:
+            coefficients = np.array([np.average(y, weights=weights ** 2), 0.0])
+        predicted = coefficients[0] + coefficients[1] * feature
+        residuals[name] = float(np.sqrt(np.mean(((predicted - y) * weights) ** 2)))
+
+    best = min(residuals, key=residuals.get)
+    for name, _ in COMPLEXITY_CLASSES:
+        margin = min(residuals[best] * _SIMPLER_TOLERANCE, _SIMPLER_TOLERANCE_CAP) + _SIMPLER_SLACK
+        if residuals[name] <= residuals[best] + margin:
+            best = name
+            break
+    return {"complexity": best, "residuals": {name: round(value, 4) for name, value in residuals.items()}}
+
+
+def normalize_big_o(text: Optional[str]) -> Optional[str]:
+    """从 LLM 的描述（如 "O(N*log(N)) because ..."）中提取复杂度类别，无法识别时返回 None"""
+    match = re.search(r"O\s*\(([^()]*(?:\([^()]*\)[^()]*)*)\)", text or "")
+    if match is None:
+        return None
+    body = match.group(1).lower().replace(" ", "").replace("**", "^").replace("²", "^2").replace("³", "^3")
+    body = re.sub(r"log\(?([a-z])\)?", r"log\1", body).replace("*", "").replace("·", "")
+    known = {
+        "1": "O(1)", "logn": "O(log n)", "n": "O(n)", "nlogn": "O(n log n)",
+        "n^2": "O(n^2)", "n^3": "O(n^3)", "2^n": "O(2^n)"
+    }
+    return known.get(body)
+
+
+def _limit_resources():
+    """子进程 exec 前执行：设置资源上限"""
+    import resource
+    cpu = max(int(settings.COMPLEXITY_CPU_SECONDS), 1)
+    memory = settings.COMPLEXITY_MEMORY_MB * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+    resource.setrlimit(resource.RLIMIT_NOFILE, (16, 16))
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+
+def _describe_error(record: Dict) -> str:
+    if record["error"] == "exception":
+        name = record.get("exception")
+        return f"The function raised {name}" if isinstance(name, str) and name.isidentifier() \
+            else "The function raised an exception"
+    return _RUNNER_ERRORS.get(record["error"], "Measurement failed")
+
+
+class ComplexityProbe:
+    """在资源受限的子进程中测量函数的耗时与内存增长"""
+
+    def __init__(self):
+        self._semaphore = asyncio.Semaphore(max(settings.COMPLEXITY_MAX_CONCURRENCY, 1))
+
+    async def _run(self, request: Dict) -> Tuple[List[Dict], Optional[str]]:
+        """返回子进程输出的记录；进程超时或被资源上限终止时返回已输出的部分和原因"""
+        timeout = settings.COMPLEXITY_TIME_BUDGET * 2 + 2
+        records: List[Dict] = []
+        with tempfile.TemporaryDirectory() as workdir:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, "-I", "-S", RUNNER,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+                cwd=workdir,
+                env={},
+                preexec_fn=_limit_resources,
+                start_new_session=True
+            )
+
+            async def read():
+                process.stdin.write(json.dumps(request).encode("utf-8"))
+                await process.stdin.drain()
+                process.stdin.close()
+                async for line in process.stdout:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # 进程在输出途中被终止
+                await process.wait()
+
+            stopped = None
+            try:
+                await asyncio.wait_for(read(), timeout)
+            except asyncio.TimeoutError:
+                stopped = f"wall-clock limit of {timeout:.0f}s reached"
+            finally:
+                if process.returncode is None:
+                    os.killpg(process.pid, signal.SIGKILL)
+                    await process.wait()
+
+        if stopped is None and process.returncode:
+            if process.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+                stopped = f"CPU limit of {settings.COMPLEXITY_CPU_SECONDS}s reached"
+            else:
+                stopped = f"process exited with code {process.returncode}"
+        return records, stopped
+
+    async def measure(self, code: str, function: Optional[str] = None, input_kind: Optional[str] = None) -> Dict:
+        """测量 code 中的函数（默认最后一个顶层函数），输入类型默认按参数名和注解推断"""
+        if input_kind is not None and input_kind not in INPUT_KINDS:
+            raise ValueError(f"input_kind must be one of: {', '.join(INPUT_KINDS)}")
+        request = {
+            "code": code,
+            "function": function,
+            "input_kind": input_kind,
+            "max_size": settings.COMPLEXITY_MAX_INPUT_SIZE,
+            "min_time": 0.02,
+            "time_budget": settings.COMPLEXITY_TIME_BUDGET,
+            "seed": 7,
+            "uid": settings.COMPLEXITY_SANDBOX_UID,
+            "gid": settings.COMPLEXITY_SANDBOX_GID
+        }
+        async with self._semaphore:
+            records, stopped = await self._run(request)
+
+        info = next((r for r in records if "function" in r), {})
+        samples = [r for r in records if "n" in r]
+        error = next((_describe_error(r) for r in records if "error" in r), None)
+        result = {
+            "function": info.get("function"),
+            "input_kind": info.get("input_kind"),
+            "samples": [
+                {"n": s["n"], "seconds": round(s["seconds"], 9), "peak_bytes": s["peak_bytes"]} for s in samples
+            ],
+            "time_complexity": None,
+            "space_complexity": None,
+            "error": error,
+            "stopped": stopped
+        }
+        if len(samples) < _MIN_SAMPLES:
+            if error is None:
+                result["error"] = (
+                    f"Only {len(samples)} input sizes completed"
+                    + (f" ({stopped})" if stopped else "")
+                    + f"; at least {_MIN_SAMPLES} are needed to fit a curve"
+                )
+            return result
+
+        sizes = [s["n"] for s in samples]
+        time_fit = fit_complexity(sizes, [s["seconds"] for s in samples], _TIME_FLOOR)
+        result["time_complexity"] = time_fit.pop("complexity")
+        result["time_fit"] = time_fit
+        peaks = [s["peak_bytes"] for s in samples]
+        if max(peaks) - min(peaks) < _CONSTANT_SPACE_BYTES:
+            result["space_complexity"] = "O(1)"
+        else:
+            large = [(n, peak) for n, peak in zip(sizes, peaks) if peak >= _SPACE_FIT_MIN_BYTES]
+            if len(large) >= _MIN_SAMPLES:
+                space_sizes, peaks = [n for n, _ in large], [peak for _, peak in large]
+            else:
+                space_sizes = sizes
+            space_fit = fit_complexity(space_sizes, peaks, _SPACE_FLOOR)
+            result["space_complexity"] = space_fit.pop("complexity")
+            result["space_fit"] = space_fit
+        return result
+
+
+def compare_with_claim(measured: Dict, claimed: Optional[Dict]) -> Dict:
+    """把实测复杂度与 LLM 给出的 complexity 字段对照，无法识别 LLM 的说法时 agrees 为 None"""
+    claimed = claimed or {}
+    comparison = {}
+    for key in ("time_complexity", "space_complexity"):
+        claim = normalize_big_o(claimed.get(key))
+        actual = measured.get(key)
+        comparison[key] = {
+            "claimed": claim,
+            "measured": actual,
+            "agrees": None if claim is None or actual is None else claim == actual
+        }
+    return comparison
@@ -1,44 +1,58 @@
+import asyncio
+import inspect
+import time
 import uuid
 
 import google.generativeai as genai
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import json
+from sqlalchemy import func
 from src.config import settings
-from src.database.models import Candidate, Session
+from src.core.answer_scorer import AnswerScorer
+from src.core.irt import IRTCalibration
+from src.core.llm_client import LLMClient
+from src.core.prompts import RenderedPrompt, registry as prompt_registry
+from src.core.question_index import QuestionHistory
+from src.core.session_store import SessionConflictError, create_session_store
+from src.core.usage import UsageMeter, track_usage
+from src.database.models import Candidate, QuestionBank, Session
 import numpy as np
 
 class InterviewEngine:
     def __init__(self):
         # 配置 Gemini API
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
-        self.context = []
-        self.current_difficulty = 1.0
-        self.performance_history = []
+        self.model = LLMClient(component="interview", task="question_generation")
         self.question_categories = {
             "theoretical": 0,
             "practical": 0,
             "problem_solving": 0,
             "system_design": 0
         }
+        # 面试进行中的会话状态（上下文、难度、表现历史）保存在会话存储中，
+        # 多个 worker 进程共用 SQLite 存储时任意 worker 都能处理同一会话的请求
+        self.sessions = create_session_store(settings.SESSION_STORE_BACKEND, settings.SESSION_STORE_PATH)
+        # 候选人历史问题索引，避免重复提问
+        self.question_history = QuestionHistory(threshold=settings.QUESTION_DEDUP_THRESHOLD)
+        self.answer_scorer = AnswerScorer()
+        # 基于历史得分标定的问题难度和候选人能力；未标定时沿用固定阈值规则
+        self.irt = IRTCalibration(
+            target_score=settings.IRT_TARGET_SCORE,
+            prior_sd=settings.IRT_PRIOR_SD,
+            min_item_responses=settings.IRT_MIN_ITEM_RESPONSES,
+            stop_standard_error=settings.IRT_STOP_STANDARD_ERROR
+        )
+        self._turn_locks: Dict[str, asyncio.Lock] = {}
+        self._pending_evaluations: Dict[Tuple[str, int], asyncio.Task] = {}
+        self._last_purge = time.monotonic()
 
 
-    def _create_interview_prompt(self, position_level: str, technologies: List[str]) -> str:
-        tech_str = ", ".join(technologies)
-        return f"""
-        You are an experienced IT technical interviewer. Your task is to:
-        1. Focus on {position_level} level position involving {tech_str}
-        2. Ask technical questions appropriate for this level
-        3. Each question should be specific and clear
-        4. Evaluate the candidate's responses
-        5. Provide constructive feedback
-
-        Format your responses in this structure:
-        {{
-            "question": "Your technical question here",
-            "context": "Brief context or background for the question"
-        }}
-        """
+    def _create_interview_prompt(self, position_level: str, technologies: List[str]) -> RenderedPrompt:
+        return prompt_registry.render(
+            "interview_system",
+            position_level=position_level,
+            technologies=", ".join(technologies)
+        )
 
     def _calculate_initial_difficulty(self, candidate: Candidate) -> float:
         """基于候选人背景计算初始难度"""
@@ -63,26 +77,38 @@ class InterviewEngine:
 
         return min(max(difficulty, 0.5), 2.5)  # 限制在0.5-2.5范围内
 
-    def _adjust_difficulty(self, performance_score: float) -> float:
-        """根据答题表现动态调整难度"""
+    def _adjust_difficulty(self, state: Dict, performance_score: float, question: Dict = None) -> float:
+        """根据答题表现动态调整难度
+
+        已有 IRT 标定时按该题的标定难度更新能力估计，再选择期望得分率为目标值的难度；
+        否则按近期平均分的固定阈值升降。
+        """
         # 记录历史表现
-        self.performance_history.append(performance_score)
+        performance_history = state["performance_history"]
+        performance_history.append(performance_score)
+
+        if state.get("ability") is not None and question is not None:
+            item_logit = self.irt.item_logit(question["content"], question["metadata"]["difficulty"])
+            state["ability"] = self.irt.update_ability(state["ability"], performance_score / 100, item_logit)
+            state["current_difficulty"] = self.irt.next_difficulty(state["ability"])
+            return state["current_difficulty"]
 
         # 计算近期表现趋势
-        recent_performance = self.performance_history[-3:] if len(
-            self.performance_history) >= 3 else self.performance_history
+        recent_performance = performance_history[-3:] if len(
+            performance_history) >= 3 else performance_history
         avg_performance = np.mean(recent_performance)
 
         # 动态调整难度
         if avg_performance > 85:  # 表现优秀，增加难度
-            self.current_difficulty = min(self.current_difficulty * 1.2, 2.5)
+            state["current_difficulty"] = min(state["current_difficulty"] * 1.2, 2.5)
         elif avg_performance < 60:  # 表现欠佳，降低难度
-            self.current_difficulty = max(self.current_difficulty * 0.8, 0.5)
+            state["current_difficulty"] = max(state["current_difficulty"] * 0.8, 0.5)
 
-        return self.current_difficulty
+        return state["current_difficulty"]
 
-    def _create_adaptive_question(self, topic: str, difficulty: float) -> str:
-        """根据难度生成适应性问题"""
+    def _create_adaptive_question(self, topic: str, difficulty: float, avoid: List[str] = None,
+                                  key: str = None) -> RenderedPrompt:
+        """根据难度生成适应性问题；key 决定 A/B 测试中使用的模板版本"""
         difficulty_descriptors = {
             (0.5, 1.0): "basic concepts and fundamentals",
             (1.0, 1.5): "intermediate concepts and practical applications",
@@ -96,27 +122,106 @@ class InterviewEngine:
             if min_d <= difficulty <= max_d
         )
 
-        # 生成问题提示
-        prompt = f"""
-        Generate a {topic} interview question that focuses on {level_desc}.
-        Current difficulty level: {difficulty}/2.5
-
-        The question should:
-        1. Match the specified difficulty level
-        2. Require practical understanding
-        3. Allow for follow-up discussion
-        4. Test both theoretical knowledge and practical application
-
-        Format the response as:
-        {{
-            "question": "The main question",
-            "expected_topics": ["Key points the answer should cover"],
-            "follow_ups": ["Potential follow-up questions"],
-            "evaluation_criteria": ["Criteria for evaluating the answer"]
-        }}
+        avoid_text = f"""
+        Do not repeat or paraphrase any of these previously asked questions:
+        {json.dumps(avoid)}
+        """ if avoid else ""
+
+        return prompt_registry.render(
+            "interview_question",
+            key=key,
+            topic=topic,
+            level_description=level_desc,
+            difficulty=difficulty,
+            avoid=avoid_text
+        )
+
+    def _pooled_question(self, topic: str, difficulty: float, candidate_id: str, db_session,
+                         nearest: bool = False, technologies: Optional[List[str]] = None) -> Optional[Dict]:
+        """从题库中选取难度相近且该候选人没有被问过的问题
+
+        只选取会话技术栈（technologies，默认为 topic）内的问题，同一主题的优先。
+        nearest 为 True 时（模型不可用的降级模式）不限难度范围，按难度差由近到远选取。
         """
+        topics = [t.lower() for t in (technologies or [topic])]
+        query = db_session.query(QuestionBank).filter(func.lower(QuestionBank.topic).in_(topics))
+        if nearest:
+            query = query.order_by(func.abs(QuestionBank.difficulty - difficulty)).limit(100)
+        else:
+            tolerance = settings.QUESTION_POOL_DIFFICULTY_TOLERANCE
+            query = query.filter(
+                QuestionBank.difficulty.between(difficulty - tolerance, difficulty + tolerance)
+            ).order_by(func.random()).limit(20)
+        pool = query.all()
+
+        # 优先选择同一主题的问题
+        for item in sorted(pool, key=lambda q: (q.topic or "").lower() != topic.lower()):
+            if self.question_history.find_duplicate(candidate_id, item.question) is None:
+                return {
+                    "question": item.question,
+                    "expected_topics": item.expected_topics,
+                    "follow_ups": item.follow_ups,
+                    "evaluation_criteria": item.evaluation_criteria,
+                    "template_version": item.template_version
+                }
+        return None
 
-        return prompt
+    async def _generate_question(self, topic: str, difficulty: float, candidate_id: str, db_session,
+                                 use_model: bool = True, technologies: Optional[List[str]] = None) -> Dict:
+        """生成问题，并与候选人的历史问题去重
+
+        生成结果与历史问题近似重复时，优先换用题库中的问题，没有可用的再重新生成。
+        use_model 为 False 时（会话已超出 LLM 预算）优先从题库选题，题库中没有可用问题时才调用模型。
+        """
+        self.question_history.sync(db_session)
+        avoid = []
+        question = None
+
+        if not use_model:
+            question = self._pooled_question(topic, difficulty, candidate_id, db_session, nearest=True,
+                                             technologies=technologies)
+            if question is not None:
+                self.question_history.add(candidate_id, question["question"])
+                return question
+
+        for _ in range(settings.QUESTION_DEDUP_MAX_RETRIES + 1):
+            prompt = self._create_adaptive_question(topic, difficulty, avoid, key=candidate_id)
+            try:
+                response = await self.model.generate_content_async(prompt)
+                question = json.loads(response.text)
+                question["template_version"] = prompt.version
+            except Exception:
+                # 模型不可用（熔断、超时等）时改用题库中的问题
+                pooled = self._pooled_question(topic, difficulty, candidate_id, db_session, nearest=True,
+                                               technologies=technologies)
+                if pooled is None:
+                    raise
+                question = pooled
+                break
+
+            duplicate = self.question_history.find_duplicate(candidate_id, question["question"])
+            if duplicate is None:
+                db_session.add(QuestionBank(
+                    id=str(uuid.uuid4()),
+                    topic=topic,
+                    difficulty=difficulty,
+                    question=question["question"],
+                    expected_topics=question["expected_topics"],
+                    follow_ups=question.get("follow_ups", []),
+                    evaluation_criteria=question["evaluation_criteria"],
+                    template_version=prompt.version
+                ))
+                db_session.commit()
+                break
+
+            pooled = self._pooled_question(topic, difficulty, candidate_id, db_session, technologies=technologies)
+            if pooled is not None:
+                question = pooled
+                break
+            avoid.append(duplicate[0])
+
+        self.question_history.add(candidate_id, question["question"])
+        return question
 
 
 
@@ -219,6 +324,7 @@ class InterviewEngine:
             db_session
     ) -> Dict:
         """开始新的面试会话"""
+        self._purge_idle_sessions()
         try:
             # 获取候选人信息
             candidate = db_session.query(Candidate).get(candidate_id)
@@ -226,14 +332,19 @@ class InterviewEngine:
                 raise ValueError("Candidate not found")
 
             # 计算初始难度
-            self.current_difficulty = self._calculate_initial_difficulty(candidate)
+            ability = self.irt.initial_ability(db_session, candidate)
+            if ability is not None:
+                current_difficulty = self.irt.next_difficulty(ability)
+            else:
+                current_difficulty = self._calculate_initial_difficulty(candidate)
 
             # 根据技术栈和难度生成初始问题
             initial_topic = technologies[0]  # 从第一个技术开始
-            question_prompt = self._create_adaptive_question(initial_topic, self.current_difficulty)
-
-            response = await self.model.generate_content_async(question_prompt)
-            result = json.loads(response.text)
+            usage = UsageMeter()
+            with track_usage(usage):
+                result = await self._generate_question(
+                    initial_topic, current_difficulty, candidate_id, db_session, technologies=technologies
+                )
 
             # 创建新的面试会话记录
             interview_session = Session(
@@ -241,7 +352,7 @@ class InterviewEngine:
                 candidate_id=candidate_id,
                 position_level=position_level,
                 technologies=",".join(technologies),
-                difficulty_level=self.current_difficulty,
+                difficulty_level=current_difficulty,
                 performance_metrics={
                     "questions_asked": 0,
                     "average_score": 0,
@@ -252,22 +363,34 @@ class InterviewEngine:
             db_session.add(interview_session)
             db_session.commit()
 
-            self.context = [{
+            context = [{
                 "role": "interviewer",
                 "content": result["question"],
                 "metadata": {
-                    "difficulty": self.current_difficulty,
+                    "difficulty": current_difficulty,
                     "expected_topics": result["expected_topics"],
-                    "evaluation_criteria": result["evaluation_criteria"]
+                    "evaluation_criteria": result["evaluation_criteria"],
+                    "template_version": result.get("template_version")
                 }
             }]
+            self.sessions.save(interview_session.id, {
+                "candidate_id": candidate_id,
+                "position_level": position_level,
+                "technologies": technologies,
+                "current_difficulty": current_difficulty,
+                "performance_history": [],
+                "ability": ability,
+                "usage": usage.to_dict(),
+                "context": context
+            }, expected_version=None)
 
             # 确保返回所有必需的字段
             return {
                 "session_id": interview_session.id,  # 使用新创建的会话ID
                 "question": result["question"],
-                "difficulty_level": self.current_difficulty,
-                "session_context": self.context
+                "difficulty_level": current_difficulty,
+                "usage": usage.to_dict(),
+                "session_context": context
             }
 
         except Exception as e:
@@ -275,93 +398,306 @@ class InterviewEngine:
             db_session.rollback()  # 确保在出错时回滚数据库事务
             raise
 
-    async def process_answer(self, answer: str, db_session) -> Dict:
-        """处理回答并生成下一个问题"""
-        if not self.context:
-            raise ValueError("No active interview session")
-
-        last_question = self.context[-1]
-        evaluation_prompt = f"""
-        Evaluate this answer based on the following criteria:
-        Question: {last_question['content']}
-        Expected topics: {last_question['metadata']['expected_topics']}
-        Evaluation criteria: {last_question['metadata']['evaluation_criteria']}
-
-        Answer: {answer}
-
-        Provide evaluation in this format:
-        {{
-            "score": "Score out of 100",
-            "strength_points": ["Strong points in the answer"],
-            "weakness_points": ["Areas that need improvement"],
-            "missing_topics": ["Expected topics that were not covered"],
-            "clarity_score": "Score out of 100 for communication clarity"
-        }}
-        """
+    def _budget_exceeded(self, usage: UsageMeter) -> Optional[str]:
+        """会话的 LLM 用量超出任一预算时返回原因，之后的回合改用本地评分和题库问题"""
+        return usage.exceeded(
+            max_tokens=settings.SESSION_TOKEN_BUDGET,
+            max_seconds=settings.SESSION_LLM_SECONDS_BUDGET,
+            max_calls=settings.SESSION_LLM_CALL_BUDGET
+        )
 
+    def _next_topic(self, state: Dict) -> str:
+        """按技术栈轮换下一个问题的主题"""
+        technologies = state["technologies"]
+        asked = sum(1 for message in state["context"] if message["role"] == "interviewer")
+        return technologies[asked % len(technologies)]
+
+    def _purge_idle_sessions(self):
+        """清理超过 SESSION_IDLE_TTL 未活动的会话状态和本进程的回合锁；每十分之一个 TTL 最多执行一次"""
+        ttl = settings.SESSION_IDLE_TTL
+        if ttl <= 0 or time.monotonic() - self._last_purge < ttl / 10:
+            return
+        self._last_purge = time.monotonic()
         try:
-            # 评估答案
-            eval_response = await self.model.generate_content_async(evaluation_prompt)
-            evaluation = json.loads(eval_response.text)
-
-            # 调整难度
-            score = float(evaluation["score"])
-            new_difficulty = self._adjust_difficulty(score)
-
-            # 生成下一个问题
-            next_question_prompt = self._create_adaptive_question(
-                "next topic",  # 这里可以基于技术栈选择下一个主题
-                new_difficulty
+            for session_id in self.sessions.purge_expired(ttl):
+                self._turn_locks.pop(session_id, None)
+            # 其他 worker 清理或结束的会话，本进程的回合锁也不再需要
+            for session_id, lock in list(self._turn_locks.items()):
+                if not lock.locked() and self.sessions.load(session_id) is None:
+                    self._turn_locks.pop(session_id, None)
+        except Exception as e:
+            print(f"Error purging idle sessions: {e}")
+
+    def _turn_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._turn_locks.get(session_id)
+        if lock is None:
+            lock = self._turn_locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def process_answer(self, session_id: str, answer: str, db_session, on_refined=None,
+                             on_evaluation=None) -> Dict:
+        """处理回答并生成下一个问题
+
+        同一进程内同一会话的回合依次执行；会话状态按读取时的版本号写回，
+        其他 worker 在此期间提交了新回合时抛出 SessionConflictError。
+        开启 PROVISIONAL_SCORING 时先用本地评分给出初步评估并据此调整难度，
+        LLM 评估在后台进行，完成后写回会话状态并调用 on_refined(evaluation)。
+        on_evaluation(turn, evaluation, status) 在评估完成、生成下一个问题之前调用（可以是协程函数），
+        供推送通道提前把评估发给客户端；status 为 pending（后台 LLM 评估进行中）或 final。
+        """
+        async with self._turn_lock(session_id):
+            loaded = self.sessions.load(session_id)
+            if loaded is None:
+                raise ValueError("No active interview session")
+            state, version = loaded
+            context = state["context"]
+
+            last_question = context[-1]
+            evaluation_prompt = prompt_registry.render(
+                "answer_evaluation",
+                key=session_id,
+                question=last_question['content'],
+                expected_topics=last_question['metadata']['expected_topics'],
+                evaluation_criteria=last_question['metadata']['evaluation_criteria'],
+                answer=answer
             )
 
-            question_response = await self.model.generate_content_async(next_question_prompt)
-            next_question = json.loads(question_response.text)
-
-            # 更新上下文
-            self.context.append({
-                "role": "candidate",
-                "content": answer,
-                "metadata": {
-                    "evaluation": evaluation
-                }
-            })
-
-            self.context.append({
-                "role": "interviewer",
-                "content": next_question["question"],
-                "metadata": {
-                    "difficulty": new_difficulty,
-                    "expected_topics": next_question["expected_topics"],
-                    "evaluation_criteria": next_question["evaluation_criteria"]
-                }
-            })
-
-            return {
-                "evaluation": evaluation,
-                "next_question": next_question["question"],
-                "current_difficulty": new_difficulty,
-                "session_context": self.context
-            }
-
-        except Exception as e:
-            print(f"Error in process_answer: {e}")
-            raise
+            answer_metadata = {}
+            turn = len(context)
+            turn_saved = asyncio.Event()
+            refine_task = None
+            # 本回合的 LLM 用量单独计量，写回时累加到会话总用量
+            turn_usage = UsageMeter()
+            budget_reason = self._budget_exceeded(UsageMeter.from_dict(state.get("usage")))
+
+            try:
+                with track_usage(turn_usage):
+                    if budget_reason is not None:
+                        # 会话已超出 LLM 预算，只用本地评分
+                        evaluation = self.answer_scorer.score(
+                            answer,
+                            last_question['metadata']['expected_topics'],
+                            last_question['metadata']['evaluation_criteria']
+                        )
+                    elif settings.PROVISIONAL_SCORING:
+                        # 本地初步评分，LLM 评估异步完善
+                        evaluation = self.answer_scorer.score(
+                            answer,
+                            last_question['metadata']['expected_topics'],
+                            last_question['metadata']['evaluation_criteria']
+                        )
+                        answer_metadata["evaluation_status"] = "pending"
+                        refine_task = asyncio.create_task(
+                            self._refine_evaluation(session_id, turn, evaluation_prompt, turn_saved, on_refined)
+                        )
+                        self._pending_evaluations[(session_id, turn)] = refine_task
+                    else:
+                        # 评估答案，模型不可用时退回本地评分
+                        try:
+                            eval_response = await self.model.generate_content_async(evaluation_prompt)
+                            evaluation = json.loads(eval_response.text)
+                            evaluation["template_version"] = evaluation_prompt.version
+                        except Exception as e:
+                            print(f"Error evaluating answer, using local score: {e}")
+                            evaluation = self.answer_scorer.score(
+                                answer,
+                                last_question['metadata']['expected_topics'],
+                                last_question['metadata']['evaluation_criteria']
+                            )
+                    answer_metadata["evaluation"] = evaluation
+                    if on_evaluation is not None:
+                        notified = on_evaluation(turn, evaluation, answer_metadata.get("evaluation_status", "final"))
+                        if inspect.isawaitable(notified):
+                            await notified
+
+                    # 调整难度
+                    score = float(evaluation["score"])
+                    self.irt.load(db_session)
+                    new_difficulty = self._adjust_difficulty(state, score, last_question)
+
+                    # 生成下一个问题；本回合的评估可能已用完预算
+                    budget_reason = budget_reason or self._budget_exceeded(
+                        UsageMeter.from_dict(state.get("usage")).merge(turn_usage)
+                    )
+                    next_question = await self._generate_question(
+                        self._next_topic(state),
+                        new_difficulty,
+                        state["candidate_id"],
+                        db_session,
+                        use_model=budget_reason is None,
+                        technologies=state["technologies"]
+                    )
+
+                # 更新上下文
+                context.append({
+                    "role": "candidate",
+                    "content": answer,
+                    "metadata": answer_metadata
+                })
+
+                context.append({
+                    "role": "interviewer",
+                    "content": next_question["question"],
+                    "metadata": {
+                        "difficulty": new_difficulty,
+                        "expected_topics": next_question["expected_topics"],
+                        "evaluation_criteria": next_question["evaluation_criteria"],
+                        "template_version": next_question.get("template_version")
+                    }
+                })
+
+                self._save_turn(session_id, state, version, turn, turn_usage)
+
+            except (Exception, asyncio.CancelledError) as e:
+                # 包括客户端断开导致的取消：本回合未提交，后台评估也不再需要
+                if refine_task is not None:
+                    refine_task.cancel()
+                    self._pending_evaluations.pop((session_id, turn), None)
+                print(f"Error in process_answer: {e}")
+                raise
+
+        # 本回合已写入存储后才允许后台评估写回；
+        # 调用方在下一次 await 之前写入的面试记录因此总是先于 on_refined 存在
+        turn_saved.set()
+
+        return {
+            "evaluation": evaluation,
+            "evaluation_turn": turn,
+            "next_question": next_question["question"],
+            "current_difficulty": new_difficulty,
+            "ability": state.get("ability"),
+            "usage": state["usage"],
+            "budget_exceeded": budget_reason,
+            "session_context": context
+        }
 
-    async def end_interview(self, db_session) -> Dict:
-        """结束面试并生成详细报告"""
-        if not self.context:
+    def _save_turn(self, session_id: str, state: Dict, version: int, turn: int, turn_usage: UsageMeter):
+        """按版本号写回本回合；期间只有之前回合的评估被写回时，基于最新状态重放本回合"""
+        base_usage = state.get("usage")
+        state["usage"] = UsageMeter.from_dict(base_usage).merge(turn_usage).to_dict()
+        try:
+            self.sessions.save(session_id, state, version)
+        except SessionConflictError:
+            latest = self.sessions.load(session_id)
+            if latest is None or len(latest[0]["context"]) != turn:
+                raise
+            state["context"][:turn] = latest[0]["context"]
+            state["usage"] = UsageMeter.from_dict(latest[0].get("usage")).merge(turn_usage).to_dict()
+            self.sessions.save(session_id, state, latest[1])
+
+    async def _refine_evaluation(self, session_id: str, turn: int, prompt: RenderedPrompt,
+                                 turn_saved: asyncio.Event, on_refined=None) -> Dict:
+        """后台调用 LLM 完善评估，结果写回会话状态中该轮回答的元数据，用量计入会话总用量"""
+        usage = UsageMeter()
+        try:
+            try:
+                # 任务继承了回合计量器，这里改为单独计量，避免回合写回前完成时重复计入
+                with track_usage(usage, exclusive=True):
+                    response = await self.model.generate_content_async(prompt)
+                evaluation, status = json.loads(response.text), "final"
+                evaluation["template_version"] = prompt.version
+            except Exception as e:
+                print(f"Error refining evaluation: {e}")
+                evaluation, status = None, "failed"
+
+            await turn_saved.wait()
+            evaluation = self._store_evaluation(session_id, turn, evaluation, status, usage)
+        finally:
+            self._pending_evaluations.pop((session_id, turn), None)
+
+        if status == "final" and on_refined:
+            on_refined(evaluation)
+
+        return {"turn": turn, "status": status, "evaluation": evaluation}
+
+    def _store_evaluation(self, session_id: str, turn: int, evaluation: Optional[Dict], status: str,
+                          usage: UsageMeter = None, max_attempts: int = 10) -> Optional[Dict]:
+        """以读取-修改-按版本写回的方式更新某轮评估，返回该轮当前的评估"""
+        for _ in range(max_attempts):
+            loaded = self.sessions.load(session_id)
+            if loaded is None:
+                # 会话已结束
+                return evaluation
+            state, version = loaded
+            metadata = state["context"][turn]["metadata"]
+            if evaluation is not None:
+                evaluation["provisional_score"] = metadata["evaluation"]["score"]
+                metadata["evaluation"] = evaluation
+            metadata["evaluation_status"] = status
+            if usage is not None:
+                state["usage"] = UsageMeter.from_dict(state.get("usage")).merge(usage).to_dict()
+            try:
+                self.sessions.save(session_id, state, version)
+                return metadata["evaluation"]
+            except SessionConflictError:
+                continue
+        print(f"Error storing evaluation for session {session_id} turn {turn}: too many conflicts")
+        return evaluation
+
+    async def _wait_for_changes(self, session_id: str, timeout: float):
+        """等待本进程内该会话的后台评估完成；其他 worker 上的评估只能按间隔轮询存储"""
+        local = [task for (sid, _), task in self._pending_evaluations.items() if sid == session_id]
+        if local:
+            await asyncio.wait(local, timeout=timeout)
+        else:
+            await asyncio.sleep(timeout)
+
+    async def refined_evaluations(self, session_id: str, since_turn: int = 0, timeout: float = None):
+        """产出 since_turn 之后的 LLM 评估结果：先是已完成的，再按完成顺序产出后台进行中的"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (settings.EVALUATION_REFINE_TIMEOUT if timeout is None else timeout)
+        emitted = set()
+
+        while True:
+            loaded = self.sessions.load(session_id)
+            if loaded is None:
+                return
+
+            pending = False
+            for turn, message in enumerate(loaded[0]["context"]):
+                status = message.get("metadata", {}).get("evaluation_status")
+                if turn < since_turn or turn in emitted or status is None:
+                    continue
+                if status == "pending":
+                    pending = True
+                    continue
+                emitted.add(turn)
+                yield {"turn": turn, "status": status, "evaluation": message["metadata"]["evaluation"]}
+
+            remaining = deadline - loop.time()
+            if not pending or remaining <= 0:
+                return
+            await self._wait_for_changes(session_id, min(settings.SESSION_POLL_INTERVAL, remaining))
+
+    async def wait_for_evaluations(self, session_id: str, timeout: float):
+        """等待后台评估完成，超时后保留初步评分"""
+        async for _ in self.refined_evaluations(session_id, timeout=timeout):
+            pass
+
+    async def end_interview(self, session_id: str, db_session, include_recommendations: bool = True) -> Dict:
+        """结束面试并生成详细报告
+
+        include_recommendations 为 False 时不在请求内调用 LLM 生成建议，由调用方另行安排。
+        """
+        await self.wait_for_evaluations(session_id, settings.EVALUATION_REFINE_TIMEOUT)
+        loaded = self.sessions.load(session_id)
+        if loaded is None:
+            self._turn_locks.pop(session_id, None)
             raise ValueError("No interview context found")
+        state, _ = loaded
 
         # 收集所有评估数据
         evaluations = [
             msg["metadata"]["evaluation"]
-            for msg in self.context
+            for msg in state["context"]
             if msg["role"] == "candidate" and "evaluation" in msg["metadata"]
         ]
 
         # 计算总体统计
         scores = [float(eval_["score"]) for eval_ in evaluations]
-        clarity_scores = [float(eval_["clarity_score"]) for eval_ in evaluations]
+        clarity_scores = [
+            float(eval_["clarity_score"]) for eval_ in evaluations if eval_.get("clarity_score") is not None
+        ]
 
         # 收集优势和改进点
         all_strengths = [point for eval_ in evaluations for point in eval_["strength_points"]]
@@ -370,40 +706,38 @@ class InterviewEngine:
         # 生成最终报告
         report = {
             "overall_score": np.mean(scores),
-            "communication_score": np.mean(clarity_scores),
-            "difficulty_progression": self.performance_history,
+            "communication_score": np.mean(clarity_scores) if clarity_scores else None,
+            "difficulty_progression": state["performance_history"],
             "key_strengths": list(set(all_strengths)),
             "areas_for_improvement": list(set(all_weaknesses)),
             "question_count": len(evaluations),
             "performance_trend": "improving" if np.gradient(scores)[-1] > 0 else "steady" if np.gradient(scores)[
                                                                                                  -1] == 0 else "declining",
-            "recommendations": await self._generate_recommendations(all_weaknesses)
+            "recommendations": (
+                await self._generate_recommendations(all_weaknesses) if include_recommendations else None
+            ),
+            "usage": state.get("usage")
         }
 
+        self.sessions.delete(session_id)
+        self._turn_locks.pop(session_id, None)
         return report
 
-    async def _generate_recommendations(self, weaknesses: List[str]) -> List[str]:
-        """基于面试表现生成具体改进建议"""
+    async def _generate_recommendations(self, weaknesses: List[str], raise_errors: bool = False) -> List[str]:
+        """基于面试表现生成具体改进建议
+
+        raise_errors 为 True 时把 LLM 调用错误抛给调用方（后台任务据此重试）。
+        """
         if not weaknesses:
             return ["Continue practicing and staying updated with latest technologies"]
 
-        prompt = f"""
-        Based on these identified weaknesses:
-        {json.dumps(weaknesses)}
-
-        Provide specific, actionable recommendations for improvement.
-        Focus on:
-        1. Learning resources
-        2. Practice exercises
-        3. Project suggestions
-        4. Study strategies
-
-        Format as a list of specific recommendations.
-        """
+        prompt = prompt_registry.render("recommendations", weaknesses=json.dumps(weaknesses))
 
         try:
             response = await self.model.generate_content_async(prompt)
             return json.loads(response.text)
         except Exception as e:
+            if raise_errors:
+                raise
             print(f"Error generating recommendations: {e}")
             return ["Unable to generate specific recommendations"]
\ No newline at end of file
@@ -0,0 +1,245 @@
+import math
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select
+
+from src.core.question_index import normalize_question
+from src.database.models import (
+    Candidate,
+    CandidateAbility,
+    InterviewRecord,
+    IRTModel,
+    ItemCalibration,
+    Session
+)
+
+MIN_DIFFICULTY, MAX_DIFFICULTY = 0.5, 2.5
+# 尚无足够数据拟合映射时，引擎难度 0.5-2.5 对应 logit 难度 -1.5-1.5
+DEFAULT_SLOPE, DEFAULT_INTERCEPT = 1.5, -2.25
+_MODEL_ID = "current"
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def fit_rasch(
+        person_idx: np.ndarray,
+        item_idx: np.ndarray,
+        scores: np.ndarray,
+        n_persons: int,
+        n_items: int,
+        prior_sd: float = 1.0,
+        max_iter: int = 100,
+        tol: float = 1e-4
+):
+    """拟合分数型 Rasch 模型：期望得分率 = sigmoid(theta_候选人 - b_问题)
+
+    scores 为 0-1 的得分率。能力和难度两组参数交替做对角牛顿步，
+    两者都带 N(0, prior_sd²) 先验，既保证可识别，也让回答很少的问题向均值收缩。
+    返回 (theta, b, theta 标准误, b 标准误)。
+    """
+    theta = np.zeros(n_persons)
+    b = np.zeros(n_items)
+    precision = 1.0 / prior_sd ** 2
+
+    for _ in range(max_iter):
+        p = _sigmoid(theta[person_idx] - b[item_idx])
+        theta_info = np.bincount(person_idx, p * (1 - p), n_persons) + precision
+        theta_step = (np.bincount(person_idx, scores - p, n_persons) - precision * theta) / theta_info
+        theta += np.clip(theta_step, -1.0, 1.0)
+
+        p = _sigmoid(theta[person_idx] - b[item_idx])
+        b_info = np.bincount(item_idx, p * (1 - p), n_items) + precision
+        b_step = (np.bincount(item_idx, p - scores, n_items) - precision * b) / b_info
+        b += np.clip(b_step, -1.0, 1.0)
+
+        if max(np.abs(theta_step).max(initial=0), np.abs(b_step).max(initial=0)) < tol:
+            break
+
+    return theta, b, 1 / np.sqrt(theta_info), 1 / np.sqrt(b_info)
+
+
+class IRTCalibration:
+    """基于历史得分的难度与能力标定，以及面试中的在线能力估计
+
+    fit() 从全部已评分的回答中拟合问题难度和候选人能力，写入 irt_* 查找表；
+    引擎出题时按候选人当前能力估计选择期望得分率为 target_score 的难度，
+    每答一题用该题的标定难度更新能力估计，标准误低于 stop_standard_error 即视为收敛。
+    尚未标定时返回 None，引擎沿用原有的阈值规则。
+    """
+
+    def __init__(
+            self,
+            target_score: float = 0.5,
+            prior_sd: float = 1.0,
+            min_item_responses: int = 2,
+            stop_standard_error: float = 0.4
+    ):
+        self.target_score = target_score
+        self.prior_sd = prior_sd
+        self.min_item_responses = min_item_responses
+        self.stop_standard_error = stop_standard_error
+        self._fitted_at = None
+        self._slope = DEFAULT_SLOPE
+        self._intercept = DEFAULT_INTERCEPT
+        self._level_abilities: Dict[str, float] = {}
+        self._items: Dict[str, float] = {}
+
+    def fit(self, db_session) -> Dict:
+        """全量标定并替换查找表"""
+        responses = pd.read_sql(
+            select(
+                Session.candidate_id, Candidate.current_level,
+                InterviewRecord.question, InterviewRecord.score, InterviewRecord.difficulty
+            )
+            .join(Session, InterviewRecord.session_id == Session.id)
+            .join(Candidate, Session.candidate_id == Candidate.id)
+            .where(InterviewRecord.score.isnot(None)),
+            db_session.connection()
+        )
+        if responses.empty:
+            return {"fitted": False, "reason": "no scored answers"}
+
+        responses["question_key"] = responses["question"].map(normalize_question)
+        person_idx, candidates = pd.factorize(responses["candidate_id"])
+        item_idx, items = pd.factorize(responses["question_key"])
+        scores = np.clip(responses["score"].to_numpy(dtype=float) / 100, 0.0, 1.0)
+
+        theta, b, theta_se, b_se = fit_rasch(
+            person_idx, item_idx, scores, len(candidates), len(items), prior_sd=self.prior_sd
+        )
+        item_counts = np.bincount(item_idx, minlength=len(items))
+        person_counts = np.bincount(person_idx, minlength=len(candidates))
+
+        # 引擎难度刻度与 logit 难度的线性映射，以回答数加权
+        nominal = responses.groupby(item_idx)["difficulty"].mean().reindex(range(len(items))).to_numpy()
+        usable = (item_counts >= self.min_item_responses) & ~np.isnan(nominal)
+        slope, intercept = DEFAULT_SLOPE, DEFAULT_INTERCEPT
+        if usable.sum() >= 3 and np.ptp(nominal[usable]) > 0:
+            fitted_slope, fitted_intercept = np.polyfit(nominal[usable], b[usable], 1, w=np.sqrt(item_counts[usable]))
+            if fitted_slope > 0.1:
+                slope, intercept = float(fitted_slope), float(fitted_intercept)
+
+        levels = responses.drop_duplicates("candidate_id").set_index("candidate_id")["current_level"]
+        level_abilities = (
+            pd.Series(theta, index=candidates).groupby(levels.reindex(candidates).fillna("unknown").to_numpy()).mean()
+        )
+        first_question = responses.drop_duplicates("question_key").set_index("question_key")["question"]
+
+        fitted_at = datetime.utcnow()
+        engine_difficulty = np.clip((b - intercept) / slope, MIN_DIFFICULTY, MAX_DIFFICULTY)
+        db_session.query(ItemCalibration).delete()
+        db_session.query(CandidateAbility).delete()
+        db_session.execute(insert(ItemCalibration), [
+            {
+                "question_key": key,
+                "question": first_question[key],
+                "difficulty_logit": float(b[i]),
+                "standard_error": float(b_se[i]),
+                "engine_difficulty": float(engine_difficulty[i]),
+                "response_count": int(item_counts[i]),
+                "fitted_at": fitted_at
+            }
+            for i, key in enumerate(items)
+        ])
+        db_session.execute(insert(CandidateAbility), [
+            {
+                "candidate_id": candidate_id,
+                "theta": float(theta[i]),
+                "standard_error": float(theta_se[i]),
+                "response_count": int(person_counts[i]),
+                "fitted_at": fitted_at
+            }
+            for i, candidate_id in enumerate(candidates)
+        ])
+        db_session.merge(IRTModel(
+            id=_MODEL_ID,
+            slope=slope,
+            intercept=intercept,
+            level_abilities={level: float(value) for level, value in level_abilities.items()},
+            response_count=len(responses),
+            item_count=len(items),
+            candidate_count=len(candidates),
+            fitted_at=fitted_at
+        ))
+        db_session.commit()
+
+        return {"fitted": True, **self.summary(db_session)}
+
+    def summary(self, db_session) -> Optional[Dict]:
+        model = db_session.get(IRTModel, _MODEL_ID)
+        if model is None:
+            return None
+        return {
+            "fitted_at": model.fitted_at.isoformat(),
+            "responses": model.response_count,
+            "items": model.item_count,
+            "candidates": model.candidate_count,
+            "difficulty_scale": {"slope": model.slope, "intercept": model.intercept},
+            "level_abilities": model.level_abilities
+        }
+
+    def load(self, db_session) -> bool:
+        """按需加载查找表（标定更新后重新加载），返回是否已有标定结果"""
+        model = db_session.get(IRTModel, _MODEL_ID)
+        if model is None:
+            self._fitted_at = None
+            return False
+        if model.fitted_at != self._fitted_at:
+            self._slope, self._intercept = model.slope, model.intercept
+            self._level_abilities = dict(model.level_abilities or {})
+            self._items = dict(
+                db_session.query(ItemCalibration.question_key, ItemCalibration.difficulty_logit)
+                .filter(ItemCalibration.response_count >= self.min_item_responses)
+            )
+            self._fitted_at = model.fitted_at
+        return True
+
+    def to_engine(self, logit: float) -> float:
+        return float(min(max((logit - self._intercept) / self._slope, MIN_DIFFICULTY), MAX_DIFFICULTY))
+
+    def to_logit(self, difficulty: float) -> float:
+        return self._slope * difficulty + self._intercept
+
+    def initial_ability(self, db_session, candidate: Candidate) -> Optional[Dict]:
+        """面试开始时的能力先验：已标定的候选人用其能力，否则用同级别候选人的平均能力"""
+        if not self.load(db_session):
+            return None
+        precision = 1.0 / self.prior_sd ** 2
+        stored = db_session.get(CandidateAbility, candidate.id)
+        if stored is not None:
+            # 能力可能已经变化，先验精度封顶，保证本场面试仍能调整
+            theta, information = stored.theta, min(1.0 / stored.standard_error ** 2, 4 * precision)
+        else:
+            theta, information = self._level_abilities.get(candidate.current_level, 0.0), precision
+        return self._ability(theta, information, answers=0)
+
+    def _ability(self, theta: float, information: float, answers: int) -> Dict:
+        standard_error = 1.0 / math.sqrt(information)
+        return {
+            "theta": theta,
+            "information": information,
+            "standard_error": round(standard_error, 4),
+            "answers": answers,
+            "converged": answers > 0 and standard_error <= self.stop_standard_error
+        }
+
+    def item_logit(self, question: str, difficulty: float) -> float:
+        """问题的 logit 难度：已标定的用标定值，否则按引擎难度换算"""
+        return self._items.get(normalize_question(question), self.to_logit(difficulty))
+
+    def update_ability(self, ability: Dict, score: float, item_logit: float) -> Dict:
+        """根据一题的得分率（0-1）做一步牛顿更新"""
+        p = 1.0 / (1.0 + math.exp(-(ability["theta"] - item_logit)))
+        information = ability["information"] + p * (1 - p)
+        theta = ability["theta"] + (min(max(score, 0.0), 1.0) - p) / information
+        return self._ability(theta, information, ability["answers"] + 1)
+
+    def next_difficulty(self, ability: Dict) -> float:
+        """使期望得分率为 target_score 的引擎难度"""
+        target = min(max(self.target_score, 0.05), 0.95)
+        return self.to_engine(ability["theta"] - math.log(target / (1 - target)))
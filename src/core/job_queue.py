@@ -0,0 +1,288 @@
+import asyncio
+import ipaddress
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import func
+
+from src.config import settings
+from src.database.models import Job
+from src.database.session import session_scope
+
+
+class CallbackRejected(ValueError):
+    """回调地址指向内网、回环或链路本地地址"""
+
+
+def _allowed_hosts():
+    return {host.strip().lower() for host in settings.JOB_CALLBACK_ALLOWED_HOSTS.split(",") if host.strip()}
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    return ip.is_global and not ip.is_multicast
+
+
+def check_callback_url(url: str) -> str:
+    """校验回调地址：只允许 http(s)，字面量地址和 localhost 必须是公网地址或在 JOB_CALLBACK_ALLOWED_HOSTS 中"""
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme not in ("http", "https") or not host:
+        raise CallbackRejected("Callback URL must be an absolute http(s) URL")
+    if host in _allowed_hosts():
+        return url
+    if host == "localhost" or host.endswith(".localhost"):
+        raise CallbackRejected("Callback URL must not target a private, loopback or link-local address")
+    try:
+        public = _is_public(host)
+    except ValueError:
+        return url  # 主机名，发送前解析后再检查
+    if not public:
+        raise CallbackRejected("Callback URL must not target a private, loopback or link-local address")
+    return url
+
+
+async def _check_callback_target(url: str):
+    """发送前解析主机名，任一解析结果不是公网地址时拒绝（防止借回调访问内网服务）"""
+    check_callback_url(url)
+    parts = urlsplit(url)
+    host = parts.hostname.lower()
+    if host in _allowed_hosts():
+        return
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    if not addresses or not all(_is_public(address[4][0]) for address in addresses):
+        raise CallbackRejected(f"Callback host {host} resolves to a non-public address")
+
+
+class JobQueue:
+    """进程内后台任务队列
+
+    任务记录持久化在 jobs 表中，由若干 asyncio 工作协程执行。
+    运行中的任务每隔租约的三分之一刷新 updated_at（心跳）；stop() 把本进程正在执行的任务放回队列，
+    后台巡检每隔半个租约把超过租约未刷新的运行中任务（所在进程已崩溃）和无人处理的排队任务重新入队。
+    任务通过条件更新 status 认领，多个 worker 进程共用同一个数据库时不会重复执行。
+    失败的任务按 max_retries 重试。完成后 POST 回调 callback_url：只发往公网地址（或 JOB_CALLBACK_ALLOWED_HOSTS），
+    不跟随重定向，失败或 5xx/429 时按指数退避重试 callback_retries 次；回调仅尽力送达，
+    进程在重试期间停止时回调丢失，调用方应以 GET /jobs/{id} 的结果为准。
+    """
+
+    def __init__(self, workers: int = 2, max_retries: int = 2, retry_backoff: float = 2.0,
+                 lease_seconds: float = 300.0, callback_retries: int = 3):
+        self.worker_count = max(workers, 1)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self.callback_retries = callback_retries
+        self._handlers: Dict[str, Callable[[Dict], Awaitable]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._timers = set()
+        self._running = set()  # 本进程已认领、正在执行的任务
+
+    def register(self, kind: str):
+        """注册任务处理函数：async def handler(payload) -> result"""
+        def decorator(handler):
+            self._handlers[kind] = handler
+            return handler
+        return decorator
+
+    def enqueue(self, kind: str, payload: Dict, db_session, callback_url: str = None) -> str:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            payload=payload,
+            status="queued",
+            attempts=0,
+            callback_url=callback_url
+        )
+        db_session.add(job)
+        db_session.commit()
+        if self._queue is not None:
+            self._queue.put_nowait(job.id)
+        return job.id
+
+    def get(self, db_session, job_id: str) -> Optional[Dict]:
+        job = db_session.get(Job, job_id)
+        return self._to_dict(job) if job else None
+
+    def set_callback(self, db_session, job_id: str, callback_url: str) -> Optional[Dict]:
+        """登记完成回调；任务已结束时立即回调"""
+        job = db_session.get(Job, job_id)
+        if job is None:
+            return None
+        job.callback_url = callback_url
+        db_session.commit()
+        job_info = self._to_dict(job)
+        if job.status in ("succeeded", "failed"):
+            self._spawn(self._notify(job_info))
+        return job_info
+
+    async def start(self):
+        """启动工作协程和租约巡检，并恢复重启前未完成的任务"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._recover(include_queued=True)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self._workers.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self):
+        """停止工作协程，并把本进程正在执行的任务放回队列，由重启后的进程或其他进程继续执行"""
+        for task in self._workers + list(self._timers):
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self._running:
+            with session_scope() as db:
+                db.query(Job).filter(Job.id.in_(self._running), Job.status == "running").update(
+                    {Job.status: "queued", Job.updated_at: datetime.utcnow()},
+                    synchronize_session=False
+                )
+                db.commit()
+            self._running.clear()
+        self._workers = []
+        self._queue = None
+
+    def _recover(self, include_queued: bool = False):
+        """把租约过期的运行中任务改回排队并入队；include_queued 时同时入队全部排队中的任务，
+        否则只入队超过租约未更新的排队任务（其他进程停止时放回、尚无进程处理的任务）"""
+        lease_expired = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        with session_scope() as db:
+            stale = (Job.status == "running") & (Job.updated_at < lease_expired)
+            waiting = Job.status == "queued"
+            if not include_queued:
+                waiting = waiting & (Job.updated_at < lease_expired)
+            unfinished = db.query(Job).filter(stale | waiting).order_by(Job.created_at).all()
+            for job in unfinished:
+                if job.status == "running":
+                    # 条件更新，避免与刚刷新心跳的进程竞争
+                    reset = db.query(Job).filter(
+                        Job.id == job.id, Job.status == "running", Job.updated_at < lease_expired
+                    ).update({Job.status: "queued", Job.updated_at: datetime.utcnow()}, synchronize_session=False)
+                    if not reset:
+                        continue
+                self._queue.put_nowait(job.id)
+            db.commit()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                self._recover()
+            except Exception as e:
+                print(f"Error sweeping expired jobs: {e}")
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                with session_scope() as db:
+                    db.query(Job).filter(Job.id == job_id, Job.status == "running").update(
+                        {Job.updated_at: datetime.utcnow()}, synchronize_session=False
+                    )
+                    db.commit()
+            except Exception as e:
+                print(f"Error refreshing lease for job {job_id}: {e}")
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Error running job {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        with session_scope() as db:
+            # 条件更新认领任务，其他进程已认领时影响行数为 0
+            claimed = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update(
+                {
+                    Job.status: "running",
+                    Job.attempts: func.coalesce(Job.attempts, 0) + 1,
+                    Job.updated_at: datetime.utcnow()
+                },
+                synchronize_session=False
+            )
+            db.commit()
+            if not claimed:
+                return
+            job = db.get(Job, job_id)
+            kind, payload, attempts = job.kind, job.payload, job.attempts
+
+        self._running.add(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            result, error = await self._handlers[kind](payload), None
+        except Exception as e:
+            result, error = None, str(e)
+        finally:
+            heartbeat.cancel()
+
+        with session_scope() as db:
+            job = db.get(Job, job_id)
+            if error is None:
+                job.status, job.result, job.error = "succeeded", result, None
+            elif attempts <= self.max_retries:
+                job.status, job.error = "queued", error
+                self._spawn(self._requeue_later(job_id, self.retry_backoff * attempts))
+            else:
+                job.status, job.error = "failed", error
+            db.commit()
+            job_info = self._to_dict(job)
+        self._running.discard(job_id)
+
+        if job_info["status"] in ("succeeded", "failed"):
+            self._spawn(self._notify(job_info))
+
+    async def _requeue_later(self, job_id: str, delay: float):
+        await asyncio.sleep(delay)
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._timers.add(task)
+        task.add_done_callback(self._timers.discard)
+
+    async def _notify(self, job_info: Dict):
+        url = job_info.get("callback_url")
+        if not url:
+            return
+        error = None
+        for attempt in range(self.callback_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            try:
+                await _check_callback_target(url)
+                async with httpx.AsyncClient(follow_redirects=False) as client:
+                    response = await client.post(url, json=job_info, timeout=10.0)
+                if response.status_code < 500 and response.status_code != 429:
+                    return
+                error = f"HTTP {response.status_code}"
+            except CallbackRejected as e:
+                print(f"Refused job callback for {job_info['id']}: {e}")
+                return
+            except Exception as e:
+                error = str(e) or type(e).__name__
+        print(f"Error sending job callback for {job_info['id']} after {self.callback_retries + 1} attempts: {error}")
+
+    def _to_dict(self, job: Job) -> Dict:
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "result": job.result,
+            "error": job.error,
+            "attempts": job.attempts,
+            "callback_url": job.callback_url,
+            "created_at": job.created_at.isoformat() if job.created_at else None,
+            "updated_at": job.updated_at.isoformat() if job.updated_at else None
+        }
@@ -0,0 +1,286 @@
+import asyncio
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.config import settings
+from src.core.cassette import wrap_model
+from src.core.circuit_breaker import CircuitBreaker
+from src.core.model_router import ModelRouter, parse_routes, parse_tiers
+from src.core.usage import record_call
+
+
+class LLMTimeoutError(TimeoutError):
+    """LLM 调用超过截止时间"""
+
+
+def create_breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        window=settings.LLM_BREAKER_WINDOW,
+        min_calls=settings.LLM_BREAKER_MIN_CALLS,
+        error_rate=settings.LLM_BREAKER_ERROR_RATE,
+        slow_call_seconds=settings.LLM_BREAKER_SLOW_CALL_SECONDS,
+        slow_call_rate=settings.LLM_BREAKER_SLOW_CALL_RATE,
+        open_seconds=settings.LLM_BREAKER_OPEN_SECONDS
+    )
+
+
+# 直接传入模型（不使用路由）的 LLMClient 共用的熔断器
+llm_breaker = create_breaker()
+
+
+# 各组件共用的任务路由：未传入模型的 LLMClient 按提示的任务类型选择模型档位，每个档位有各自的熔断器
+model_router = ModelRouter(
+    parse_tiers(settings.LLM_MODEL_TIERS),
+    parse_routes(settings.LLM_TASK_ROUTES),
+    window=settings.LLM_ROUTER_WINDOW,
+    min_samples=settings.LLM_ROUTER_MIN_SAMPLES,
+    percentile=settings.LLM_ROUTER_PERCENTILE,
+    cooldown=settings.LLM_ROUTER_COOLDOWN,
+    breaker_factory=create_breaker
+)
+
+
+class LLMLoad:
+    """所有 LLMClient 共用的负载统计：进行中的调用数和近期调用耗时的指数移动平均，供准入控制使用"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.in_flight = 0
+        self.average_latency = 0.0
+
+    def record_latency(self, latency: float):
+        if self.average_latency == 0.0:
+            self.average_latency = latency
+        else:
+            self.average_latency += self.alpha * (latency - self.average_latency)
+
+
+llm_load = LLMLoad()
+
+
+def _create_cached_model(model, prefix: str, ttl: float):
+    """在模型端缓存前缀，返回以该缓存为上下文的模型；后端不支持时返回 None
+
+    自定义后端可实现 with_cached_prefix(prefix, ttl) 接入。
+    """
+    if hasattr(model, "with_cached_prefix"):
+        return model.with_cached_prefix(prefix, ttl)
+
+    import google.generativeai as genai
+    from google.generativeai import caching
+    if not isinstance(model, genai.GenerativeModel):
+        return None
+    cached = caching.CachedContent.create(
+        model=model.model_name,
+        contents=[prefix],
+        ttl=timedelta(seconds=ttl)
+    )
+    return genai.GenerativeModel.from_cached_content(cached)
+
+
+class PrefixCache:
+    """提示模板静态前缀的模型端上下文缓存
+
+    按 (模型, 前缀摘要) 记录已创建的缓存，命中时只发送变化的后缀。
+    创建失败（后端不支持、前缀短于后端的最小缓存长度等）时在一个 TTL 内不再尝试，直接发送全文。
+    """
+
+    def __init__(self, ttl: float = 3600, min_chars: int = 0):
+        self.ttl = ttl
+        self.min_chars = min_chars
+        self._entries: Dict[Tuple, Tuple[object, float]] = {}
+        self._locks: Dict[Tuple, asyncio.Lock] = {}
+        self.stats: Dict[str, int] = {"hits": 0, "created": 0, "errors": 0}
+
+    async def resolve(self, model, prompt):
+        """返回实际调用的 (模型, 提示)"""
+        prefix = getattr(prompt, "prefix", None)
+        if not prefix or len(prefix) < self.min_chars:
+            return model, prompt
+
+        key = (id(model), prompt.prefix_key)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                try:
+                    cached_model = await asyncio.to_thread(_create_cached_model, model, prefix, self.ttl)
+                    if cached_model is not None:
+                        self.stats["created"] += 1
+                except Exception as e:
+                    print(f"Error caching prompt prefix for {prompt.template}:{prompt.version}: {e}")
+                    self.stats["errors"] += 1
+                    cached_model = None
+                # 提前于服务端过期时间重建，避免使用刚过期的缓存
+                entry = self._entries[key] = (cached_model, time.monotonic() + self.ttl * 0.9)
+            else:
+                if entry[0] is not None:
+                    self.stats["hits"] += 1
+
+        if entry[0] is None:
+            return model, prompt
+        return entry[0], prompt.suffix
+
+
+prefix_cache = PrefixCache(
+    ttl=settings.LLM_CONTEXT_CACHE_TTL,
+    min_chars=settings.LLM_CONTEXT_CACHE_MIN_CHARS
+)
+
+
+class LLMClient:
+    """带截止时间和对冲请求的 LLM 调用封装
+
+    generate_content_async 与 genai.GenerativeModel 的同名方法参数一致，可直接替换 self.model。
+    - 每次调用都有截止时间，超时抛出 LLMTimeoutError，不再无限期阻塞一轮面试；
+    - 调用耗时超过近期延迟的 hedge_percentile 分位数时，再发出一个相同的请求，
+      取先成功返回的结果，另一个随即取消；
+    - 调用方被取消（如客户端断开连接）时，进行中的请求一并取消；
+    - 调用结果计入所选档位的熔断器（直接传入模型时为 llm_breaker），可用档位都已熔断时直接抛出
+      CircuitOpenError，由调用方改用降级数据；
+    - 开启上下文缓存时，模板渲染的提示（RenderedPrompt）复用模型端缓存的静态前缀；
+    - 每次调用的 token 数和耗时以 component 的名义记到当前活动的 UsageMeter 上；
+    - 设置 LLM_CASSETTE_MODE 时，模型的调用被录制到 cassette 或由 cassette 回放；
+    - 不传入 model 时由 ModelRouter 按任务类型（从提示模板推断，否则为 task）为每次调用选择模型档位。
+    """
+
+    def __init__(
+            self,
+            model=None,
+            timeout: float = None,
+            hedging: bool = None,
+            hedge_percentile: float = None,
+            hedge_min_delay: float = None,
+            min_samples: int = None,
+            window: int = 200,
+            breaker: CircuitBreaker = None,
+            context_cache: PrefixCache = None,
+            component: str = "llm",
+            task: str = None,
+            router: ModelRouter = None
+    ):
+        self.component = component
+        self.task = task
+        self.router = (router or model_router) if model is None else None
+        self._tier_models: Dict[str, object] = {}
+        # 使用路由时 model 为首选档位的模型，仅作默认值
+        self.model = self._tier_model(self.router.tiers[0]) if self.router else self._wrap(model)
+        # 使用路由且未指定熔断器时，按调用所选的档位使用该档位的熔断器
+        self.breaker = breaker if breaker is not None or self.router else llm_breaker
+        if context_cache is None and settings.LLM_CONTEXT_CACHE:
+            context_cache = prefix_cache
+        self.context_cache = context_cache
+        self.timeout = settings.LLM_TIMEOUT if timeout is None else timeout
+        self.hedging = settings.LLM_HEDGING if hedging is None else hedging
+        self.hedge_percentile = settings.LLM_HEDGE_PERCENTILE if hedge_percentile is None else hedge_percentile
+        self.hedge_min_delay = settings.LLM_HEDGE_MIN_DELAY if hedge_min_delay is None else hedge_min_delay
+        self.min_samples = settings.LLM_HEDGE_MIN_SAMPLES if min_samples is None else min_samples
+        self._latencies = deque(maxlen=window)
+        self.stats: Dict[str, int] = {"calls": 0, "hedged": 0, "hedge_wins": 0, "timeouts": 0}
+
+    def _wrap(self, model):
+        return wrap_model(
+            model,
+            settings.LLM_CASSETTE_MODE,
+            settings.LLM_CASSETTE_PATH,
+            self.component,
+            latency_scale=settings.LLM_CASSETTE_LATENCY_SCALE
+        )
+
+    def _tier_model(self, tier: str):
+        if tier not in self._tier_models:
+            self._tier_models[tier] = self._wrap(self.router.backend(tier))
+        return self._tier_models[tier]
+
+    def _route(self, prompt) -> Tuple[object, Optional[str], Optional[str]]:
+        """本次调用的 (模型, 任务, 档位)"""
+        if self.router is None:
+            return self.model, None, None
+        task = self.router.task_for(prompt, self.task)
+        tier = self.router.select(task)
+        return self._tier_model(tier), task, tier
+
+    def hedge_delay(self) -> Optional[float]:
+        """发出对冲请求前的等待时间；样本不足时不对冲"""
+        if not self.hedging or len(self._latencies) < self.min_samples:
+            return None
+        return max(float(np.percentile(self._latencies, self.hedge_percentile)), self.hedge_min_delay)
+
+    async def generate_content_async(self, prompt, timeout: float = None, **kwargs):
+        timeout = self.timeout if timeout is None else timeout
+        model, task, tier = self._route(prompt)
+        breaker = self.breaker or self.router.breakers[tier]
+        breaker.allow()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.stats["calls"] += 1
+
+        llm_load.in_flight += 1
+        try:
+            response = await asyncio.wait_for(self._call(model, prompt, kwargs), timeout)
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            self._latencies.append(timeout)
+            error = LLMTimeoutError(f"LLM call exceeded the {timeout}s deadline")
+            breaker.record_failure(error)
+            record_call(self.component, prompt, None, loop.time() - started, failed=True)
+            if tier is not None:
+                self.router.record(task, tier, prompt, None, loop.time() - started, failed=True)
+            raise error
+        except asyncio.CancelledError:
+            breaker.release()
+            record_call(self.component, prompt, None, loop.time() - started, failed=True)
+            raise
+        except Exception as e:
+            breaker.record_failure(e)
+            record_call(self.component, prompt, None, loop.time() - started, failed=True)
+            if tier is not None:
+                self.router.record(task, tier, prompt, None, loop.time() - started, failed=True)
+            raise
+        finally:
+            llm_load.in_flight -= 1
+
+        # 记录从首个请求发出到拿到结果的耗时；对冲只会截断高于分位点的样本，分位数估计不受影响
+        latency = loop.time() - started
+        self._latencies.append(latency)
+        llm_load.record_latency(latency)
+        breaker.record_success(latency)
+        record_call(self.component, prompt, response, latency)
+        if tier is not None:
+            self.router.record(task, tier, prompt, response, latency)
+        return response
+
+    async def _call(self, model, prompt, kwargs: Dict):
+        if self.context_cache is not None:
+            model, prompt = await self.context_cache.resolve(model, prompt)
+        return await self._hedged_call(model, prompt, kwargs)
+
+    async def _hedged_call(self, model, prompt, kwargs: Dict):
+        primary = asyncio.create_task(model.generate_content_async(prompt, **kwargs))
+        pending = {primary}
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    self.stats["hedged"] += 1
+                    pending.add(asyncio.create_task(model.generate_content_async(prompt, **kwargs)))
+
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    # 先返回的请求失败时继续等待另一个
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
@@ -0,0 +1,214 @@
+"""不依赖 LLM 的本地代码分析，在模型不可用时作为降级结果
+
+Python 代码基于 ast 做结构分析，其他语言只做基于文本的粗略估计。
+返回结构与 CodeAnalyzer.analyze_code 一致，并带有 "degraded": True。
+"""
+import ast
+import re
+from typing import Dict, List
+
+_LOOP_NODES = (ast.For, ast.AsyncFor, ast.While, ast.comprehension)
+_BRANCH_NODES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.With, ast.Assert)
+_SORT_CALLS = {"sorted", "sort"}
+_DANGEROUS_CALLS = {"eval", "exec", "compile", "__import__"}
+_MAX_COMPLEXITY = 10
+_MAX_FUNCTION_LINES = 50
+
+
+def _big_o(depth: int) -> str:
+    if depth == 0:
+        return "O(1)"
+    if depth == 1:
+        return "O(n)"
+    return f"O(n^{depth})"
+
+
+def _call_name(node: ast.Call) -> str:
+    func = node.func
+    if isinstance(func, ast.Name):
+        return func.id
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    return ""
+
+
+def _loop_depth(node: ast.AST, depth: int = 0) -> int:
+    """最大循环嵌套深度（推导式的每个 for 子句算一层）"""
+    best = depth
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)):
+            continue
+        child_depth = depth + 1 if isinstance(child, _LOOP_NODES) else depth
+        best = max(best, _loop_depth(child, child_depth))
+    return best
+
+
+def _cyclomatic_complexity(func: ast.AST) -> int:
+    complexity = 1
+    for node in ast.walk(func):
+        if isinstance(node, _BRANCH_NODES):
+            complexity += 1
+        elif isinstance(node, ast.BoolOp):
+            complexity += len(node.values) - 1
+        elif isinstance(node, ast.comprehension):
+            complexity += len(node.ifs)
+    return complexity
+
+
+def _is_recursive(func: ast.AST) -> bool:
+    return any(
+        isinstance(node, ast.Call) and _call_name(node) == func.name
+        for node in ast.walk(func)
+    )
+
+
+def _allocates_per_item(tree: ast.AST) -> bool:
+    """是否存在随输入规模增长的存储：推导式，或在循环中 append/add/键赋值"""
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.ListComp, ast.SetComp, ast.DictComp)):
+            return True
+        if isinstance(node, _LOOP_NODES[:3]):
+            for inner in ast.walk(node):
+                if isinstance(inner, ast.Call) and _call_name(inner) in ("append", "add", "extend", "update"):
+                    return True
+                if isinstance(inner, ast.Assign) and any(isinstance(t, ast.Subscript) for t in inner.targets):
+                    return True
+    return False
+
+
+def _analyze_python(code: str) -> Dict:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return {
+            "complexity": {
+                "time_complexity": "Unable to determine: code does not parse",
+                "space_complexity": "Unable to determine: code does not parse"
+            },
+            "best_practices": [],
+            "potential_issues": [f"Syntax error at line {e.lineno}: {e.msg}"],
+            "suggestions": ["Fix the syntax error so the code can be analyzed"]
+        }
+
+    followed: List[str] = []
+    violated: List[str] = []
+    issues: List[str] = []
+    suggestions: List[str] = []
+
+    depth = _loop_depth(tree)
+    functions = [n for n in ast.walk(tree) if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    depth = max([depth] + [_loop_depth(f) for f in functions])
+    recursive = [f.name for f in functions if _is_recursive(f)]
+    sorts = any(isinstance(n, ast.Call) and _call_name(n) in _SORT_CALLS for n in ast.walk(tree))
+
+    time_complexity = _big_o(depth)
+    explanation = f"deepest loop nesting is {depth}"
+    if sorts and depth <= 1:
+        time_complexity = "O(n log n)"
+        explanation = "dominated by sorting"
+    if recursive:
+        explanation += f"; recursive functions ({', '.join(recursive)}) depend on recursion depth"
+    space_complexity = "O(n)" if _allocates_per_item(tree) or recursive else "O(1)"
+
+    for func in functions:
+        complexity = _cyclomatic_complexity(func)
+        if complexity > _MAX_COMPLEXITY:
+            issues.append(f"Function '{func.name}' has cyclomatic complexity {complexity}")
+            suggestions.append(f"Split '{func.name}' into smaller functions")
+        length = (func.end_lineno or func.lineno) - func.lineno + 1
+        if length > _MAX_FUNCTION_LINES:
+            violated.append(f"Function '{func.name}' is {length} lines long")
+        for default in func.args.defaults + func.args.kw_defaults:
+            if isinstance(default, (ast.List, ast.Dict, ast.Set)):
+                issues.append(f"Function '{func.name}' uses a mutable default argument")
+                suggestions.append(f"Use None as the default in '{func.name}' and create the object inside")
+                break
+
+    if functions:
+        documented = [f for f in functions if ast.get_docstring(f)]
+        annotated = [f for f in functions if f.returns or any(a.annotation for a in f.args.args)]
+        (followed if len(documented) == len(functions) else violated).append(
+            f"{len(documented)}/{len(functions)} functions have docstrings"
+        )
+        (followed if len(annotated) == len(functions) else violated).append(
+            f"{len(annotated)}/{len(functions)} functions have type hints"
+        )
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ExceptHandler):
+            if node.type is None:
+                issues.append(f"Bare except at line {node.lineno} hides all errors")
+                suggestions.append("Catch specific exception types")
+            elif all(isinstance(stmt, ast.Pass) for stmt in node.body):
+                issues.append(f"Exception silently ignored at line {node.lineno}")
+        elif isinstance(node, ast.Call) and _call_name(node) in _DANGEROUS_CALLS and isinstance(node.func, ast.Name):
+            issues.append(f"Use of {node.func.id}() at line {node.lineno} can execute arbitrary code")
+            suggestions.append(f"Avoid {node.func.id}(); use ast.literal_eval or explicit parsing")
+        elif isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names):
+            violated.append(f"Wildcard import from {node.module}")
+        elif isinstance(node, ast.Compare) and any(
+                isinstance(op, (ast.Eq, ast.NotEq)) for op in node.ops
+        ) and any(isinstance(c, ast.Constant) and c.value is None for c in node.comparators):
+            violated.append(f"Comparison to None with == at line {node.lineno}")
+            suggestions.append("Use 'is None' / 'is not None'")
+        elif isinstance(node, ast.Global):
+            violated.append(f"Global statement at line {node.lineno}")
+
+    if depth >= 2:
+        suggestions.append("Nested loops may be replaced with a dict/set lookup to reduce complexity")
+
+    return {
+        "complexity": {
+            "time_complexity": f"{time_complexity} ({explanation})",
+            "space_complexity": space_complexity
+        },
+        "best_practices": followed + violated,
+        "potential_issues": issues,
+        "suggestions": list(dict.fromkeys(suggestions))
+    }
+
+
+def _analyze_text(code: str) -> Dict:
+    """非 Python 代码：按缩进估计循环嵌套深度，并做少量文本检查"""
+    loop_pattern = re.compile(r"^\s*(for|while|do|foreach)\b|\.forEach\(")
+    loop_indents: List[int] = []
+    depth = 0
+    issues: List[str] = []
+    violated: List[str] = []
+
+    for lineno, line in enumerate(code.splitlines(), 1):
+        if not line.strip():
+            continue
+        indent = len(line) - len(line.lstrip())
+        while loop_indents and indent <= loop_indents[-1] and not line.strip().startswith(("}", ")")):
+            loop_indents.pop()
+        if loop_pattern.search(line):
+            loop_indents.append(indent)
+            depth = max(depth, len(loop_indents))
+        if re.search(r"\beval\s*\(", line):
+            issues.append(f"Use of eval at line {lineno} can execute arbitrary code")
+        if len(line) > 120:
+            violated.append(f"Line {lineno} is longer than 120 characters")
+        if re.search(r"catch\s*\([^)]*\)\s*\{\s*\}", line):
+            issues.append(f"Empty catch block at line {lineno}")
+
+    return {
+        "complexity": {
+            "time_complexity": f"{_big_o(depth)} (estimated from loop nesting depth {depth})",
+            "space_complexity": "Unable to determine without the model"
+        },
+        "best_practices": violated,
+        "potential_issues": issues,
+        "suggestions": (
+            ["Nested loops may be replaced with a hash lookup to reduce complexity"] if depth >= 2 else []
+        )
+    }
+
+
+def analyze_locally(code: str, language: str) -> Dict:
+    if language.lower() in ("python", "py", "python3"):
+        result = _analyze_python(code)
+    else:
+        result = _analyze_text(code)
+    result["degraded"] = True
+    return result
@@ -0,0 +1,134 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from src.core.usage import UsageMeter, active_meters, use_meters
+from src.core.utils import parse_json_response
+
+
+@dataclass
+class _PendingRequest:
+    item: str
+    single_prompt: str
+    future: asyncio.Future
+    meters: Tuple[UsageMeter, ...]  # 提交时上下文中的计量器
+
+
+class MicroBatcher:
+    """在很短的时间窗口内合并同类小请求
+
+    同一 batch_key 的请求共用一段输出格式说明，窗口结束（或达到批量上限）时
+    合并成一个带序号的提示发送给模型，再按序号把结果分发给各自的调用方。
+    合并结果无法解析的条目会退回为单独调用。
+    合并调用的用量按条目数平均分摊到各提交者的计量器，单独调用记到该请求自己的计量器。
+    """
+
+    def __init__(self, model, window_ms: float = 10, max_batch_size: int = 8):
+        self.model = model
+        self.window = window_ms / 1000
+        self.max_batch_size = max(max_batch_size, 1)
+        self._pending: Dict[str, List[_PendingRequest]] = {}
+        self._instructions: Dict[str, str] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks = set()
+
+    async def submit(self, batch_key: str, instructions: str, item: str, single_prompt: str) -> Any:
+        """提交一个请求并等待属于它的结果"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        queue = self._pending.setdefault(batch_key, [])
+        self._instructions.setdefault(batch_key, instructions)
+        queue.append(_PendingRequest(item, single_prompt, future, active_meters()))
+
+        if len(queue) >= self.max_batch_size:
+            self._flush(batch_key)
+        elif batch_key not in self._timers:
+            self._timers[batch_key] = loop.call_later(self.window, self._flush, batch_key)
+
+        return await future
+
+    def _flush(self, batch_key: str):
+        timer = self._timers.pop(batch_key, None)
+        if timer:
+            timer.cancel()
+        requests = self._pending.pop(batch_key, [])
+        instructions = self._instructions.pop(batch_key, "")
+        if requests:
+            task = asyncio.create_task(self._dispatch(instructions, requests))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _create_batch_prompt(self, instructions: str, requests: List[_PendingRequest]) -> str:
+        items = "\n".join(f"[{index}] {request.item}" for index, request in enumerate(requests))
+        return f"""
+        Answer each of the following {len(requests)} requests independently:
+        {items}
+
+        The answer to each request must follow this format:
+        {instructions}
+
+        Return a JSON array with exactly one entry per request, where "index" is the request number
+        from the brackets as a plain integer (0, 1, 2, ...):
+        [
+            {{"index": 0, "result": "The answer object in the format above"}}
+        ]
+        """
+
+    async def _call_single(self, request: _PendingRequest):
+        if request.future.done():
+            return
+        try:
+            with use_meters(request.meters):
+                response = await self.model.generate_content_async(request.single_prompt)
+            result = parse_json_response(response.text)
+        except Exception as e:
+            if not request.future.done():
+                request.future.set_exception(e)
+            return
+        if not request.future.done():
+            request.future.set_result(result)
+
+    async def _dispatch(self, instructions: str, requests: List[_PendingRequest]):
+        if len(requests) == 1:
+            await self._call_single(requests[0])
+            return
+
+        results = {}
+        batch_usage = UsageMeter()
+        try:
+            with use_meters((batch_usage,)):
+                response = await self.model.generate_content_async(
+                    self._create_batch_prompt(instructions, requests)
+                )
+            parsed = parse_json_response(response.text)
+            # 只接受范围内、恰好出现一次的整数序号；格式错误的条目逐条跳过，
+            # 未知或重复的序号无法确定属于哪个提交者，按缺失处理
+            entries = {}
+            for entry in parsed if isinstance(parsed, list) else []:
+                if not isinstance(entry, dict) or not isinstance(entry.get("result"), dict):
+                    continue
+                index = entry.get("index")
+                if isinstance(index, str) and index.strip().isdigit():
+                    index = int(index)
+                if isinstance(index, int) and not isinstance(index, bool) and 0 <= index < len(requests):
+                    entries.setdefault(index, []).append(entry["result"])
+            results = {index: found[0] for index, found in entries.items() if len(found) == 1}
+        except Exception as e:
+            print(f"Error in micro-batch of {len(requests)} requests, falling back: {e}")
+        finally:
+            share = batch_usage.scaled(1 / len(requests))
+            for request in requests:
+                for meter in request.meters:
+                    meter.merge(share)
+
+        fallback = []
+        for index, request in enumerate(requests):
+            if index in results:
+                if not request.future.done():
+                    request.future.set_result(results[index])
+            else:
+                fallback.append(request)
+
+        if fallback:
+            await asyncio.gather(*(self._call_single(request) for request in fallback))
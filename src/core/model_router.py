@@ -0,0 +1,219 @@
+"""按任务类型选择模型档位，近期延迟超出 SLO 时改用更快的档位
+
+档位（tier）按从强到快排列，每个档位对应一个模型（如 pro=gemini-pro,flash=gemini-1.5-flash）；
+每类任务配置首选档位和延迟 SLO（秒）。任务的近期调用延迟分位数超出 SLO 时，该任务在冷却期内
+降到下一个更快的档位，冷却期结束后回到首选档位；降级后的档位仍然超出 SLO 时继续降级，直到最快的档位。
+每个档位有独立的熔断器，选中的档位熔断时改用最近的可用档位（先找更快的，再找更强的）。
+
+任务类型由提示模板名推断（见 TEMPLATE_TASKS），不是模板渲染的提示（如微批合并的提示）使用调用方的默认任务。
+模型名写成 fake 或 fake:<秒> 时使用本地的 FakeBackend，不需要网络和 API key，便于测试路由和降级。
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.circuit_breaker import CircuitBreaker
+from src.core.usage import UsageMeter, record_call
+
+TASKS = ("question_generation", "evaluation", "recommendations", "code_analysis", "explanation")
+
+# 提示模板 -> 任务类型
+TEMPLATE_TASKS = {
+    "interview_question": "question_generation",
+    "answer_evaluation": "evaluation",
+    "recommendations": "recommendations",
+    "code_analysis": "code_analysis",
+    "code_analysis_batch": "code_analysis",
+    "code_explanation": "explanation",
+    "explain_concept": "explanation",
+    "learning_path": "explanation",
+    "concept_relations": "explanation",
+}
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeBackend:
+    """本地假模型：等待固定的延迟后返回 responder(prompt) 的结果（默认为空 JSON 对象）"""
+
+    def __init__(self, latency: float = 0.0, responder: Callable[[str], str] = None, name: str = "fake"):
+        self.latency = latency
+        self.responder = responder or (lambda prompt: json.dumps({}))
+        self.model_name = name
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return FakeResponse(self.responder(str(prompt)))
+
+
+def create_backend(model_name: str):
+    """按模型名创建后端：fake[:延迟秒数] 为 FakeBackend，其余为 Gemini 模型"""
+    if model_name == "fake" or model_name.startswith("fake:"):
+        _, _, latency = model_name.partition(":")
+        return FakeBackend(float(latency or 0), name=model_name)
+    import google.generativeai as genai
+    return genai.GenerativeModel(model_name)
+
+
+def parse_tiers(config: str) -> List[Tuple[str, str]]:
+    """解析 "pro=gemini-pro,flash=gemini-1.5-flash" 格式的档位配置，按从强到快的顺序"""
+    tiers = []
+    for entry in config.split(","):
+        if entry.strip():
+            name, _, model_name = entry.partition("=")
+            tiers.append((name.strip(), model_name.strip()))
+    if not tiers:
+        raise ValueError("At least one model tier must be configured")
+    return tiers
+
+
+def parse_routes(config: str) -> Dict[str, Tuple[str, Optional[float]]]:
+    """解析 "evaluation=flash:8;code_analysis=pro:30" 格式的任务路由，省略 SLO 时不按延迟降级"""
+    routes = {}
+    for entry in config.split(";"):
+        if entry.strip():
+            task, _, target = entry.partition("=")
+            tier, _, slo = target.partition(":")
+            routes[task.strip()] = (tier.strip(), float(slo) if slo.strip() else None)
+    return routes
+
+
+class _TaskState:
+    def __init__(self, window: int):
+        self.level = 0  # 相对首选档位降了几级
+        self.until = 0.0  # 降级的截止时间
+        self.latencies = deque(maxlen=window)  # 当前档位的近期延迟
+
+
+class ModelRouter:
+    """任务到模型档位的路由
+
+    select(task) 返回本次调用使用的档位，调用结束后由 record 记录延迟；
+    每个档位的调用次数、失败数、token 数和延迟分位数见 snapshot()。
+    """
+
+    def __init__(
+            self,
+            tiers: List[Tuple[str, str]],
+            routes: Dict[str, Tuple[str, Optional[float]]],
+            window: int = 50,
+            min_samples: int = 10,
+            percentile: float = 90,
+            cooldown: float = 60.0,
+            backend_factory: Callable[[str], object] = create_backend,
+            breaker_factory: Callable[[], CircuitBreaker] = CircuitBreaker,
+            clock=time.monotonic
+    ):
+        self.tiers = [name for name, _ in tiers]
+        self.model_names = dict(tiers)
+        for task, (tier, _) in routes.items():
+            if tier not in self.model_names:
+                raise ValueError(f"Task {task} is routed to unknown model tier: {tier}")
+        self.routes = routes
+        self.window = window
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.cooldown = cooldown
+        self.backend_factory = backend_factory
+        self.clock = clock
+        self.usage = UsageMeter()
+        self._backends: Dict[str, object] = {}
+        self._states: Dict[str, _TaskState] = {}
+        self._tier_latencies: Dict[str, deque] = {tier: deque(maxlen=200) for tier in self.tiers}
+        self.breakers: Dict[str, CircuitBreaker] = {tier: breaker_factory() for tier in self.tiers}
+        self.stats: Dict[str, int] = {"downgrades": 0, "recoveries": 0, "breaker_skips": 0}
+
+    def backend(self, tier: str):
+        """档位对应的模型后端（按需创建，各组件共用）"""
+        if tier not in self._backends:
+            self._backends[tier] = self.backend_factory(self.model_names[tier])
+        return self._backends[tier]
+
+    def task_for(self, prompt, default: Optional[str] = None) -> Optional[str]:
+        return TEMPLATE_TASKS.get(getattr(prompt, "template", None), default)
+
+    def _state(self, task: str) -> _TaskState:
+        if task not in self._states:
+            self._states[task] = _TaskState(self.window)
+        return self._states[task]
+
+    def _tier_at(self, task: str, level: int) -> str:
+        primary = self.routes.get(task, (self.tiers[0], None))[0]
+        return self.tiers[min(self.tiers.index(primary) + level, len(self.tiers) - 1)]
+
+    def select(self, task: Optional[str]) -> str:
+        if task not in self.routes:
+            return self._available(self.tiers[0])
+        state = self._state(task)
+        if state.level and self.clock() >= state.until:
+            # 冷却期结束，回到首选档位重新积累延迟样本
+            state.level = 0
+            state.latencies.clear()
+            self.stats["recoveries"] += 1
+        return self._available(self._tier_at(task, state.level))
+
+    def _available(self, tier: str) -> str:
+        """tier 熔断时依次尝试更快、更强的档位；全部熔断时仍返回 tier，由其熔断器拒绝调用"""
+        index = self.tiers.index(tier)
+        for candidate in self.tiers[index:] + self.tiers[:index][::-1]:
+            if self.breakers[candidate].available():
+                if candidate != tier:
+                    self.stats["breaker_skips"] += 1
+                return candidate
+        return tier
+
+    def record(self, task: Optional[str], tier: str, prompt, response, latency: float, failed: bool = False):
+        record_call(tier, prompt, response, latency, failed=failed, meters=(self.usage,))
+        self._tier_latencies[tier].append(latency)
+        if task not in self.routes:
+            return
+        slo = self.routes[task][1]
+        state = self._state(task)
+        # 降级前已发出的调用晚到时不计入新档位的样本
+        if slo is None or tier != self._tier_at(task, state.level):
+            return
+        state.latencies.append(latency)
+        if len(state.latencies) < self.min_samples:
+            return
+        if float(np.percentile(state.latencies, self.percentile)) > slo and self._tier_at(task, state.level + 1) != tier:
+            state.level += 1
+            state.until = self.clock() + self.cooldown
+            state.latencies.clear()
+            self.stats["downgrades"] += 1
+
+    def snapshot(self) -> Dict:
+        tiers = {}
+        for tier in self.tiers:
+            latencies = self._tier_latencies[tier]
+            totals = self.usage.components.get(tier, {})
+            tiers[tier] = {
+                "model": self.model_names[tier],
+                "calls": int(totals.get("calls", 0)),
+                "failures": int(totals.get("failures", 0)),
+                "prompt_tokens": int(totals.get("prompt_tokens", 0)),
+                "completion_tokens": int(totals.get("completion_tokens", 0)),
+                "latency_p50": round(float(np.percentile(latencies, 50)), 3) if latencies else None,
+                "latency_p95": round(float(np.percentile(latencies, 95)), 3) if latencies else None,
+                "circuit": self.breakers[tier].snapshot()
+            }
+        routes = {}
+        for task, (tier, slo) in self.routes.items():
+            state = self._states.get(task)
+            degraded = state is not None and state.level > 0 and self.clock() < state.until
+            routes[task] = {
+                "tier": tier,
+                "slo_seconds": slo,
+                "active_tier": self._tier_at(task, state.level) if degraded else tier,
+                "degraded_for": round(state.until - self.clock(), 1) if degraded else 0
+            }
+        return {"tiers": tiers, "routes": routes, **self.stats}
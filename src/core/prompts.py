@@ -0,0 +1,386 @@
+"""提示模板注册表
+
+每个提示拆成不变的前缀（指令和输出格式）和随请求变化的后缀，注册时预编译：
+前缀原样保存并计算摘要，后缀解析成字面量与占位符片段，渲染时只做拼接。
+同一提示可注册多个版本，按权重分流做 A/B 测试；同一个分流键（如会话 ID）总是落到同一版本。
+渲染结果是 str 的子类，可直接交给模型，同时带有前缀、后缀和模板版本，
+供 LLMClient 复用模型端缓存的前缀，以及调用方记录结果由哪个版本产生。
+"""
+import hashlib
+import json
+import random
+import string
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.config import settings
+
+EXPLANATION_FORMAT = """
+        {
+            "concept": "Name of the concept",
+            "definition": "Clear and concise definition",
+            "key_points": ["List of key points to understand"],
+            "real_world_applications": ["List of practical applications"],
+            "code_examples": ["Relevant code examples if applicable"],
+            "related_concepts": ["List of related topics to explore"],
+            "learning_resources": ["Recommended learning materials"]
+        }
+"""
+
+RELATIONS_FORMAT = """
+        {
+            "prerequisites": ["Concepts you should know before this"],
+            "related_concepts": ["Directly related concepts"],
+            "advanced_topics": ["More advanced concepts that build on this"],
+            "common_misconceptions": ["Frequently misunderstood points"],
+            "practical_applications": ["Where this concept is commonly used"]
+        }
+"""
+
+
+class RenderedPrompt(str):
+    """渲染后的提示文本，附带前缀/后缀和模板版本"""
+
+    def __new__(cls, prefix: str, suffix: str, template: "PromptTemplate"):
+        prompt = super().__new__(cls, prefix + suffix)
+        prompt.prefix = prefix
+        prompt.suffix = suffix
+        prompt.prefix_key = template.prefix_key
+        prompt.template = template.name
+        prompt.version = template.version
+        return prompt
+
+
+@dataclass
+class PromptTemplate:
+    name: str
+    version: str
+    prefix: str
+    suffix: str
+    prefix_key: str = field(init=False)
+    _segments: List[Tuple[str, Optional[str]]] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.prefix_key = hashlib.sha256(self.prefix.encode("utf-8")).hexdigest()
+        self._segments = []
+        for literal, field_name, format_spec, conversion in string.Formatter().parse(self.suffix):
+            if format_spec or conversion or field_name == "":
+                raise ValueError(f"Template {self.name}:{self.version} only supports plain {{name}} placeholders")
+            self._segments.append((literal, field_name))
+
+    @property
+    def fields(self) -> List[str]:
+        return [name for _, name in self._segments if name is not None]
+
+    def render(self, **values) -> RenderedPrompt:
+        missing = [name for name in self.fields if name not in values]
+        if missing:
+            raise KeyError(f"Template {self.name}:{self.version} is missing values for: {', '.join(missing)}")
+        suffix = "".join(
+            literal + (str(values[name]) if name is not None else "")
+            for literal, name in self._segments
+        )
+        return RenderedPrompt(self.prefix, suffix, self)
+
+
+class PromptRegistry:
+    """按名称和版本管理提示模板，并按权重为每次调用选择版本"""
+
+    def __init__(self):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._weights: Dict[str, Dict[str, float]] = {}
+
+    def register(self, template: PromptTemplate, weight: float = None):
+        """注册模板；未指定权重时，某提示的第一个版本获得全部流量，之后的版本默认不分流"""
+        versions = self._templates.setdefault(template.name, {})
+        weights = self._weights.setdefault(template.name, {})
+        if weight is None:
+            weight = weights.get(template.version, 0.0 if versions else 1.0)
+        versions[template.version] = template
+        weights[template.version] = weight
+        return template
+
+    def set_weights(self, name: str, weights: Dict[str, float]):
+        """设置某提示各版本的流量权重，未列出的版本不再分流"""
+        unknown = set(weights) - set(self._templates.get(name, {}))
+        if unknown:
+            raise ValueError(f"Unknown versions for prompt {name}: {', '.join(sorted(unknown))}")
+        if sum(weights.values()) <= 0:
+            raise ValueError(f"Weights for prompt {name} must not all be zero")
+        self._weights[name] = {version: float(weights.get(version, 0.0)) for version in self._templates[name]}
+
+    def configure(self, spec: str):
+        """解析 "name=v1:90,v2:10;other=v2" 格式的权重配置，省略权重时为 1"""
+        for entry in filter(None, (part.strip() for part in spec.split(";"))):
+            name, _, versions = entry.partition("=")
+            weights = {}
+            for item in filter(None, (part.strip() for part in versions.split(","))):
+                version, _, weight = item.partition(":")
+                weights[version.strip()] = float(weight) if weight else 1.0
+            self.set_weights(name.strip(), weights)
+
+    def load_file(self, path: str):
+        """从 JSON 文件加载额外的模板版本：[{"name", "version", "prefix", "suffix", "weight"?}, ...]"""
+        with open(path, encoding="utf-8") as f:
+            entries = json.load(f)
+        for entry in entries:
+            self.register(
+                PromptTemplate(entry["name"], entry["version"], entry["prefix"], entry["suffix"]),
+                weight=entry.get("weight")
+            )
+
+    def get(self, name: str, version: str) -> PromptTemplate:
+        return self._templates[name][version]
+
+    def select(self, name: str, key: str = None) -> PromptTemplate:
+        """按权重选择版本；给定分流键时结果是确定的"""
+        if name not in self._templates:
+            raise KeyError(f"Unknown prompt: {name}")
+        weights = [(version, weight) for version, weight in self._weights[name].items() if weight > 0]
+        total = sum(weight for _, weight in weights)
+        if key is None:
+            point = random.random() * total
+        else:
+            digest = hashlib.sha256(f"{name}:{key}".encode("utf-8")).digest()
+            point = int.from_bytes(digest[:8], "big") / 2 ** 64 * total
+        for version, weight in weights:
+            point -= weight
+            if point < 0:
+                return self._templates[name][version]
+        return self._templates[name][weights[-1][0]]
+
+    def render(self, name: str, key: str = None, **values) -> RenderedPrompt:
+        return self.select(name, key).render(**values)
+
+    def describe(self) -> Dict[str, Dict[str, float]]:
+        """各提示已注册的版本及其流量权重"""
+        return {name: dict(weights) for name, weights in self._weights.items()}
+
+
+registry = PromptRegistry()
+
+registry.register(PromptTemplate(
+    "interview_system", "v1",
+    prefix="""
+        You are an experienced IT technical interviewer. Your task is to:
+        1. Focus on the position level and technologies given below
+        2. Ask technical questions appropriate for this level
+        3. Each question should be specific and clear
+        4. Evaluate the candidate's responses
+        5. Provide constructive feedback
+
+        Format your responses in this structure:
+        {
+            "question": "Your technical question here",
+            "context": "Brief context or background for the question"
+        }
+""",
+    suffix="""
+        Position level: {position_level}
+        Technologies: {technologies}
+        """
+))
+
+registry.register(PromptTemplate(
+    "interview_question", "v1",
+    prefix="""
+        You generate technical interview questions.
+
+        The question should:
+        1. Match the specified difficulty level
+        2. Require practical understanding
+        3. Allow for follow-up discussion
+        4. Test both theoretical knowledge and practical application
+
+        Format the response as:
+        {
+            "question": "The main question",
+            "expected_topics": ["Key points the answer should cover"],
+            "follow_ups": ["Potential follow-up questions"],
+            "evaluation_criteria": ["Criteria for evaluating the answer"]
+        }
+""",
+    suffix="""
+        Generate a {topic} interview question that focuses on {level_description}.
+        Current difficulty level: {difficulty}/2.5
+        {avoid}"""
+))
+
+registry.register(PromptTemplate(
+    "answer_evaluation", "v1",
+    prefix="""
+        Evaluate this answer based on the expected topics and evaluation criteria of the question.
+
+        Provide evaluation in this format:
+        {
+            "score": "Score out of 100",
+            "strength_points": ["Strong points in the answer"],
+            "weakness_points": ["Areas that need improvement"],
+            "missing_topics": ["Expected topics that were not covered"],
+            "clarity_score": "Score out of 100 for communication clarity"
+        }
+""",
+    suffix="""
+        Question: {question}
+        Expected topics: {expected_topics}
+        Evaluation criteria: {evaluation_criteria}
+
+        Answer: {answer}
+        """
+))
+
+registry.register(PromptTemplate(
+    "recommendations", "v1",
+    prefix="""
+        Provide specific, actionable recommendations for improvement based on the weaknesses below.
+        Focus on:
+        1. Learning resources
+        2. Practice exercises
+        3. Project suggestions
+        4. Study strategies
+
+        Format as a list of specific recommendations.
+""",
+    suffix="""
+        Identified weaknesses:
+        {weaknesses}
+        """
+))
+
+registry.register(PromptTemplate(
+    "code_analysis", "v1",
+    prefix="""
+        Analyze the code below.
+
+        Provide analysis in this format:
+        {
+            "complexity": {
+                "time_complexity": "Big O notation with explanation",
+                "space_complexity": "Big O notation with explanation"
+            },
+            "best_practices": [
+                "List of followed best practices",
+                "List of violated best practices"
+            ],
+            "potential_issues": [
+                "List of potential problems or security concerns"
+            ],
+            "suggestions": [
+                "List of specific improvement suggestions"
+            ]
+        }
+""",
+    suffix="""
+        Analyze this {language} code:
+
+        ```{language}
+        {code}
+        ```
+        """
+))
+
+registry.register(PromptTemplate(
+    "code_analysis_batch", "v1",
+    prefix="""
+        Analyze each of the following code snippets independently.
+
+        Return a JSON array with exactly one object per item, in this format:
+        [
+            {
+                "index": "The item number given above",
+                "analysis": {
+                    "complexity": {
+                        "time_complexity": "Big O notation with explanation",
+                        "space_complexity": "Big O notation with explanation"
+                    },
+                    "best_practices": ["Followed and violated best practices"],
+                    "potential_issues": ["Potential problems or security concerns"],
+                    "suggestions": ["Specific improvement suggestions"]
+                }
+            }
+        ]
+""",
+    suffix="""{snippets}
+        """
+))
+
+registry.register(PromptTemplate(
+    "code_explanation", "v1",
+    prefix="""
+        Explain what the code below does for a developer reading it for the first time.
+
+        Provide the explanation in this format:
+        {
+            "summary": "What the code does, in two or three sentences",
+            "walkthrough": ["Explanation of each main part of the code, in order"],
+            "key_concepts": ["Language features, algorithms or patterns the code relies on"]
+        }
+""",
+    suffix="""
+        Explain this {language} code:
+
+        ```{language}
+        {code}
+        ```
+        """
+))
+
+registry.register(PromptTemplate(
+    "explain_concept", "v1",
+    prefix=f"""
+        Explain the technical concept given below at the requested level.
+
+        Provide the explanation in this format:
+        {EXPLANATION_FORMAT}""",
+    suffix="""
+        Explain the technical concept: {concept}
+        Level: {level}
+        """
+))
+
+registry.register(PromptTemplate(
+    "learning_path", "v1",
+    prefix="""
+        Create a learning path for the topic below, from the current level to the target level.
+
+        Format the response as:
+        {
+            "prerequisites": ["Required foundational knowledge"],
+            "learning_stages": [
+                {
+                    "stage": "Stage name",
+                    "topics": ["Topics to cover"],
+                    "resources": ["Recommended resources"],
+                    "projects": ["Practical projects to try"],
+                    "estimated_duration": "Estimated time to complete"
+                }
+            ],
+            "milestones": ["Key checkpoints to validate progress"],
+            "next_steps": ["What to learn after completing this path"]
+        }
+""",
+    suffix="""
+        Create a learning path for:
+        Topic: {topic}
+        Current Level: {current_level}
+        Target Level: {target_level}
+        """
+))
+
+registry.register(PromptTemplate(
+    "concept_relations", "v1",
+    prefix=f"""
+        Analyze the relationships for the concept given below.
+
+        Provide the analysis in this format:
+        {RELATIONS_FORMAT}""",
+    suffix="""
+        Analyze the relationships for the concept: {concept}
+        """
+))
+
+# 额外的模板版本和分流权重可通过配置加载，无需改代码即可开始 A/B 测试
+if settings.PROMPT_TEMPLATE_FILE:
+    registry.load_file(settings.PROMPT_TEMPLATE_FILE)
+if settings.PROMPT_TEMPLATE_WEIGHTS:
+    registry.configure(settings.PROMPT_TEMPLATE_WEIGHTS)
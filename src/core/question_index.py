@@ -0,0 +1,143 @@
+import re
+import zlib
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.database.models import InterviewRecord, Session
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# 增量同步时回看的时间，覆盖时间戳早于水位线但稍后才提交的记录
+_SYNC_OVERLAP = timedelta(seconds=5)
+
+
+def normalize_question(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9+#]+", text.lower()))
+
+
+def lsh_bands(num_perm: int, threshold: float, recall: float = 0.99) -> int:
+    """按相似度阈值选择分段数
+
+    每段 r 行、共 b 段时，相似度为 s 的两个文本成为候选的概率是 1 - (1 - s^r)^b。
+    在 num_perm 的因数中选取每段行数最多（误报候选最少）且相似度恰为阈值时仍有 recall 概率成为候选的分段方式。
+    """
+    best = num_perm
+    for bands in range(num_perm, 0, -1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        if 1 - (1 - threshold ** rows) ** bands < recall:
+            break
+        best = bands
+    return best
+
+
+class MinHashLSH:
+    """MinHash 签名 + 分段 LSH 近似重复检索
+
+    文本按字符 4-gram 切片，num_perm 个哈希函数求最小值得到签名，
+    签名分为 bands 段，任一段完全相同即成为候选，再用签名一致率估计 Jaccard 相似度。
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 4, seed: int = 42):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._a = rng.randint(1, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self.signatures: List[np.ndarray] = []
+
+    def signature(self, text: str) -> np.ndarray:
+        normalized = normalize_question(text)
+        k = self.shingle_size
+        shingles = {normalized[i:i + k] for i in range(max(len(normalized) - k + 1, 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # (a * x + b) mod p，x < 2^32 且 a, b < 2^31，乘积不会溢出 uint64
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def add(self, signature: np.ndarray) -> int:
+        doc_id = len(self.signatures)
+        self.signatures.append(signature)
+        for band, key in enumerate(self._band_keys(signature)):
+            self._buckets[band][key].append(doc_id)
+        return doc_id
+
+    def candidates(self, signature: np.ndarray) -> Set[int]:
+        found = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            found.update(self._buckets[band].get(key, ()))
+        return found
+
+    def similarity(self, signature: np.ndarray, doc_id: int) -> float:
+        return float(np.mean(self.signatures[doc_id] == signature))
+
+
+class QuestionHistory:
+    """候选人历史问题索引，用于在出题时检测重复或近似重复的问题
+
+    首次同步时从 interview_records 构建，之后每次出题前只读取上次同步之后的新记录，
+    多 worker 部署时其他进程写入的面试记录也能被看到。
+    """
+
+    def __init__(self, threshold: float = 0.5):
+        self.threshold = threshold
+        num_perm = 64
+        self.lsh = MinHashLSH(num_perm=num_perm, bands=lsh_bands(num_perm, threshold))
+        self._owners: List[str] = []
+        self._texts: List[str] = []
+        self._seen: Set[Tuple[str, str]] = set()
+        self._synced_until = None
+
+    def sync(self, db_session):
+        query = (
+            db_session.query(Session.candidate_id, InterviewRecord.question, InterviewRecord.timestamp)
+            .join(InterviewRecord, InterviewRecord.session_id == Session.id)
+        )
+        if self._synced_until is not None:
+            # 回看窗口内的记录会被重复读到，由 add() 去重
+            query = query.filter(InterviewRecord.timestamp >= self._synced_until - _SYNC_OVERLAP)
+
+        latest = self._synced_until
+        for candidate_id, question, timestamp in query.yield_per(1000):
+            if candidate_id and question:
+                self.add(candidate_id, question)
+            if timestamp is not None and (latest is None or timestamp > latest):
+                latest = timestamp
+        self._synced_until = latest
+
+    def add(self, candidate_id: str, question: str):
+        key = (candidate_id, normalize_question(question))
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self.lsh.add(self.lsh.signature(question))
+        self._owners.append(candidate_id)
+        self._texts.append(question)
+
+    def find_duplicate(self, candidate_id: str, question: str) -> Optional[Tuple[str, float]]:
+        """返回该候选人被问过的最相似问题及估计相似度，没有超过阈值的则返回 None"""
+        signature = self.lsh.signature(question)
+        best = None
+        for doc_id in self.lsh.candidates(signature):
+            if self._owners[doc_id] != candidate_id:
+                continue
+            similarity = self.lsh.similarity(signature, doc_id)
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (self._texts[doc_id], similarity)
+        return best
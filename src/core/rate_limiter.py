@@ -0,0 +1,103 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+
+class SlidingWindowLimiter:
+    """按客户端的滑动窗口限流
+
+    用滑动窗口计数近似滑动日志：当前固定窗口的计数加上前一窗口计数乘以其仍落在滑动窗口内的比例，
+    每个客户端只保存两个计数，内存与请求量无关；客户端数超过 max_clients 时淘汰最久未访问的。
+    每次请求按 cost 计数，调用 LLM 的请求可以比普通请求消耗更多配额。
+    """
+
+    def __init__(self, limit: float, window: float, max_clients: int = 100000, clock=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.max_clients = max_clients
+        self.clock = clock
+        self._counters: "OrderedDict[str, List[float]]" = OrderedDict()  # key -> [窗口序号, 当前计数, 前一窗口计数]
+        self.stats: Dict[str, int] = {"allowed": 0, "limited": 0}
+
+    def _counter(self, key: str, index: int) -> List[float]:
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters[key] = [index, 0.0, 0.0]
+            while len(self._counters) > self.max_clients:
+                self._counters.popitem(last=False)
+        else:
+            self._counters.move_to_end(key)
+            if counter[0] != index:
+                counter[2] = counter[1] if counter[0] == index - 1 else 0.0
+                counter[0], counter[1] = index, 0.0
+        return counter
+
+    def acquire(self, key: str, cost: float = 1.0) -> float:
+        """配额足够时计入本次请求并返回 0，否则不计入并返回需要等待的秒数"""
+        cost = min(cost, self.limit)
+        now = self.clock()
+        index = int(now // self.window)
+        counter = self._counter(key, index)
+        _, current, previous = counter
+        elapsed = now / self.window - index  # 当前固定窗口已经过去的比例
+        if previous * (1 - elapsed) + current + cost <= self.limit:
+            counter[1] += cost
+            self.stats["allowed"] += 1
+            return 0.0
+
+        self.stats["limited"] += 1
+        if current + cost > self.limit:
+            # 本窗口内已无法容纳，等到下一窗口中本窗口计数的剩余权重降到足够低
+            needed = 1 - (self.limit - cost) / current
+            return (1 - elapsed + needed) * self.window
+        needed = 1 - (self.limit - cost - current) / previous
+        return max(needed - elapsed, 0.0) * self.window
+
+
+class AdmissionController:
+    """全局准入控制：调用 LLM 的请求过多时直接拒绝，而不是排队等待让所有请求的延迟一起上升
+
+    同时限制已准入、仍在处理中的 LLM 请求数，以及所有来源（含后台任务）进行中的 LLM 调用数；
+    建议的重试时间取近期 LLM 调用的平均耗时。
+    """
+
+    def __init__(
+            self,
+            max_requests: int,
+            max_llm_calls: int,
+            llm_calls_in_flight: Callable[[], int],
+            llm_latency: Callable[[], float]
+    ):
+        self.max_requests = max_requests
+        self.max_llm_calls = max_llm_calls
+        self.llm_calls_in_flight = llm_calls_in_flight
+        self.llm_latency = llm_latency
+        self.in_flight = 0
+        self.stats: Dict[str, int] = {"admitted": 0, "rejected": 0}
+
+    def try_admit(self) -> Optional[float]:
+        """准入时计入进行中的请求并返回 None，否则返回建议的重试秒数；准入后必须调用 release"""
+        if self.in_flight >= self.max_requests or self.llm_calls_in_flight() >= self.max_llm_calls:
+            self.stats["rejected"] += 1
+            return max(self.llm_latency(), 1.0)
+        self.in_flight += 1
+        self.stats["admitted"] += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "max_requests": self.max_requests,
+            "llm_calls_in_flight": self.llm_calls_in_flight(),
+            "max_llm_calls": self.max_llm_calls
+        }
+
+
+def retry_after_header(seconds: float) -> str:
+    """Retry-After 只接受整数秒，向上取整"""
+    return str(max(int(math.ceil(seconds)), 1))
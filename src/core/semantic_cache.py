@@ -0,0 +1,283 @@
+import re
+import zlib
+from array import array
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.database.models import ConceptExplanation
+
+_STOPWORDS = {
+    "a", "an", "the", "in", "of", "on", "for", "to", "and", "or", "is", "are",
+    "what", "how", "does", "do", "explain", "about", "with", "concept"
+}
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9+#]+")
+_GLOSS_PATTERN = re.compile(r"\(([^()]*)\)")
+
+
+@lru_cache(maxsize=1 << 17)
+def _word_buckets(word: str, dim: int) -> Tuple[int, ...]:
+    """单词特征（整词权重为2，外加带边界标记的字符三元组）对应的哈希桶"""
+    buckets = [zlib.crc32(("w:" + word).encode()) % dim] * 2
+    padded = f"#{word}#"
+    buckets.extend(zlib.crc32(("c:" + padded[i:i + 3]).encode()) % dim for i in range(len(padded) - 2))
+    return tuple(buckets)
+
+
+def featurize(text: str, dim: int) -> Dict[int, float]:
+    """将文本转换为 L2 归一化的哈希稀疏向量（词 + 字符三元组）"""
+    vector = Counter()
+    for word in _content_words(text):
+        vector.update(_word_buckets(word, dim))
+
+    norm = sum(v * v for v in vector.values()) ** 0.5
+    return {bucket: value / norm for bucket, value in vector.items()} if norm else {}
+
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in _TOKEN_PATTERN.findall(text.lower()) if w not in _STOPWORDS]
+
+
+def _initials(text: str) -> str:
+    return "".join(w[0] for w in _content_words(text))
+
+
+def split_acronym_gloss(text: str) -> Tuple[str, Optional[str]]:
+    """拆出 "Global Interpreter Lock (GIL)" 这类括号中的首字母缩写注释，返回 (去掉注释的文本, 缩写)"""
+    for match in _GLOSS_PATTERN.finditer(text):
+        inner = _content_words(match.group(1))
+        rest = text[:match.start()] + text[match.end():]
+        if len(inner) == 1 and len(inner[0]) >= 2 and inner[0] == _initials(rest):
+            return rest, inner[0]
+    return text, None
+
+
+def acronym_of(text: str) -> Optional[Tuple[str, str]]:
+    """短语给出或隐含的首字母缩写，返回 (缩写, 以空格连接的全称实义词)
+
+    括号注释总是采用；没有注释时只采用三个及以上实义词的首字母，两个词的首字母太容易与普通单词冲突。
+    """
+    rest, acronym = split_acronym_gloss(text)
+    words = _content_words(rest)
+    if acronym is None and len(words) >= 3:
+        acronym = "".join(w[0] for w in words)
+    return (acronym, " ".join(words)) if acronym else None
+
+
+def expand_acronyms(text: str, acronyms: Dict[str, str]) -> str:
+    """去掉冗余的缩写注释并把已知缩写展开为全称，使缩写与全称落在同一组特征上"""
+    rest, _ = split_acronym_gloss(text)
+    return " ".join(acronyms.get(word, word) for word in _content_words(rest))
+
+
+def concept_terms(text: str) -> Set[str]:
+    """概念名中的实义词（去掉停用词，复数去掉词尾 s）"""
+    return {
+        word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+        for word in _TOKEN_PATTERN.findall(text.lower()) if word not in _STOPWORDS
+    }
+
+
+def same_concept(a: str, b: str) -> bool:
+    """两个概念名在词级别是否指同一概念：实义词集合相同，或一方是另一方的首字母缩写
+
+    字符级相似度会把共享修饰词的不同概念（如 "Python decorators" 与 "Python generators"）判为相近，
+    单纯的包含关系也会把 "binary search" 与 "binary search tree" 这类更具体的概念判为相同，
+    这里要求区分概念的词完全一致（括号中的缩写注释不计入）。
+    """
+    a, b = split_acronym_gloss(a)[0], split_acronym_gloss(b)[0]
+    terms_a, terms_b = concept_terms(a), concept_terms(b)
+    if not terms_a or not terms_b:
+        return False
+    if terms_a == terms_b:
+        return True
+    return (len(terms_a) == 1 and len(terms_b) >= 2 and next(iter(terms_a)) == _initials(b)) or \
+        (len(terms_b) == 1 and len(terms_a) >= 2 and next(iter(terms_b)) == _initials(a))
+
+
+class _VectorIndex:
+    """稀疏向量倒排索引：先用较少见的特征召回候选，再对候选精确计算余弦相似度"""
+
+    def __init__(self, max_df_ratio: float, candidates: int = 8):
+        self.max_df_ratio = max_df_ratio
+        self.candidates = candidates
+        self.postings: Dict[int, Tuple[array, array]] = {}
+        self.vectors: List[Dict[int, float]] = []
+        self.owners: List[int] = []
+
+    def add(self, vector: Dict[int, float], owner: int):
+        vector_id = len(self.vectors)
+        self.vectors.append(vector)
+        self.owners.append(owner)
+        for bucket, weight in vector.items():
+            posting = self.postings.get(bucket)
+            if posting is None:
+                posting = self.postings[bucket] = (array("i"), array("f"))
+            posting[0].append(vector_id)
+            posting[1].append(weight)
+
+    def search(self, vector: Dict[int, float]) -> Optional[Tuple[int, float]]:
+        size = len(self.vectors)
+        if not size or not vector:
+            return None
+
+        # 过于常见的特征对区分度贡献很小，召回阶段跳过以控制扫描量
+        df_limit = max(64, int(size * self.max_df_ratio))
+        id_parts, weight_parts = [], []
+        for bucket, query_weight in vector.items():
+            posting = self.postings.get(bucket)
+            if posting is None or len(posting[0]) > df_limit:
+                continue
+            id_parts.append(np.frombuffer(posting[0], dtype=np.int32))
+            weight_parts.append(np.frombuffer(posting[1], dtype=np.float32) * query_weight)
+        if not id_parts:
+            return None
+
+        # 只在命中的向量上累加点积，开销与倒排命中数成正比而与索引规模无关
+        hit_ids, inverse = np.unique(np.concatenate(id_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weight_parts))
+        if len(scores) > self.candidates:
+            top = np.argpartition(scores, -self.candidates)[-self.candidates:]
+        else:
+            top = np.arange(len(scores))
+        candidate_ids = hit_ids[top]
+
+        best_id, best_score = -1, 0.0
+        for vector_id in candidate_ids:
+            stored = self.vectors[int(vector_id)]
+            score = sum(weight * stored.get(bucket, 0.0) for bucket, weight in vector.items())
+            if score > best_score:
+                best_id, best_score = int(vector_id), score
+        if best_id < 0:
+            return None
+        return self.owners[best_id], best_score
+
+
+class SemanticCache:
+    """概念解释的近似重复缓存
+
+    每条缓存的解释以原始查询和模型返回的规范概念名两个别名建立索引，
+    新查询与任一别名的余弦相似度超过阈值即直接复用。解释内容持久化在
+    concept_explanations 表中，索引在首次使用时从表中重建，之后增量更新。
+
+    首字母缩写与全称的字符特征几乎不重叠，因此向量化前先展开缩写：缩写表从已索引的别名中学习
+    （括号注释、三个及以上实义词的首字母、同一条目中互为缩写的查询与概念名），
+    查询自身给出的缩写则用于展开那些索引时还不认识该缩写的别名。
+    """
+
+    def __init__(self, threshold: float = 0.8, dim: int = 2 ** 20, max_df_ratio: float = 0.01):
+        self.threshold = threshold
+        self.dim = dim
+        self.max_df_ratio = max_df_ratio
+        self.entries: List[Dict] = []
+        self._indexes: Dict[str, _VectorIndex] = {}
+        self._acronyms: Dict[str, str] = {}
+        # 尚未学到全称的短词 -> 含有该词的条目，学到全称后用展开后的别名补充索引
+        self._unexpanded: Dict[str, array] = {}
+        self._loaded = False
+
+    def _aliases(self, owner: int) -> Set[str]:
+        entry = self.entries[owner]
+        aliases = {entry["query"]}
+        if isinstance(entry["content"].get("concept"), str):
+            aliases.add(entry["content"]["concept"])
+        return aliases
+
+    def _learn_acronym(self, acronym: str, expansion: str):
+        if acronym in self._acronyms or acronym == expansion:
+            return
+        self._acronyms[acronym] = expansion
+        owners = self._unexpanded.pop(acronym, None)
+        for owner in sorted(set(owners or ())):
+            index = self._indexes[self.entries[owner]["level"]]
+            for alias in self._aliases(owner):
+                if acronym in _content_words(alias):
+                    index.add(featurize(expand_acronyms(alias, self._acronyms), self.dim), owner)
+
+    def _index_entry(self, query: str, level: str, content: Dict):
+        owner = len(self.entries)
+        self.entries.append({"query": query, "level": level, "content": content})
+
+        index = self._indexes.get(level)
+        if index is None:
+            index = self._indexes[level] = _VectorIndex(self.max_df_ratio)
+        aliases = self._aliases(owner)
+        for alias in aliases:
+            learned = acronym_of(alias)
+            if learned is not None:
+                self._learn_acronym(*learned)
+            # 查询 "ML" 的规范概念名是 "Machine Learning" 时，两词的首字母也可以采信
+            words = _content_words(alias)
+            for other in aliases - {alias}:
+                if len(words) == 1 and len(_content_words(other)) >= 2 and words[0] == _initials(other):
+                    self._learn_acronym(words[0], " ".join(_content_words(other)))
+
+        for alias in aliases:
+            index.add(featurize(expand_acronyms(alias, self._acronyms), self.dim), owner)
+            for word in _content_words(alias):
+                if 2 <= len(word) <= 6 and word.isalpha() and word not in self._acronyms:
+                    self._unexpanded.setdefault(word, array("i")).append(owner)
+
+    def load(self, db_session):
+        """从数据库重建索引（只在进程内首次使用时执行）"""
+        if self._loaded:
+            return
+        for row in db_session.query(ConceptExplanation).order_by(ConceptExplanation.id).yield_per(1000):
+            self._index_entry(row.query, row.level, row.content)
+        self._loaded = True
+
+    def lookup(
+            self,
+            db_session,
+            query: str,
+            level: Optional[str],
+            threshold: float = None
+    ) -> Optional[Tuple[Dict, float]]:
+        """查找最相近的已缓存解释，未达到阈值时返回 None
+
+        level 为 None 时在所有难度级别中查找；threshold 默认使用缓存命中阈值。
+        """
+        self.load(db_session)
+        threshold = self.threshold if threshold is None else threshold
+        indexes = list(self._indexes.values()) if level is None else [self._indexes.get(level)]
+        acronyms = self._acronyms
+        defined = acronym_of(query)
+        if defined is not None and defined[0] not in acronyms:
+            acronyms = {**acronyms, defined[0]: defined[1]}
+        vector = featurize(expand_acronyms(query, acronyms), self.dim)
+
+        best = None
+        for index in indexes:
+            match = index.search(vector) if index is not None else None
+            if match is not None and (best is None or match[1] > best[1]):
+                best = match
+
+        # 查询给出了索引尚不认识的缩写（如查询 "global interpreter lock"，缓存中只有 "GIL"）：
+        # 按查询提供的全称展开含该缩写的别名后逐一计算相似度
+        if acronyms is not self._acronyms:
+            for owner in set(self._unexpanded.get(defined[0], ())):
+                if level is not None and self.entries[owner]["level"] != level:
+                    continue
+                for alias in self._aliases(owner):
+                    stored = featurize(expand_acronyms(alias, acronyms), self.dim)
+                    score = sum(weight * stored.get(bucket, 0.0) for bucket, weight in vector.items())
+                    if best is None or score > best[1]:
+                        best = (owner, score)
+
+        if best is None or best[1] < threshold:
+            return None
+        owner, similarity = best
+        return self.entries[owner], similarity
+
+    def add(self, db_session, query: str, level: str, content: Dict, template_version: str = None):
+        """持久化新的解释并加入索引"""
+        self.load(db_session)
+        db_session.add(ConceptExplanation(
+            query=query, level=level, content=content, template_version=template_version
+        ))
+        db_session.commit()
+        self._index_entry(query, level, content)
@@ -0,0 +1,283 @@
+"""面试、代码分析和技术讲解的共享服务层
+
+FastAPI 路由和进程内挂载的 Gradio 界面都通过这里调用核心组件，
+两种入口共用同一组 InterviewEngine / CodeAnalyzer / TechExplainer 实例。
+"""
+import asyncio
+import json
+import uuid
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import text
+
+from src.config import settings
+from src.core.analytics import CohortAnalytics
+from src.core.interview_engine import InterviewEngine
+from src.core.code_analyzer import CodeAnalyzer
+from src.core.circuit_breaker import CircuitOpenError
+from src.core.job_queue import JobQueue
+from src.core.llm_client import LLMTimeoutError, llm_load, model_router
+from src.core.rate_limiter import AdmissionController, SlidingWindowLimiter
+from src.core.session_store import SessionConflictError
+from src.core.tech_explainer import TechExplainer
+from src.core.usage import UsageMeter, track_usage
+from src.database.models import Candidate, InterviewRecord, Session as DBSession
+from src.database.session import session_scope
+
+interview_engine = InterviewEngine()
+code_analyzer = CodeAnalyzer()
+tech_explainer = TechExplainer()
+analytics = CohortAnalytics(
+    pass_score=settings.ANALYTICS_PASS_SCORE,
+    chunk_size=settings.ANALYTICS_CHUNK_SIZE,
+    refresh_interval=settings.ANALYTICS_REFRESH_INTERVAL
+)
+job_queue = JobQueue(
+    workers=settings.JOB_WORKERS,
+    max_retries=settings.JOB_MAX_RETRIES,
+    retry_backoff=settings.JOB_RETRY_BACKOFF,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+    callback_retries=settings.JOB_CALLBACK_RETRIES
+)
+
+# 入站限流和 LLM 请求准入控制，由 RateLimitMiddleware 使用
+client_limiter = SlidingWindowLimiter(
+    limit=settings.RATE_LIMIT_REQUESTS,
+    window=settings.RATE_LIMIT_WINDOW
+)
+admission = AdmissionController(
+    max_requests=settings.ADMISSION_MAX_LLM_REQUESTS,
+    max_llm_calls=settings.ADMISSION_MAX_LLM_CALLS,
+    llm_calls_in_flight=lambda: llm_load.in_flight,
+    llm_latency=lambda: llm_load.average_latency
+)
+
+
+class ServiceError(Exception):
+    """服务层错误，携带对应的 HTTP 状态码"""
+
+    def __init__(self, detail: str, status_code: int = 400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def create_candidate(data: Dict, db_session) -> Dict:
+    """创建新的候选人档案"""
+    try:
+        new_candidate = Candidate(
+            id=str(uuid.uuid4()),
+            name=data["name"],
+            years_of_experience=data["years_of_experience"],
+            skills=data["skills"],
+            education=data["education"],
+            current_level=data["current_level"]
+        )
+        db_session.add(new_candidate)
+        db_session.commit()
+        return {"candidate_id": new_candidate.id}
+    except KeyError as e:
+        db_session.rollback()
+        raise ServiceError(f"Missing field: {e.args[0]}", status_code=400)
+    except Exception:
+        db_session.rollback()
+        raise
+
+
+async def start_interview(data: Dict, db_session) -> Dict:
+    """开始新的面试会话"""
+    if not data.get("candidate_id"):
+        raise ServiceError("candidate_id is required", status_code=400)
+
+    try:
+        result = await interview_engine.start_interview(
+            candidate_id=data["candidate_id"],
+            position_level=data.get("position_level", "junior"),
+            technologies=data.get("technologies", ["Python"]),
+            db_session=db_session
+        )
+    except ValueError as e:
+        raise ServiceError(str(e), status_code=404)
+    except LLMTimeoutError as e:
+        raise ServiceError(str(e), status_code=504)
+    except CircuitOpenError as e:
+        raise ServiceError(f"{e}; no cached question available", status_code=503)
+
+    # 验证返回结果包含所有必需字段
+    required_fields = ["session_id", "question", "difficulty_level", "session_context"]
+    missing_fields = [field for field in required_fields if field not in result]
+    if missing_fields:
+        raise ServiceError(
+            f"Missing required fields in response: {', '.join(missing_fields)}",
+            status_code=500
+        )
+
+    _store_usage(db_session, result["session_id"], result.get("usage"))
+    db_session.commit()
+    return result
+
+
+def _store_usage(db_session, session_id: str, usage: Dict):
+    """把会话累计的 LLM 用量写入 performance_metrics（JSON 列需整体重新赋值才会更新）"""
+    session = db_session.get(DBSession, session_id)
+    if session is not None and usage is not None:
+        session.performance_metrics = {**(session.performance_metrics or {}), "llm_usage": usage}
+
+
+def _score_value(evaluation: Dict):
+    try:
+        return float(evaluation["score"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def process_answer(session_id: str, answer: str, db_session, on_evaluation=None) -> Dict:
+    """处理答案并记录本轮问答；on_evaluation 见 InterviewEngine.process_answer"""
+    record_id = str(uuid.uuid4())
+
+    def update_feedback(evaluation: Dict):
+        # 后台 LLM 评估完成后用最终评估覆盖初步评估
+        with session_scope() as db:
+            stored = db.get(InterviewRecord, record_id)
+            if stored is not None:
+                stored.feedback = json.dumps(evaluation, ensure_ascii=False)
+                stored.score = _score_value(evaluation)
+                stored.template_version = evaluation.get("template_version")
+                db.commit()
+
+    try:
+        result = await interview_engine.process_answer(
+            session_id=session_id,
+            answer=answer,
+            db_session=db_session,
+            on_refined=update_feedback,
+            on_evaluation=on_evaluation
+        )
+    except ValueError as e:
+        raise ServiceError(str(e), status_code=404)
+    except SessionConflictError as e:
+        raise ServiceError(str(e), status_code=409)
+    except LLMTimeoutError as e:
+        raise ServiceError(str(e), status_code=504)
+    except CircuitOpenError as e:
+        raise ServiceError(f"{e}; no cached question available", status_code=503)
+
+    # 后台评估在下一次 await 之后才会写回，此处写入的是初步评估
+    answered = result["session_context"][result["evaluation_turn"] - 1]
+    record = InterviewRecord(
+        id=record_id,
+        session_id=session_id,
+        question=answered["content"],
+        answer=answer,
+        feedback=json.dumps(result["evaluation"], ensure_ascii=False),
+        score=_score_value(result["evaluation"]),
+        difficulty=answered["metadata"].get("difficulty"),
+        template_version=result["evaluation"].get("template_version")
+    )
+    db_session.add(record)
+    _store_usage(db_session, session_id, result.get("usage"))
+    db_session.commit()
+
+    return result
+
+
+async def end_interview(session_id: str, db_session) -> Dict:
+    """结束面试并更新会话状态"""
+    session = db_session.query(DBSession).filter(DBSession.id == session_id).first()
+    if not session:
+        raise ServiceError("Session not found", status_code=404)
+
+    try:
+        result = await interview_engine.end_interview(session_id, db_session, include_recommendations=False)
+    except ValueError as e:
+        raise ServiceError(str(e), status_code=404)
+
+    session.end_time = datetime.utcnow()
+    session.performance_score = float(result["overall_score"])
+    _store_usage(db_session, session_id, result.get("usage"))
+    db_session.commit()
+
+    # 改进建议需要一次完整的 LLM 调用，交给后台任务生成
+    result["recommendations_job_id"] = job_queue.enqueue(
+        "recommendations",
+        {"session_id": session_id, "weaknesses": result["areas_for_improvement"]},
+        db_session
+    )
+    return result
+
+
+def health(db_session) -> Dict:
+    """服务健康状态：各模型档位的熔断器状态、各组件 LLM 调用统计和数据库连通性"""
+    try:
+        db_session.execute(text("SELECT 1"))
+        database = "ok"
+    except Exception as e:
+        database = f"error: {e}"
+
+    circuits = {tier: breaker.snapshot() for tier, breaker in model_router.breakers.items()}
+    closed = all(circuit["state"] == "closed" for circuit in circuits.values())
+    return {
+        "status": "ok" if closed and database == "ok" else "degraded",
+        "llm_circuit": circuits,
+        "llm_calls": {
+            "interview": interview_engine.model.stats,
+            "code_analysis": code_analyzer.model.stats,
+            "explainer": tech_explainer.model.stats
+        },
+        "llm_routing": model_router.snapshot(),
+        "admission": admission.snapshot(),
+        "rate_limit": client_limiter.stats,
+        "database": database
+    }
+
+
+@job_queue.register("recommendations")
+async def _recommendations_job(payload: Dict):
+    usage = UsageMeter()
+    with track_usage(usage):
+        recommendations = await interview_engine._generate_recommendations(
+            payload["weaknesses"], raise_errors=True
+        )
+    with session_scope() as db:
+        session = db.get(DBSession, payload["session_id"])
+        if session is not None:
+            metrics = session.performance_metrics or {}
+            session.performance_metrics = {
+                **metrics,
+                "recommendations": recommendations,
+                # 报告生成也计入该场面试的用量
+                "llm_usage": UsageMeter.from_dict(metrics.get("llm_usage")).merge(usage).to_dict()
+            }
+            db.commit()
+    return recommendations
+
+
+@job_queue.register("irt_calibration")
+async def _irt_calibration_job(payload: Dict):
+    # 拟合是 CPU 密集的批量计算，放到线程中执行，不阻塞事件循环
+    def fit():
+        with session_scope() as db:
+            return interview_engine.irt.fit(db)
+    return await asyncio.to_thread(fit)
+
+
+@job_queue.register("code_batch")
+async def _code_batch_job(payload: Dict):
+    results = [
+        result async for result in code_analyzer.analyze_batch(
+            payload["items"], payload.get("max_concurrency")
+        )
+    ]
+    return sorted(results, key=lambda result: result["index"])
+
+
+@job_queue.register("learning_path")
+async def _learning_path_job(payload: Dict):
+    with session_scope() as db:
+        return await tech_explainer.create_learning_path(
+            payload["topic"],
+            payload["current_level"],
+            payload["target_level"],
+            db_session=db
+        )
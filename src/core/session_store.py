@@ -0,0 +1,160 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+
+class SessionConflictError(Exception):
+    """会话状态在读取之后被其他请求修改（乐观锁版本不一致）"""
+
+
+class SessionStore(ABC):
+    """面试会话状态存储接口
+
+    状态以 JSON 可序列化的字典保存，每次写入版本号加一。
+    save() 需要传入读取时的版本号，版本不一致时抛出 SessionConflictError，
+    从而保证同一会话的并发回合只有一个能提交。
+    未正常结束的会话由 purge_expired() 按最后写入时间清理。
+    """
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Tuple[Dict, int]]:
+        ...
+
+    @abstractmethod
+    def save(self, session_id: str, state: Dict, expected_version: Optional[int]) -> int:
+        """写入状态并返回新版本号；expected_version 为 None 表示新建会话"""
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def purge_expired(self, max_idle_seconds: float) -> List[str]:
+        """删除超过 max_idle_seconds 未写入的会话，返回被删除的会话 ID"""
+
+
+class InMemorySessionStore(SessionStore):
+    """单进程内存存储（默认），适用于单 worker 部署"""
+
+    def __init__(self, clock=time.monotonic):
+        self._states: Dict[str, Tuple[str, int, float]] = {}  # 会话 ID -> (状态 JSON, 版本号, 写入时间)
+        self._lock = threading.Lock()
+        self.clock = clock
+
+    def load(self, session_id: str) -> Optional[Tuple[Dict, int]]:
+        with self._lock:
+            stored = self._states.get(session_id)
+        if stored is None:
+            return None
+        # 与共享存储保持一致：返回的是独立副本
+        return json.loads(stored[0]), stored[1]
+
+    def save(self, session_id: str, state: Dict, expected_version: Optional[int]) -> int:
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            current = self._states.get(session_id)
+            current_version = current[1] if current else None
+            if current_version != expected_version:
+                raise SessionConflictError(f"Session {session_id} was modified concurrently")
+            version = (current_version or 0) + 1
+            self._states[session_id] = (data, version, self.clock())
+        return version
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._states.pop(session_id, None)
+
+    def purge_expired(self, max_idle_seconds: float) -> List[str]:
+        deadline = self.clock() - max_idle_seconds
+        with self._lock:
+            expired = [session_id for session_id, stored in self._states.items() if stored[2] < deadline]
+            for session_id in expired:
+                del self._states[session_id]
+        return expired
+
+
+class SQLiteSessionStore(SessionStore):
+    """基于 SQLite WAL 模式的共享存储，同一台机器上的多个 worker 进程共用"""
+
+    def __init__(self, path: str, busy_timeout_ms: int = 5000):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS session_state (
+                    session_id TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+
+    def load(self, session_id: str) -> Optional[Tuple[Dict, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version FROM session_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def save(self, session_id: str, state: Dict, expected_version: Optional[int]) -> int:
+        data = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            if expected_version is None:
+                try:
+                    self._conn.execute(
+                        "INSERT INTO session_state (session_id, version, data) VALUES (?, 1, ?)",
+                        (session_id, data)
+                    )
+                except sqlite3.IntegrityError:
+                    raise SessionConflictError(f"Session {session_id} already exists")
+                return 1
+
+            cursor = self._conn.execute(
+                """
+                UPDATE session_state
+                SET data = ?, version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE session_id = ? AND version = ?
+                """,
+                (data, session_id, expected_version)
+            )
+            if cursor.rowcount == 0:
+                raise SessionConflictError(f"Session {session_id} was modified concurrently")
+            return expected_version + 1
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM session_state WHERE session_id = ?", (session_id,))
+
+    def purge_expired(self, max_idle_seconds: float) -> List[str]:
+        cutoff = f"-{int(max_idle_seconds)} seconds"
+        with self._lock:
+            # 查询与删除之间持有写锁，其他 worker 不会在此期间更新被删除的会话
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                expired = [row[0] for row in self._conn.execute(
+                    "SELECT session_id FROM session_state WHERE updated_at < datetime('now', ?)", (cutoff,)
+                )]
+                self._conn.execute("DELETE FROM session_state WHERE updated_at < datetime('now', ?)", (cutoff,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return expired
+
+
+def create_session_store(backend: str, path: str) -> SessionStore:
+    if backend == "sqlite":
+        return SQLiteSessionStore(path)
+    if backend == "memory":
+        return InMemorySessionStore()
+    raise ValueError(f"Unknown session store backend: {backend}")
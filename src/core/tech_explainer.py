@@ -1,69 +1,133 @@
+import asyncio
+
 import google.generativeai as genai
 from typing import Dict, List
 from src.config import settings
-
+from src.core.llm_client import LLMClient
+from src.core.concept_graph import ConceptGraph, normalize_concept
+from src.core.micro_batcher import MicroBatcher
+from src.core.prompts import EXPLANATION_FORMAT, RELATIONS_FORMAT, RenderedPrompt, registry as prompt_registry
+from src.core.semantic_cache import SemanticCache, same_concept
+from src.core.utils import parse_json_response
 
 class TechExplainer:
     def __init__(self):
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-pro')
-
-    async def explain_concept(self, concept: str, level: str = "intermediate") -> Dict:
-        """深入解释技术概念"""
-        prompt = f"""
-        Explain the technical concept: {concept}
-        Level: {level}
-
-        Provide the explanation in this format:
-        {{
-            "concept": "Name of the concept",
-            "definition": "Clear and concise definition",
-            "key_points": ["List of key points to understand"],
-            "real_world_applications": ["List of practical applications"],
-            "code_examples": ["Relevant code examples if applicable"],
-            "related_concepts": ["List of related topics to explore"],
-            "learning_resources": ["Recommended learning materials"]
-        }}
-        """
+        self.model = LLMClient(component="explainer", task="explanation")
+        # 可选：合并短时间内到达的小请求
+        self.batcher = MicroBatcher(
+            self.model,
+            window_ms=settings.LLM_MICRO_BATCH_WINDOW_MS,
+            max_batch_size=settings.LLM_MICRO_BATCH_MAX_SIZE
+        ) if settings.LLM_MICRO_BATCH else None
+        self.concept_graph = ConceptGraph()
+        self.semantic_cache = SemanticCache(
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD
+        ) if settings.SEMANTIC_CACHE_ENABLED else None
+
+    async def _generate(self, batch_key: str, request: str, instructions: str, single_prompt: RenderedPrompt):
+        """生成并解析JSON结果，开启微批处理时经由批处理器发送（不同模板版本不合并）"""
+        if self.batcher:
+            batch_key = f"{batch_key}:{single_prompt.version}"
+            return await self.batcher.submit(batch_key, instructions, request, single_prompt)
+        response = await self.model.generate_content_async(single_prompt)
+        return parse_json_response(response.text)
+
+    async def explain_concept(self, concept: str, level: str = "intermediate", db_session=None) -> Dict:
+        """深入解释技术概念，语义相近的查询直接复用已缓存的解释"""
+        use_cache = self.semantic_cache is not None and db_session is not None
+        if use_cache:
+            cached = self.semantic_cache.lookup(db_session, concept, level)
+            if cached is not None:
+                entry, similarity = cached
+                return {
+                    **entry["content"],
+                    "cache_hit": {"query": entry["query"], "similarity": round(similarity, 3)}
+                }
+
+        request = f"Explain the technical concept: {concept} (Level: {level})"
+        prompt = prompt_registry.render("explain_concept", key=concept, concept=concept, level=level)
 
         try:
-            response = await self.model.generate_content_async(prompt)
-            return response.text
+            explanation = await self._generate("explain_concept", request, EXPLANATION_FORMAT, prompt)
         except Exception as e:
             print(f"Error in explain_concept: {e}")
+            degraded = self._degraded_explanation(concept, level, db_session)
+            if degraded is not None:
+                return degraded
             return {
                 "error": "Failed to generate explanation",
                 "message": str(e)
             }
 
-    async def create_learning_path(self, topic: str, current_level: str, target_level: str) -> Dict:
-        """创建学习路径建议"""
-        prompt = f"""
-        Create a learning path for:
-        Topic: {topic}
-        Current Level: {current_level}
-        Target Level: {target_level}
-
-        Format the response as:
-        {{
-            "prerequisites": ["Required foundational knowledge"],
-            "learning_stages": [
-                {{
-                    "stage": "Stage name",
-                    "topics": ["Topics to cover"],
-                    "resources": ["Recommended resources"],
-                    "projects": ["Practical projects to try"],
-                    "estimated_duration": "Estimated time to complete"
-                }}
-            ],
-            "milestones": ["Key checkpoints to validate progress"],
-            "next_steps": ["What to learn after completing this path"]
-        }}
+        if use_cache and isinstance(explanation, dict):
+            self.semantic_cache.add(db_session, concept, level, explanation, template_version=prompt.version)
+        return explanation
+
+    def _degraded_explanation(self, concept: str, level: str, db_session):
+        """模型不可用时的降级解释：放宽阈值复用已存储的解释，其次用概念图中的关系拼出简要说明"""
+        if db_session is None:
+            return None
+
+        if self.semantic_cache is not None:
+            threshold = settings.DEGRADED_EXPLANATION_THRESHOLD
+            cached = (
+                self.semantic_cache.lookup(db_session, concept, level, threshold=threshold)
+                or self.semantic_cache.lookup(db_session, concept, None, threshold=threshold)
+            )
+            # 降级阈值较低，还要求概念词一致，避免用共享修饰词的其他概念的解释顶替
+            if cached is not None and same_concept(concept, cached[0]["query"]):
+                entry, similarity = cached
+                return {
+                    **entry["content"],
+                    "cache_hit": {"query": entry["query"], "similarity": round(similarity, 3)},
+                    "degraded": True
+                }
+
+        relations = self.concept_graph.get_relations(db_session, concept)
+        if relations is None:
+            return None
+        return {
+            "concept": concept,
+            "definition": None,
+            "key_points": relations.get("common_misconceptions", []),
+            "real_world_applications": relations.get("practical_applications", []),
+            "code_examples": [],
+            "related_concepts": relations.get("related_concepts", []) + relations.get("advanced_topics", []),
+            "prerequisites": relations.get("prerequisites", []),
+            "learning_resources": [],
+            "degraded": True
+        }
+
+    async def create_learning_path(
+            self,
+            topic: str,
+            current_level: str,
+            target_level: str,
+            db_session=None
+    ) -> Dict:
+        """创建学习路径建议
+
+        提供数据库会话时优先从概念图本地计算，只为图中缺失的节点调用 LLM。
         """
+        if db_session is not None:
+            path = await self._learning_path_from_graph(topic, current_level, target_level, db_session)
+            if path is not None:
+                return path
+
+        prompt = prompt_registry.render(
+            "learning_path",
+            key=topic,
+            topic=topic,
+            current_level=current_level,
+            target_level=target_level
+        )
 
         try:
             response = await self.model.generate_content_async(prompt)
-            return response.text
+            path = parse_json_response(response.text)
+            path["template_version"] = prompt.version
+            return path
         except Exception as e:
             print(f"Error in create_learning_path: {e}")
             return {
@@ -71,24 +135,65 @@ class TechExplainer:
                 "message": str(e)
             }
 
-    async def get_concept_relations(self, concept: str) -> Dict:
-        """获取相关知识点联系"""
-        prompt = f"""
-        Analyze the relationships for the concept: {concept}
-
-        Provide the analysis in this format:
-        {{
-            "prerequisites": ["Concepts you should know before this"],
-            "related_concepts": ["Directly related concepts"],
-            "advanced_topics": ["More advanced concepts that build on this"],
-            "common_misconceptions": ["Frequently misunderstood points"],
-            "practical_applications": ["Where this concept is commonly used"]
-        }}
-        """
+    async def _learning_path_from_graph(
+            self,
+            topic: str,
+            current_level: str,
+            target_level: str,
+            db_session
+    ):
+        """展开概念图中缺失的节点后在本地计算学习路径，主题无法展开时返回 None"""
+        budget = settings.CONCEPT_GRAPH_MAX_EXPANSIONS
+        llm_calls = 0
+
+        _, missing = self.concept_graph.collect_scope(db_session, topic, current_level, target_level)
+        while missing and budget > 0:
+            batch = sorted(missing)[:budget]
+            budget -= len(batch)
+            llm_calls += len(batch)
+
+            # 并发请求 LLM，写库按顺序进行
+            results = await asyncio.gather(*(self._fetch_relations(key) for key in batch))
+            for key, relations in zip(batch, results):
+                if "error" not in relations:
+                    name = topic if key == normalize_concept(topic) else key
+                    self.concept_graph.store_relations(db_session, name, relations)
+
+            _, still_missing = self.concept_graph.collect_scope(
+                db_session, topic, current_level, target_level
+            )
+            if still_missing >= missing:
+                break
+            missing = still_missing
+
+        if self.concept_graph.get_relations(db_session, topic) is None:
+            return None
+
+        path = self.concept_graph.build_learning_path(db_session, topic, current_level, target_level)
+        path["llm_calls"] = llm_calls
+        return path
+
+    async def get_concept_relations(self, concept: str, db_session=None) -> Dict:
+        """获取相关知识点联系，已在概念图中展开过的概念直接从图中读取"""
+        if db_session is not None:
+            stored = self.concept_graph.get_relations(db_session, concept)
+            if stored is not None:
+                return stored
+
+        relations = await self._fetch_relations(concept)
+        if db_session is not None and "error" not in relations:
+            self.concept_graph.store_relations(db_session, concept, relations)
+        return relations
+
+    async def _fetch_relations(self, concept: str) -> Dict:
+        """调用 LLM 分析概念关系"""
+        request = f"Analyze the relationships for the concept: {concept}"
+        prompt = prompt_registry.render("concept_relations", key=concept, concept=concept)
 
         try:
-            response = await self.model.generate_content_async(prompt)
-            return response.text
+            relations = await self._generate("concept_relations", request, RELATIONS_FORMAT, prompt)
+            relations["template_version"] = prompt.version
+            return relations
         except Exception as e:
             print(f"Error in get_concept_relations: {e}")
             return {
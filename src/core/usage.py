@@ -0,0 +1,141 @@
+"""LLM 调用的 token 与耗时记账
+
+LLMClient 每次调用结束后把提示/输出 token 数和墙钟耗时记到当前上下文中所有活动的
+UsageMeter 上。计量器通过 track_usage() 绑定到 contextvar，asyncio 任务创建时会复制上下文，
+因此同一请求或同一面试回合内派生的后台任务也记到同一个计量器，嵌套的计量器（如请求内的会话）
+同时累加。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+_active_meters: ContextVar[Tuple["UsageMeter", ...]] = ContextVar("llm_usage_meters", default=())
+
+_COUNTERS = ("calls", "failures", "prompt_tokens", "completion_tokens", "cached_tokens", "estimated_calls")
+
+
+def _token_counts(prompt, response) -> Tuple[int, int, int, bool]:
+    """优先使用模型返回的 usage_metadata，缺失时按约 4 字符一个 token 估算"""
+    metadata = getattr(response, "usage_metadata", None) if response is not None else None
+    prompt_tokens = getattr(metadata, "prompt_token_count", None)
+    completion_tokens = getattr(metadata, "candidates_token_count", None)
+    if prompt_tokens is not None and completion_tokens is not None:
+        cached_tokens = getattr(metadata, "cached_content_token_count", 0) or 0
+        return int(prompt_tokens), int(completion_tokens), int(cached_tokens), False
+
+    text = ""
+    if response is not None:
+        try:
+            text = response.text or ""
+        except Exception:
+            text = ""
+    return len(str(prompt)) // 4 + 1, len(text) // 4 if text else 0, 0, True
+
+
+class UsageMeter:
+    """一个会话或请求的 LLM 用量，按组件细分"""
+
+    def __init__(self, totals: Dict = None):
+        totals = totals or {}
+        self.totals: Dict[str, float] = {key: totals.get(key, 0) for key in _COUNTERS}
+        self.totals["wall_time"] = float(totals.get("wall_time", 0.0))
+        self.components: Dict[str, Dict[str, float]] = {
+            name: dict(values) for name, values in (totals.get("components") or {}).items()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "UsageMeter":
+        return cls(data)
+
+    def to_dict(self) -> Dict:
+        return {
+            **{key: round(value, 3) if key == "wall_time" else value for key, value in self.totals.items()},
+            "total_tokens": self.total_tokens,
+            "components": self.components
+        }
+
+    @property
+    def total_tokens(self) -> int:
+        return int(self.totals["prompt_tokens"] + self.totals["completion_tokens"])
+
+    def record(self, component: str, prompt_tokens: int, completion_tokens: int, seconds: float,
+               cached_tokens: int = 0, estimated: bool = False, failed: bool = False):
+        values = {
+            "calls": 1,
+            "failures": int(failed),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
+            "estimated_calls": int(estimated),
+            "wall_time": seconds
+        }
+        component_totals = self.components.setdefault(component, {})
+        for key, value in values.items():
+            self.totals[key] += value
+            component_totals[key] = round(component_totals.get(key, 0) + value, 6)
+
+    def merge(self, other: "UsageMeter") -> "UsageMeter":
+        for key, value in other.totals.items():
+            self.totals[key] += value
+        for name, values in other.components.items():
+            component_totals = self.components.setdefault(name, {})
+            for key, value in values.items():
+                component_totals[key] = round(component_totals.get(key, 0) + value, 6)
+        return self
+
+    def scaled(self, fraction: float) -> "UsageMeter":
+        """按比例缩放的副本，用于把合并调用的用量分摊给各个请求"""
+        meter = UsageMeter()
+        for key, value in self.totals.items():
+            meter.totals[key] = value * fraction
+        meter.components = {
+            name: {key: round(value * fraction, 6) for key, value in values.items()}
+            for name, values in self.components.items()
+        }
+        return meter
+
+    def exceeded(self, max_tokens: int = 0, max_seconds: float = 0, max_calls: int = 0) -> Optional[str]:
+        """超出任一预算（0 表示不限）时返回原因"""
+        if max_tokens and self.total_tokens >= max_tokens:
+            return f"token budget of {max_tokens} exhausted"
+        if max_seconds and self.totals["wall_time"] >= max_seconds:
+            return f"LLM time budget of {max_seconds}s exhausted"
+        if max_calls and self.totals["calls"] >= max_calls:
+            return f"LLM call budget of {max_calls} exhausted"
+        return None
+
+
+@contextmanager
+def track_usage(meter: UsageMeter, exclusive: bool = False):
+    """在当前上下文中启用计量器，退出时恢复；exclusive 为 True 时暂停外层计量器"""
+    token = _active_meters.set((meter,) if exclusive else _active_meters.get() + (meter,))
+    try:
+        yield meter
+    finally:
+        _active_meters.reset(token)
+
+
+def active_meters() -> Tuple[UsageMeter, ...]:
+    """当前上下文中活动的计量器；在其他任务中代为发起调用时先保存，再用 use_meters 恢复"""
+    return _active_meters.get()
+
+
+@contextmanager
+def use_meters(meters: Tuple[UsageMeter, ...]):
+    """在当前上下文中改为只使用给定的计量器，退出时恢复"""
+    token = _active_meters.set(tuple(meters))
+    try:
+        yield
+    finally:
+        _active_meters.reset(token)
+
+
+def record_call(component: str, prompt, response, seconds: float, failed: bool = False, meters: Tuple = None):
+    """记录一次 LLM 调用；默认记到当前上下文中所有活动的计量器，指定 meters 时只记到这些计量器"""
+    meters = _active_meters.get() if meters is None else meters
+    if not meters:
+        return
+    prompt_tokens, completion_tokens, cached_tokens, estimated = _token_counts(prompt, response)
+    for meter in meters:
+        meter.record(component, prompt_tokens, completion_tokens, seconds,
+                     cached_tokens=cached_tokens, estimated=estimated, failed=failed)
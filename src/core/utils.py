@@ -0,0 +1,13 @@
+import json
+import re
+from typing import Any
+
+_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*(.*?)\s*```\s*$", re.DOTALL)
+
+
+def parse_json_response(text: str) -> Any:
+    """解析模型返回的JSON文本，兼容 ```json 代码块包裹的情况"""
+    match = _FENCE_PATTERN.match(text)
+    if match:
+        text = match.group(1)
+    return json.loads(text)
@@ -0,0 +1,220 @@
+"""会话、面试记录和候选人数据的流式批量导出（CSV / Parquet）
+
+按 chunk_size 分块读取（yield_per + stream_results 服务端游标），每块写出后即释放，
+内存占用与表大小无关。指定 since 时只导出该时间之后新增或更新的行。
+
+命令行用法：
+    python -m src.database.export interview_records --format parquet --output records.parquet
+    python -m src.database.export sessions --since 2024-01-01T00:00:00 > sessions.csv
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import JSON, Boolean, DateTime, Float, Integer
+
+from src.database.models import Candidate, InterviewRecord, Session
+from src.database.session import session_scope
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# 表名 -> (模型, 增量导出所依据的时间列：行插入或任何列更新时刷新)
+EXPORT_TABLES = {
+    "sessions": (Session, Session.updated_at),
+    "interview_records": (InterviewRecord, InterviewRecord.updated_at),
+    "candidates": (Candidate, Candidate.updated_at),
+}
+
+
+class ExportError(Exception):
+    """导出参数错误或缺少可选依赖"""
+
+
+def _model_for(table: str):
+    if table not in EXPORT_TABLES:
+        raise ExportError(f"Unknown table: {table}. Available: {', '.join(EXPORT_TABLES)}")
+    return EXPORT_TABLES[table]
+
+
+def _export_value(value, column_type):
+    # JSON 列序列化为字符串，保持 CSV 与 Parquet 的列类型一致
+    if value is not None and isinstance(column_type, JSON):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def iter_chunks(
+        db_session,
+        table: str,
+        since: Optional[datetime] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[List[Dict]]:
+    """按块产出行字典；只查询列值而不加载 ORM 对象，避免身份映射随行数增长"""
+    model, timestamp_column = _model_for(table)
+    columns = list(model.__table__.columns)
+
+    query = db_session.query(*columns).order_by(timestamp_column)
+    if since is not None:
+        query = query.filter(timestamp_column >= since)
+    rows = query.execution_options(stream_results=True, yield_per=chunk_size)
+
+    chunk = []
+    for row in rows:
+        chunk.append({
+            column.name: _export_value(value, column.type)
+            for column, value in zip(columns, row)
+        })
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_csv(
+        db_session,
+        table: str,
+        since: Optional[datetime] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """产出 CSV 文本块：先是表头，之后每块数据一段"""
+    model, _ = _model_for(table)
+    fieldnames = [column.name for column in model.__table__.columns]
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for chunk in iter_chunks(db_session, table, since, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+
+
+def _arrow_schema(model):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ExportError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    def arrow_type(column_type):
+        if isinstance(column_type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(column_type, Float):
+            return pa.float64()
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, Integer):
+            return pa.int64()
+        return pa.string()
+
+    return pa.schema([(column.name, arrow_type(column.type)) for column in model.__table__.columns])
+
+
+class _ChunkSink(io.RawIOBase):
+    """只追加的写入目标，Parquet 写出的字节由 drain() 分段取走"""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_parquet(
+        db_session,
+        table: str,
+        since: Optional[datetime] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """产出 Parquet 文件字节块：每块数据写成一个 row group 后立即产出"""
+    model, _ = _model_for(table)
+    schema = _arrow_schema(model)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in iter_chunks(db_session, table, since, chunk_size):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(
+        table: str,
+        export_format: str = "csv",
+        since: Optional[datetime] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator:
+    """在独立的数据库会话中流式导出，适合直接交给 StreamingResponse"""
+    _model_for(table)
+    if export_format == "csv":
+        stream = stream_csv
+    elif export_format == "parquet":
+        _arrow_schema(EXPORT_TABLES[table][0])
+        stream = stream_parquet
+    else:
+        raise ExportError(f"Unsupported format: {export_format}")
+
+    def generate():
+        with session_scope() as db:
+            yield from stream(db, table, since, chunk_size)
+
+    return generate()
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Export interview data as CSV or Parquet")
+    parser.add_argument("table", choices=sorted(EXPORT_TABLES))
+    parser.add_argument("--format", dest="export_format", choices=("csv", "parquet"), default="csv")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="Only export rows created or updated at or after this ISO timestamp")
+    parser.add_argument("--output", "-o", default=None, help="Output file (default: stdout)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    try:
+        chunks = stream_export(args.table, args.export_format, args.since, args.chunk_size)
+        if args.export_format == "csv":
+            output = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+        else:
+            output = open(args.output, "wb") if args.output else sys.stdout.buffer
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if args.output:
+                output.close()
+    except ExportError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, create_engine, Integer, JSON
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, create_engine, Integer, JSON, Boolean, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from src.config import settings
+from src.database.search import drop_search_index, install_search_index
 import logging
 import os
 
@@ -22,6 +23,7 @@ class Session(Base):
     candidate = relationship("Candidate", back_populates="sessions")
     difficulty_level = Column(Float, default=1.0)  # 当前面试难度系数
     performance_metrics = Column(JSON)  # 详细表现指标
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # 建立与面试记录的关系
     interview_records = relationship("InterviewRecord", back_populates="session")
@@ -34,7 +36,11 @@ class InterviewRecord(Base):
     question = Column(String)
     answer = Column(String)
     feedback = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    score = Column(Float, nullable=True)  # 本轮评估分数（后台评估完成后更新为最终分数）
+    difficulty = Column(Float, nullable=True)  # 本轮问题的难度
+    template_version = Column(String, nullable=True)  # 产生评估的提示模板版本（本地评分时为空）
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # 建立与会话的关系
     session = relationship("Session", back_populates="interview_records")
@@ -51,10 +57,186 @@ class Candidate(Base):
     current_level = Column(String)  # junior/intermediate/senior
     interview_performance = Column(JSON)  # 历史面试表现
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     sessions = relationship("Session", back_populates="candidate")
 
 
+class QuestionBank(Base):
+    __tablename__ = "question_bank"
+
+    id = Column(String, primary_key=True)
+    topic = Column(String, index=True)
+    difficulty = Column(Float, index=True)
+    question = Column(String)
+    expected_topics = Column(JSON)
+    follow_ups = Column(JSON)
+    evaluation_criteria = Column(JSON)
+    template_version = Column(String, nullable=True)  # 生成该问题的提示模板版本
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String, index=True)
+    payload = Column(JSON)
+    status = Column(String, default="queued", index=True)  # queued/running/succeeded/failed
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    attempts = Column(Integer, default=0)
+    callback_url = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ConceptNode(Base):
+    __tablename__ = "concept_nodes"
+
+    id = Column(String, primary_key=True)  # 规范化后的概念名
+    name = Column(String)
+    expanded = Column(Boolean, default=False)  # 是否已通过LLM获取过关系
+    details = Column(JSON)  # 常见误区、实际应用等非图结构信息
+    template_version = Column(String, nullable=True)  # 展开该节点的提示模板版本
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ConceptEdge(Base):
+    __tablename__ = "concept_edges"
+
+    # prerequisite: 学习 target 之前应先掌握 source；related: 相关概念
+    source_id = Column(String, ForeignKey("concept_nodes.id"), primary_key=True)
+    target_id = Column(String, ForeignKey("concept_nodes.id"), primary_key=True)
+    relation = Column(String, primary_key=True)
+
+
+class ConceptExplanation(Base):
+    __tablename__ = "concept_explanations"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    query = Column(String)  # 用户原始查询
+    level = Column(String)
+    content = Column(JSON)  # explain_concept 返回的解释
+    template_version = Column(String, nullable=True)  # 生成该解释的提示模板版本
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AnalyticsCohort(Base):
+    """按岗位级别和技术聚合的已完成面试统计（可累加，增量刷新）"""
+    __tablename__ = "analytics_cohorts"
+
+    position_level = Column(String, primary_key=True)
+    technology = Column(String, primary_key=True)
+    session_count = Column(Integer, default=0)
+    pass_count = Column(Integer, default=0)
+    score_sum = Column(Float, default=0.0)
+    score_sq_sum = Column(Float, default=0.0)
+    score_histogram = Column(JSON)  # 10 个分数段（0-10, ..., 90-100）的会话数
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class AnalyticsDifficultyProgression(Base):
+    """按岗位级别、技术和题目序号聚合的难度与得分"""
+    __tablename__ = "analytics_difficulty_progression"
+
+    position_level = Column(String, primary_key=True)
+    technology = Column(String, primary_key=True)
+    turn_index = Column(Integer, primary_key=True)
+    answer_count = Column(Integer, default=0)
+    difficulty_count = Column(Integer, default=0)  # 有难度记录的回答数（平均难度的分母）
+    difficulty_sum = Column(Float, default=0.0)
+    scored_count = Column(Integer, default=0)
+    score_sum = Column(Float, default=0.0)
+
+
+class AnalyticsState(Base):
+    """汇总表的刷新水位线"""
+    __tablename__ = "analytics_state"
+
+    key = Column(String, primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    refreshed_at = Column(DateTime, nullable=True)
+
+
+class IRTModel(Base):
+    """最近一次 IRT 标定的全局参数：引擎难度与 logit 难度的线性映射、各级别的平均能力"""
+    __tablename__ = "irt_model"
+
+    id = Column(String, primary_key=True)  # 固定为 "current"
+    slope = Column(Float)
+    intercept = Column(Float)
+    level_abilities = Column(JSON)  # current_level -> 平均能力（logit）
+    response_count = Column(Integer)
+    item_count = Column(Integer)
+    candidate_count = Column(Integer)
+    fitted_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ItemCalibration(Base):
+    """问题难度标定结果，按规范化的问题文本索引"""
+    __tablename__ = "irt_items"
+
+    question_key = Column(String, primary_key=True)
+    question = Column(String)
+    difficulty_logit = Column(Float)
+    standard_error = Column(Float)
+    engine_difficulty = Column(Float)  # 换算到引擎 0.5-2.5 难度刻度
+    response_count = Column(Integer)
+    fitted_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CandidateAbility(Base):
+    """候选人能力标定结果"""
+    __tablename__ = "irt_abilities"
+
+    candidate_id = Column(String, ForeignKey("candidates.id"), primary_key=True)
+    theta = Column(Float)
+    standard_error = Column(Float)
+    response_count = Column(Integer)
+    fitted_at = Column(DateTime, default=datetime.utcnow)
+
+
+# 后来新增的列：表名 -> [(列名, 已有行的初始值表达式，None 表示保留 NULL)]
+ADDED_COLUMNS = {
+    "sessions": [("updated_at", "COALESCE(end_time, start_time)")],
+    "interview_records": [
+        ("score", None),
+        ("difficulty", None),
+        ("template_version", None),
+        ("updated_at", "timestamp"),
+    ],
+    "candidates": [("updated_at", "created_at")],
+    "question_bank": [("template_version", None)],
+    "concept_nodes": [("template_version", None)],
+    "concept_explanations": [("template_version", None)],
+    # 旧汇总行无法得知其中有多少条带难度，保留 NULL，由下一次刷新全量重建
+    "analytics_difficulty_progression": [("difficulty_count", None)],
+}
+
+
+def _add_missing_columns(engine):
+    """为旧数据库补上后来新增的列并回填（create_all 不会修改已存在的表）"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table_name, columns in ADDED_COLUMNS.items():
+            if not inspector.has_table(table_name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table_name)}
+            table = Base.metadata.tables[table_name]
+            for name, initial in columns:
+                if name in existing:
+                    continue
+                column_type = table.columns[name].type.compile(dialect=engine.dialect)
+                connection.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}"))
+                if initial is not None:
+                    connection.execute(text(f"UPDATE {table_name} SET {name} = {initial}"))
+                if table.columns[name].index:
+                    connection.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_{name} ON {table_name} ({name})"
+                    ))
+                logging.info(f"Added column {table_name}.{name}")
+
 
 # 数据库初始化函数
 def init_db():
@@ -63,20 +245,24 @@ def init_db():
         # 获取数据库文件路径
         db_path = settings.DATABASE_URL.replace('sqlite:///', '')
 
-        # 如果数据库文件存在，则删除它
-        if os.path.exists(db_path) and db_path != ':memory:':
-            os.remove(db_path)
-            logging.info(f"Removed existing database file: {db_path}")
-
         # 创建数据库引擎
         engine = create_engine(settings.DATABASE_URL)
 
-        # 删除所有现有表（以防万一）
-        Base.metadata.drop_all(engine)
-        logging.info("Dropped all existing tables")
+        if settings.RESET_DB_ON_STARTUP:
+            # 如果数据库文件存在，则删除它
+            if os.path.exists(db_path) and db_path != ':memory:':
+                os.remove(db_path)
+                logging.info(f"Removed existing database file: {db_path}")
+
+            # 删除所有现有表（以防万一）
+            drop_search_index(engine)
+            Base.metadata.drop_all(engine)
+            logging.info("Dropped all existing tables")
 
         # 创建所有表
+        _add_missing_columns(engine)
         Base.metadata.create_all(engine)
+        install_search_index(engine)
         logging.info("Database initialized successfully with new schema")
 
     except Exception as e:
@@ -0,0 +1,196 @@
+"""候选人和面试记录的全文检索（SQLite FTS5）
+
+candidates_fts / interview_records_fts 是以原表为外部内容（content=）的 FTS5 虚拟表，只存倒排索引，
+由原表上的触发器在插入、删除和被索引列更新时同步；查询按 bm25 排序（各列权重见 SEARCH_INDEXES），
+MATCH 只访问倒排索引，耗时随命中数而不是表大小增长。FTS5 的排序需要为每个命中计算 bm25，
+常见词命中数达到 SEARCH_RANK_WINDOW 时只对最新的这么多条命中（rowid 最大者）排序，响应中 partial 为 true。
+
+原表以 rowid 关联索引：VACUUM 可能重排没有整数主键的表的 rowid，之后需调用 rebuild_search_index。
+非 SQLite 数据库或 SQLite 未编译 FTS5 时不建索引，检索返回 SearchUnavailableError。
+"""
+import json
+import logging
+import re
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from src.config import settings
+
+# 索引名 -> (原表, [(被索引的列, bm25 权重)])
+SEARCH_INDEXES = {
+    "candidates_fts": ("candidates", [("name", 5.0), ("skills", 10.0), ("education", 2.0), ("current_level", 1.0)]),
+    "interview_records_fts": ("interview_records", [("question", 2.0), ("answer", 5.0), ("feedback", 1.0)]),
+}
+SEARCH_SCOPES = ("candidates", "answers")
+
+_SNIPPET_TOKENS = 12
+
+
+class SearchError(Exception):
+    """检索参数错误"""
+
+
+class SearchUnavailableError(SearchError):
+    """数据库不支持全文索引"""
+
+
+def _is_sqlite(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def _ddl(index: str) -> List[str]:
+    table, columns = SEARCH_INDEXES[index]
+    names = [name for name, _ in columns]
+    column_list = ", ".join(names)
+    new_values = ", ".join(f"new.{name}" for name in names)
+    old_values = ", ".join(f"old.{name}" for name in names)
+    insert = f"INSERT INTO {index}(rowid, {column_list}) VALUES (new.rowid, {new_values});"
+    delete = f"INSERT INTO {index}({index}, rowid, {column_list}) VALUES ('delete', old.rowid, {old_values});"
+    return [
+        # prefix 索引让末尾词的前缀匹配（如 "pyth*"）不必扫描整个词表
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({column_list}, content='{table}', "
+        f"content_rowid='rowid', tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {table} BEGIN {delete} END",
+        # 只在被索引的列变化时更新，分数、表现指标等频繁更新不触及索引
+        f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE OF {column_list} ON {table} "
+        f"BEGIN {delete} {insert} END",
+        f"INSERT INTO {index}({index}, rank) VALUES ('rank', 'bm25({', '.join(str(w) for _, w in columns)})')",
+    ]
+
+
+def install_search_index(engine) -> bool:
+    """建立全文索引和同步触发器（幂等）；新建的索引从原表已有数据构建。返回索引是否可用"""
+    if not _is_sqlite(engine):
+        logging.info("Full-text search requires SQLite; search is disabled")
+        return False
+    try:
+        with engine.begin() as connection:
+            for index in SEARCH_INDEXES:
+                exists = connection.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": index}
+                ).first() is not None
+                for statement in _ddl(index):
+                    connection.execute(text(statement))
+                if not exists:
+                    connection.execute(text(f"INSERT INTO {index}({index}) VALUES ('rebuild')"))
+    except Exception as e:
+        # 缺少 FTS5 时 CREATE VIRTUAL TABLE 报 "no such module: fts5"
+        logging.warning(f"Full-text search is unavailable: {e}")
+        return False
+    return True
+
+
+def drop_search_index(engine):
+    """删除全文索引（删除原表时其上的触发器随之删除）"""
+    if not _is_sqlite(engine):
+        return
+    with engine.begin() as connection:
+        for index in SEARCH_INDEXES:
+            connection.execute(text(f"DROP TABLE IF EXISTS {index}"))
+
+
+def rebuild_search_index(engine):
+    """从原表重建全部全文索引"""
+    with engine.begin() as connection:
+        for index in SEARCH_INDEXES:
+            connection.execute(text(f"INSERT INTO {index}({index}) VALUES ('rebuild')"))
+
+
+def to_match_query(query: str) -> str:
+    """把用户输入转换为 FTS5 查询：各词都须出现，最后一个词按前缀匹配；
+    输入中的 FTS5 语法字符（引号、括号、*、列过滤等）一律按普通文本处理"""
+    terms = re.findall(r"\w+", query or "")
+    if not terms:
+        raise SearchError("Query must contain at least one word")
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def _rowid_floor(db_session, index: str, match: str) -> Optional[int]:
+    """命中数超过排序窗口时返回窗口内最小的 rowid，否则返回 None；按 rowid 倒序取第 N 条只需遍历倒排列表"""
+    return db_session.execute(text(
+        f"SELECT rowid FROM {index} WHERE {index} MATCH :match ORDER BY rowid DESC LIMIT 1 OFFSET :skip"
+    ), {"match": match, "skip": max(settings.SEARCH_RANK_WINDOW, 1) - 1}).scalar()
+
+
+def _search_candidates(db_session, match: str, limit: int, floor: int) -> List[Dict]:
+    rows = db_session.execute(text(
+        "SELECT c.id, c.name, c.current_level, c.skills, "
+        f"snippet(candidates_fts, -1, '[', ']', '…', {_SNIPPET_TOKENS}) AS snippet, candidates_fts.rank AS rank "
+        "FROM candidates_fts JOIN candidates c ON c.rowid = candidates_fts.rowid "
+        "WHERE candidates_fts MATCH :match AND candidates_fts.rowid >= :floor "
+        "ORDER BY candidates_fts.rank LIMIT :limit"
+    ), {"match": match, "limit": limit, "floor": floor}).mappings()
+    return [{
+        "type": "candidate",
+        "candidate_id": row["id"],
+        "name": row["name"],
+        "current_level": row["current_level"],
+        "skills": json.loads(row["skills"]) if row["skills"] else {},
+        "snippet": row["snippet"],
+        "rank": row["rank"]
+    } for row in rows]
+
+
+def _search_answers(db_session, match: str, limit: int, floor: int) -> List[Dict]:
+    rows = db_session.execute(text(
+        "SELECT r.id, r.session_id, s.candidate_id, r.question, r.score, r.timestamp, "
+        f"snippet(interview_records_fts, -1, '[', ']', '…', {_SNIPPET_TOKENS}) AS snippet, "
+        "interview_records_fts.rank AS rank "
+        "FROM interview_records_fts JOIN interview_records r ON r.rowid = interview_records_fts.rowid "
+        "LEFT JOIN sessions s ON s.id = r.session_id "
+        "WHERE interview_records_fts MATCH :match AND interview_records_fts.rowid >= :floor "
+        "ORDER BY interview_records_fts.rank LIMIT :limit"
+    ), {"match": match, "limit": limit, "floor": floor}).mappings()
+    return [{
+        "type": "interview_record",
+        "record_id": row["id"],
+        "session_id": row["session_id"],
+        "candidate_id": row["candidate_id"],
+        "question": row["question"],
+        "score": row["score"],
+        "timestamp": str(row["timestamp"]) if row["timestamp"] else None,
+        "snippet": row["snippet"],
+        "rank": row["rank"]
+    } for row in rows]
+
+
+def search(db_session, query: str, scope: Optional[str] = None, limit: int = 20, offset: int = 0) -> Dict:
+    """按相关度检索候选人（姓名、技能、教育背景、级别）和面试记录（问题、回答、反馈）
+
+    scope 为 candidates 或 answers 时只检索一类，默认两类按 bm25 分数合并排序。
+    不统计命中总数（对常见词需要遍历全部命中），以 has_more 表示是否还有下一页。
+    """
+    if not _is_sqlite(db_session.get_bind()):
+        raise SearchUnavailableError("Full-text search requires SQLite")
+    if scope is not None and scope not in SEARCH_SCOPES:
+        raise SearchError(f"Unknown scope: {scope}. Available: {', '.join(SEARCH_SCOPES)}")
+    match = to_match_query(query)
+
+    # 多取一条判断是否还有下一页；合并排序时每类都要取到 offset + limit 条
+    window = offset + limit + 1
+    searchers = {
+        "candidates": ("candidates_fts", _search_candidates),
+        "answers": ("interview_records_fts", _search_answers)
+    }
+    results, partial = [], False
+    try:
+        for name in ([scope] if scope else SEARCH_SCOPES):
+            index, searcher = searchers[name]
+            floor = _rowid_floor(db_session, index, match)
+            partial = partial or floor is not None
+            results.extend(searcher(db_session, match, window, floor or 0))
+    except Exception as e:
+        if "no such table" in str(e):
+            raise SearchUnavailableError("Full-text index has not been built") from e
+        raise
+    # bm25 越小越相关；不同表的分数只是近似可比
+    results.sort(key=lambda item: item["rank"])
+    page = results[offset:offset + limit]
+    for item in page:
+        item["relevance"] = round(-item.pop("rank"), 6)
+    return {"query": query, "scope": scope or "all", "offset": offset, "limit": limit,
+            "results": page, "has_more": len(results) > offset + limit, "partial": partial}
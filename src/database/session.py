@@ -1,3 +1,4 @@
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from src.config import settings
@@ -11,3 +12,14 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+
+@contextmanager
+def session_scope():
+    """在路由依赖注入之外使用的数据库会话（如进程内挂载的 Gradio 界面）"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -1,3 +1,5 @@
+import inspect
+
 import gradio as gr
 import httpx
 from typing import Dict, List
@@ -10,6 +12,112 @@ API_BASE_URL = "http://localhost:8000/api"
 current_session = {"id": None, "context": []}
 
 
+class BackendError(Exception):
+    """后端调用失败"""
+
+
+class HttpBackend:
+    """通过 HTTP 调用 FastAPI 接口（独立运行模式）"""
+
+    def __init__(self, base_url: str = API_BASE_URL):
+        self.base_url = base_url
+
+    async def _post(self, path: str, json_body: Dict = None, params: Dict = None,
+                    timeout: float = 30.0) -> Dict:
+        async with httpx.AsyncClient() as client:
+            response = await client.post(
+                f"{self.base_url}{path}",
+                json=json_body,
+                params=params,
+                timeout=timeout
+            )
+
+        if response.status_code != 200:
+            try:
+                detail = response.json().get("detail", "未知错误")
+            except (json.JSONDecodeError, AttributeError):
+                detail = "未知错误"
+            raise BackendError(detail)
+
+        try:
+            return response.json()
+        except json.JSONDecodeError:
+            raise BackendError("服务器返回了无效的响应格式。")
+
+    async def create_candidate(self, data: Dict) -> Dict:
+        return await self._post("/candidates/create", json_body=data)
+
+    async def start_interview(self, data: Dict) -> Dict:
+        return await self._post("/interview/start", json_body=data)
+
+    async def submit_answer(self, session_id: str, answer: str) -> Dict:
+        return await self._post(f"/interview/answer/{session_id}", json_body={"answer": answer})
+
+    async def end_interview(self, session_id: str) -> Dict:
+        return await self._post(f"/interview/end/{session_id}")
+
+    async def analyze_code(self, code: str, language: str) -> Dict:
+        return await self._post("/code/analyze", json_body={"code": code, "language": language})
+
+    async def explain_concept(self, concept: str, level: str) -> Dict:
+        return await self._post("/explain/concept", params={"concept": concept, "level": level})
+
+    async def learning_path(self, topic: str, current_level: str, target_level: str) -> Dict:
+        return await self._post(
+            "/explain/learning-path",
+            params={"topic": topic, "current_level": current_level, "target_level": target_level}
+        )
+
+
+class LocalBackend:
+    """在同一进程内直接调用服务层（挂载模式），省去 HTTP 回环和 JSON 编解码"""
+
+    def __init__(self):
+        from src.core import services
+        from src.database.session import session_scope
+        self.services = services
+        self.session_scope = session_scope
+
+    async def _call(self, func, *args):
+        with self.session_scope() as db:
+            try:
+                result = func(*args, db)
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
+            except self.services.ServiceError as e:
+                raise BackendError(e.detail)
+
+    async def create_candidate(self, data: Dict) -> Dict:
+        return await self._call(self.services.create_candidate, data)
+
+    async def start_interview(self, data: Dict) -> Dict:
+        return await self._call(self.services.start_interview, data)
+
+    async def submit_answer(self, session_id: str, answer: str) -> Dict:
+        return await self._call(self.services.process_answer, session_id, answer)
+
+    async def end_interview(self, session_id: str) -> Dict:
+        return await self._call(self.services.end_interview, session_id)
+
+    async def analyze_code(self, code: str, language: str) -> Dict:
+        return await self.services.code_analyzer.analyze_code(code, language)
+
+    async def explain_concept(self, concept: str, level: str) -> Dict:
+        with self.session_scope() as db:
+            return await self.services.tech_explainer.explain_concept(concept, level, db_session=db)
+
+    async def learning_path(self, topic: str, current_level: str, target_level: str) -> Dict:
+        with self.session_scope() as db:
+            return await self.services.tech_explainer.create_learning_path(
+                topic, current_level, target_level, db_session=db
+            )
+
+
+# 默认通过 HTTP 访问 API，挂载到 FastAPI 时由 create_gradio_app 切换为进程内调用
+backend = HttpBackend()
+
+
 async def create_candidate(name: str, experience: float, education: str, level: str, skills: str) -> str:
     """创建新的候选人档案"""
     try:
@@ -17,19 +125,14 @@ async def create_candidate(name: str, experience: float, education: str, level:
         skills_list = [s.strip() for s in skills.split(",")]
         skills_dict = {skill: "intermediate" for skill in skills_list}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/candidates/create",
-                json={
-                    "name": name,
-                    "years_of_experience": float(experience),
-                    "education": education,
-                    "current_level": level,
-                    "skills": skills_dict
-                }
-            )
-            result = response.json()
-            return f"候选人档案创建成功。ID: {result['candidate_id']}"
+        result = await backend.create_candidate({
+            "name": name,
+            "years_of_experience": float(experience),
+            "education": education,
+            "current_level": level,
+            "skills": skills_dict
+        })
+        return f"候选人档案创建成功。ID: {result['candidate_id']}"
     except Exception as e:
         return f"创建候选人档案失败: {str(e)}"
 
@@ -44,41 +147,32 @@ async def start_interview_with_candidate(
         if not candidate_id.strip():
             return [{"role": "assistant", "content": "请输入候选人ID"}]
 
-        tech_list = [t.strip() for t in technologies.split(",")]
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/interview/start",
-                json={
-                    "candidate_id": candidate_id,
-                    "position_level": position_level,
-                    "technologies": tech_list
-                },
-                timeout=30.0  # 增加超时时间
-            )
-
-            if response.status_code != 200:
-                error_detail = response.json().get('detail', '未知错误')
-                return [{"role": "assistant", "content": f"启动面试失败: {error_detail}"}]
+        tech_list = [t.strip() for t in technologies.split(",") if t.strip()]
 
-            result = response.json()
+        result = await backend.start_interview({
+            "candidate_id": candidate_id,
+            "position_level": position_level,
+            "technologies": tech_list
+        })
 
-            # 验证响应中包含必需的字段
-            if not all(key in result for key in ["session_id", "question", "difficulty_level"]):
-                return [{"role": "assistant", "content": "服务器返回的数据格式不正确"}]
+        # 验证响应中包含必需的字段
+        if not all(key in result for key in ["session_id", "question", "difficulty_level"]):
+            return [{"role": "assistant", "content": "服务器返回的数据格式不正确"}]
 
-            # 更新当前会话
-            current_session["id"] = result["session_id"]
+        # 更新当前会话
+        current_session["id"] = result["session_id"]
 
-            # 添加难度信息到问题
-            question_with_info = (
-                f"当前难度级别: {result['difficulty_level']:.1f}/2.5\n\n"
-                f"问题: {result['question']}"
-            )
+        # 添加难度信息到问题
+        question_with_info = (
+            f"当前难度级别: {result['difficulty_level']:.1f}/2.5\n\n"
+            f"问题: {result['question']}"
+        )
 
-            return [{"role": "assistant", "content": question_with_info}]
+        return [{"role": "assistant", "content": question_with_info}]
 
-    except httpx.TimeoutError:
+    except BackendError as e:
+        return [{"role": "assistant", "content": f"启动面试失败: {e}"}]
+    except httpx.TimeoutException:
         return [{"role": "assistant", "content": "请求超时，请重试"}]
     except httpx.RequestError as e:
         return [{"role": "assistant", "content": f"网络请求错误: {str(e)}"}]
@@ -90,21 +184,17 @@ async def start_interview_with_candidate(
 async def start_new_interview(position_level: str, technologies: str) -> List[Dict]:
     """开始新的面试会话"""
     try:
-        tech_list = [t.strip() for t in technologies.split(",")]
+        tech_list = [t.strip() for t in technologies.split(",") if t.strip()]
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/interview/start",
-                json={"position_level": position_level, "technologies": tech_list},
-                timeout=30.0
-            )
-            result = response.json()
+        result = await backend.start_interview(
+            {"position_level": position_level, "technologies": tech_list}
+        )
 
-            current_session["id"] = result.get("session_id")
-            question = result.get("question", "让我们开始面试。请做个自我介绍。")
+        current_session["id"] = result.get("session_id")
+        question = result.get("question", "让我们开始面试。请做个自我介绍。")
 
-            # 返回 messages 格式
-            return [{"role": "assistant", "content": question}]
+        # 返回 messages 格式
+        return [{"role": "assistant", "content": question}]
 
     except Exception as e:
         print(f"Error starting interview: {e}")
@@ -120,24 +210,21 @@ async def submit_answer(answer: str, history: List[Dict]) -> tuple:
                 {"role": "assistant", "content": "请先开始面试"}
             ]
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/interview/answer/{current_session['id']}",
-                json={"answer": answer}
-            )
-            result = response.json()
+        result = await backend.submit_answer(current_session["id"], answer)
 
-            # 格式化评估结果
-            evaluation = result["evaluation"]
-            evaluation_text = f"""
-评分: {evaluation['score']}/100
+        # 格式化评估结果
+        evaluation = result["evaluation"]
+        score_label = "初步评分（本地，AI评估完成后更新）" if evaluation.get("provisional") else "评分"
+        clarity = evaluation.get("clarity_score")
+        evaluation_text = f"""
+{score_label}: {evaluation['score']}/100
 表现优势:
 {chr(10).join(['- ' + s for s in evaluation['strength_points']])}
 
 需要改进:
 {chr(10).join(['- ' + w for w in evaluation['weakness_points']])}
 
-沟通清晰度: {evaluation['clarity_score']}/100
+沟通清晰度: {f"{clarity}/100" if clarity is not None else "待评估"}
 
 当前难度级别: {result['current_difficulty']:.1f}/2.5
 
@@ -145,12 +232,12 @@ async def submit_answer(answer: str, history: List[Dict]) -> tuple:
 {result['next_question']}
 """
 
-            # 更新历史记录
-            history = history or []
-            history.append({"role": "user", "content": answer})
-            history.append({"role": "assistant", "content": evaluation_text})
+        # 更新历史记录
+        history = history or []
+        history.append({"role": "user", "content": answer})
+        history.append({"role": "assistant", "content": evaluation_text})
 
-            return "", history
+        return "", history
     except Exception as e:
         history = history or []
         history.append({"role": "user", "content": answer})
@@ -164,13 +251,9 @@ async def end_current_interview(history: List[List[str]]) -> str:
         return "没有正在进行的面试"
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/interview/end/{current_session['id']}"
-            )
-            result = response.json()
+        result = await backend.end_interview(current_session["id"])
 
-            summary = f"""
+        summary = f"""
 面试总结:
 - 总分: {result.get('overall_score', 'N/A')}
 - 优势:
@@ -180,9 +263,9 @@ async def end_current_interview(history: List[List[str]]) -> str:
 - 总结: {result.get('summary', '未提供总结')}
             """
 
-            current_session["id"] = None
+        current_session["id"] = None
 
-            return summary
+        return summary
     except Exception as e:
         print(f"Error ending interview: {e}")
         return "面试结束时出现错误。请稍后重试。"
@@ -194,26 +277,15 @@ async def analyze_code(code: str, language: str) -> str:
         return "请输入要分析的代码。"
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/code/analyze",
-                json={"code": code, "language": language},
-                timeout=30.0
-            )
-
-            # 确保响应是 JSON 格式
-            try:
-                result = response.json()
-            except json.JSONDecodeError:
-                return "服务器返回了无效的响应格式。"
+        result = await backend.analyze_code(code, language)
 
-            # 提供默认值避免 KeyError
-            complexity = result.get('complexity', {})
-            best_practices = result.get('best_practices', [])
-            potential_issues = result.get('potential_issues', [])
-            suggestions = result.get('suggestions', [])
+        # 提供默认值避免 KeyError
+        complexity = result.get('complexity', {})
+        best_practices = result.get('best_practices', [])
+        potential_issues = result.get('potential_issues', [])
+        suggestions = result.get('suggestions', [])
 
-            return f"""
+        return f"""
 代码分析结果:
 
 1. 复杂度:
@@ -229,6 +301,8 @@ async def analyze_code(code: str, language: str) -> str:
 4. 改进建议:
 {chr(10).join(['- ' + str(sugg) for sugg in suggestions]) if suggestions else '- 未提供改进建议'}
 """
+    except BackendError as e:
+        return str(e)
     except httpx.TimeoutException:
         return "请求超时，请稍后重试。"
     except httpx.RequestError:
@@ -241,15 +315,10 @@ async def analyze_code(code: str, language: str) -> str:
 async def explain_concept(concept: str, level: str) -> str:
     """请求概念解释"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/explain/concept",
-                json={"concept": concept, "level": level}
-            )
-            result = response.json()
+        result = await backend.explain_concept(concept, level)
 
-            # 格式化输出
-            explanation = f"""
+        # 格式化输出
+        explanation = f"""
 概念: {result.get('concept', concept)}
 
 定义:
@@ -267,7 +336,7 @@ async def explain_concept(concept: str, level: str) -> str:
 学习资源:
 {chr(10).join(['- ' + r for r in result.get('learning_resources', [])])}
 """
-            return explanation
+        return explanation
     except Exception as e:
         return f"获取解释时出错: {str(e)}"
 
@@ -275,19 +344,10 @@ async def explain_concept(concept: str, level: str) -> str:
 async def get_learning_path(topic: str, current_level: str, target_level: str) -> str:
     """请求学习路径"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{API_BASE_URL}/explain/learning-path",
-                json={
-                    "topic": topic,
-                    "current_level": current_level,
-                    "target_level": target_level
-                }
-            )
-            result = response.json()
+        result = await backend.learning_path(topic, current_level, target_level)
 
-            # 格式化输出
-            path = f"""
+        # 格式化输出
+        path = f"""
 学习路径: {topic}
 
 预备知识:
@@ -295,8 +355,8 @@ async def get_learning_path(topic: str, current_level: str, target_level: str) -
 
 学习阶段:
 """
-            for stage in result.get('learning_stages', []):
-                path += f"""
+        for stage in result.get('learning_stages', []):
+            path += f"""
 {stage['stage']}:
 - 主题: {', '.join(stage['topics'])}
 - 预计时间: {stage['estimated_duration']}
@@ -304,14 +364,14 @@ async def get_learning_path(topic: str, current_level: str, target_level: str) -
 - 实践项目: {', '.join(stage['projects'])}
 """
 
-            path += f"""
+        path += f"""
 里程碑:
 {chr(10).join(['- ' + m for m in result.get('milestones', [])])}
 
 后续步骤:
 {chr(10).join(['- ' + s for s in result.get('next_steps', [])])}
 """
-            return path
+        return path
     except Exception as e:
         return f"获取学习路径时出错: {str(e)}"
 
@@ -319,8 +379,13 @@ async def get_learning_path(topic: str, current_level: str, target_level: str) -
 
 
 
-def create_gradio_app():
-    """创建Gradio应用界面"""
+def create_gradio_app(in_process: bool = False):
+    """创建Gradio应用界面
+
+    in_process 为 True 时界面挂载在 FastAPI 进程内，直接调用服务层而不经过 HTTP。
+    """
+    global backend
+    backend = LocalBackend() if in_process else HttpBackend()
 
     with gr.Blocks(title="IT面试助手") as app:
         gr.Markdown("# IT技术面试助手")
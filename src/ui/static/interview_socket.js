@@ -0,0 +1,118 @@
+// 面试 WebSocket 客户端：一场面试共用一个连接，协议见 src/api/websocket.py
+//
+// 用法：
+//   import { InterviewSocket } from "/static/interview_socket.js";
+//   const socket = new InterviewSocket(sessionId, {
+//     onQuestion: (message) => render(message.question),
+//     onEvaluation: (message) => showScore(message.turn, message.status, message.evaluation),
+//   });
+//   await socket.connect();
+//   const next = await socket.answer("...");   // 下一个问题；评估通过 onEvaluation 先到达
+//   const report = await socket.end();
+
+const HEARTBEAT_TIMEOUT_MS = 60000;
+
+export class InterviewSocket {
+  constructor(sessionId, handlers = {}, baseUrl = null) {
+    const origin = baseUrl || `${location.protocol === "https:" ? "wss" : "ws"}://${location.host}`;
+    this.url = `${origin}/ws/interview/${encodeURIComponent(sessionId)}`;
+    this.handlers = handlers;
+    this.socket = null;
+    this.pending = null; // 等待 question 或 report 的请求
+    this.watchdog = null;
+  }
+
+  connect() {
+    return new Promise((resolve, reject) => {
+      const socket = new WebSocket(this.url);
+      this.socket = socket;
+      socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        this._resetWatchdog();
+        if (message.type === "ready") {
+          resolve(message);
+        }
+        this._dispatch(message);
+      };
+      socket.onerror = () => reject(new Error("Interview channel connection failed"));
+      socket.onclose = (event) => {
+        clearTimeout(this.watchdog);
+        if (this.pending) {
+          this.pending.reject(new Error(`Interview channel closed (${event.code})`));
+          this.pending = null;
+        }
+        this._call("onClose", event);
+      };
+    });
+  }
+
+  answer(text) {
+    return this._request({ type: "answer", answer: text }, "question");
+  }
+
+  end() {
+    return this._request({ type: "end" }, "report");
+  }
+
+  close() {
+    if (this.socket) {
+      this.socket.close();
+    }
+  }
+
+  _request(message, expected) {
+    if (this.pending) {
+      return Promise.reject(new Error("The previous request is still in progress"));
+    }
+    return new Promise((resolve, reject) => {
+      this.pending = { expected, resolve, reject };
+      this.socket.send(JSON.stringify(message));
+    });
+  }
+
+  _dispatch(message) {
+    switch (message.type) {
+      case "ping":
+        this.socket.send(JSON.stringify({ type: "pong" }));
+        return;
+      case "pong":
+        return;
+      case "ready":
+        this._call("onReady", message);
+        return;
+      case "evaluation":
+        this._call("onEvaluation", message);
+        return;
+      case "question":
+      case "report":
+        this._call(message.type === "question" ? "onQuestion" : "onReport", message);
+        if (this.pending && this.pending.expected === message.type) {
+          this.pending.resolve(message.type === "report" ? message.report : message);
+          this.pending = null;
+        }
+        return;
+      case "error":
+        this._call("onError", message);
+        // 409 表示上一个回答仍在处理，当前等待的请求不受影响
+        if (this.pending && message.status !== 409) {
+          this.pending.reject(new Error(message.detail));
+          this.pending = null;
+        }
+        return;
+      default:
+        return;
+    }
+  }
+
+  _resetWatchdog() {
+    // 服务端定期发送 ping；长时间收不到任何消息说明连接已失效
+    clearTimeout(this.watchdog);
+    this.watchdog = setTimeout(() => this.socket.close(4408, "heartbeat timeout"), HEARTBEAT_TIMEOUT_MS);
+  }
+
+  _call(name, payload) {
+    if (typeof this.handlers[name] === "function") {
+      this.handlers[name](payload);
+    }
+  }
+}